@@ -1,35 +1,94 @@
 import os
 import re
+import io
+import csv
+import json
+import base64
+import hashlib
+import mimetypes
 import random
 import secrets
+import sys
 import jwt
-import requests
+import click
 from functools import wraps
+from itertools import chain
+from time import perf_counter, monotonic
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone, date, time
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, send_from_directory, stream_with_context
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
-from flask_mail import Mail, Message
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, and_, cast, delete, insert, select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer, joinedload, selectinload
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
-from dateutil.parser import parse as parse_date
-
-
-from config import Config
-from models import db, User, UserRole, Post, Novedad, AgendaContact, Attachment, Reunion, GuardiaFecha, Evento, Inscripcion, CumpleGif 
-
-app = Flask(__name__)
-app.config.from_object(Config)
-
-db.init_app(app)
-bcrypt = Bcrypt(app)
-CORS(app)
-mail = Mail(app)
+from dateutil import tz
+
+
+from config import Config, PERFILES
+from change_feed import feed, publish_change, CambiosExternos
+from servicios import mail, mensaje, http
+from uploads_gc import URL_UPLOAD_REGEX, nombre_upload_valido, limpiar_uploads, reporte_almacenamiento
+from models import db, actualizar_esquema, restricciones_faltantes, reuniones_superpuestas, User, UserRole, Post, Novedad, AgendaContact, Attachment, UploadMeta, Reunion, ReunionSerie, Guardia, GuardiaFecha, Evento, Inscripcion, CumpleGif, AuditLog, NovedadArchivo, EventoArchivo, InscripcionArchivo, ReunionArchivo, GuardiaFechaArchivo 
+from upload_meta import guardar_upload
+from contenido import aplicar_contenido
+from formularios import EsquemaInvalido, normalizar_esquema, validador_para
+from cache import CacheVersionado
+from singleflight import SingleFlight, bloqueo_db
+from basedatos import HEADER_ESCRITURA, anunciar_escritura, configurar_motores, marcar_usuario, primario, reporte_pools
+from auditoria import RegistroAuditoria, purgar_auditoria
+from archivo import archivar
+from limites import Limitador, Saturado, limitar
+from contrasenas import HasherContrasenas
+from zip_adjuntos import entradas_zip, generar_zip
+from calendario_ics import calendario, vevents_reuniones, vevents_series, vevents_guardias
+from recurrencia import ReglaInvalida, normalizar_regla, ultima_ocurrencia, primera_ocurrencia, ocurrencias, es_ocurrencia, dividir_regla, desplazar_regla, clave_ocurrencia, a_hora_local, parsear_ocurrencia
+
+# Todas las rutas y comandos se registran en este blueprint; la app se arma en create_app() (al final)
+api = Blueprint('api', __name__, cli_group=None)
+bcrypt = Bcrypt()
+cache_calendario = CacheVersionado(max_entradas=32, ttl=Config.CALENDARIO_TTL)
+cache_guardias = CacheVersionado(max_entradas=24, ttl=3600)
+cache_respuestas = CacheVersionado(max_entradas=64, ttl=600)
+# Trabajo idéntico pedido a la vez por varios pedidos (ej. asignar el GIF de un cumpleañero) se hace una sola vez
+vuelos = SingleFlight()
 
 EMAIL_REGEX = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
 
+def parse_date(valor, **kwargs):
+    # dateutil.parser tarda en importarse: se carga con la primera fecha que llega
+    from dateutil.parser import parse
+    return parse(valor, **kwargs)
+
+def incluir_archivo():
+    # ?include_archived=1: suma las filas movidas a las tablas *_archivo (ver archivo.py)
+    return request.args.get('include_archived', '').lower() in ('1', 'true', 'si', 'sí')
+
+def paginar_consultas(consultas, page, per_page):
+    """Pagina varias consultas ya ordenadas como si fueran una sola, una a continuación de la otra."""
+    totales = [consulta.order_by(None).count() for consulta in consultas]
+    total = sum(totales)
+    pages = -(-total // per_page)
+    inicio, items = (max(page, 1) - 1) * per_page, []
+    for consulta, cantidad in zip(consultas, totales):
+        if inicio < cantidad and len(items) < per_page:
+            items += consulta.offset(inicio).limit(per_page - len(items)).all()
+        inicio = max(inicio - cantidad, 0)
+    return {'items': items, 'total_pages': pages, 'current_page': page, 'has_next': page < pages, 'has_prev': page > 1}
+
+def hashear_password(password):
+    return current_app.extensions['contrasenas'].hashear(password)
+
+def verificar_password(hash_guardado, password):
+    return current_app.extensions['contrasenas'].verificar(hash_guardado, password)
+
+@api.errorhandler(Saturado)
+def servidor_saturado(e):
+    return jsonify({'message': 'El servidor está ocupado. Probá de nuevo en unos segundos.'}), 503, {'Retry-After': str(e.reintentar)}
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -37,7 +96,8 @@ def token_required(f):
         if not token:
             return jsonify({'message': 'Falta el token'}), 401
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+            marcar_usuario(data['id'])
             current_user = db.session.get(User, data['id'])
             if not current_user:
                 return jsonify({'message': 'Token inválido, usuario no encontrado'}), 401
@@ -54,9 +114,10 @@ def permission_required(*roles):
             if not token:
                 return jsonify({'message': 'Falta el token'}), 401
             try:
-                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+                data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
                 user_role = data.get('role')
                 current_user_id = data.get('id')
+                marcar_usuario(current_user_id)
                 current_user = db.session.get(User,current_user_id)
                 if user_role not in roles:
                     return jsonify({'message': 'Permiso denegado'}), 403
@@ -67,7 +128,8 @@ def permission_required(*roles):
     return decorator
 
 
-@app.route('/register', methods=['POST'])
+@api.route('/register', methods=['POST'])
+@limitar('register')
 def register():
     data = request.get_json()
     username = data.get('username')
@@ -82,18 +144,18 @@ def register():
     if not re.search(r'[0-9]', password): return jsonify({'message': 'La contraseña debe contener al menos un número'}), 400
 
     verification_code = str(random.randint(100000, 999999))
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed_password = hashear_password(password)
     new_user = User(username=username, password=hashed_password, is_verified=False, verification_code=verification_code)
     
     try:
         db.session.add(new_user)
         db.session.commit()
         
-        msg = Message('Confirma tu cuenta en la Intranet de Julia Tours', recipients=[username])
+        msg = mensaje('Confirma tu cuenta en la Intranet de Julia Tours', recipients=[username])
         msg.html = f"""<div style="font-family: Arial, sans-serif; text-align: center; padding: 20px;"><img src="cid:logo_jt" alt="Julia Tours Logo" style="max-width: 200px; margin-bottom: 20px;"><h1 style="color: #333;">¡Bienvenido a la Intranet!</h1><p style="font-size: 16px;">Gracias por registrarte. Para completar tu registro y activar tu cuenta, por favor utiliza el siguiente código de verificación:</p><p style="font-size: 24px; font-weight: bold; color: #008f39; letter-spacing: 5px; margin: 20px 0; padding: 10px; background-color: #f0f0f0; border-radius: 5px;">{verification_code}</p><p style="font-size: 12px; color: #777;">Si no solicitaste este registro, por favor ignora este correo.</p></div>"""
-        with app.open_resource("static/logo.png") as fp:
+        with current_app.open_resource("static/logo.png") as fp:
             msg.attach("logo.png", "image/png", fp.read(), headers={'Content-ID': '<logo_jt>'})
-        mail.send(msg)
+        mail().send(msg)
 
         return jsonify({'message': 'Registro exitoso. Revisa tu correo para obtener el código de verificación.'}), 201
     except IntegrityError:
@@ -102,7 +164,7 @@ def register():
         print(f"Error detallado: {e}") 
         return jsonify({'message': f'Error al enviar el correo: {str(e)}'}), 500
 
-@app.route('/verify', methods=['POST'])
+@api.route('/verify', methods=['POST'])
 def verify_email():
     data = request.get_json()
     username = data.get('username')
@@ -118,33 +180,42 @@ def verify_email():
     else:
         return jsonify({'message': 'Código de verificación incorrecto'}), 400
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
+@limitar('login')
 def login():
     data = request.get_json()
     username_from_request = data.get('username')
     password_from_request = data.get('password')
     user = User.query.filter(func.lower(User.username) == func.lower(username_from_request)).first()
-    if user and bcrypt.check_password_hash(user.password, password_from_request):
+    if user and verificar_password(user.password, password_from_request):
+        if current_app.extensions['contrasenas'].necesita_rehash(user.password):
+            # Hash con un costo distinto de BCRYPT_LOG_ROUNDS: se rehace ahora que tenemos la contraseña
+            try:
+                user.password = hashear_password(password_from_request)
+                db.session.commit()
+            except Saturado:
+                pass   # queda para el próximo login
         if not user.is_verified:
             try:
                 new_code = str(random.randint(100000, 999999))
                 user.verification_code = new_code
                 db.session.commit()
-                msg = Message('Nuevo Código de Verificación - Intranet Julia Tours', recipients=[user.username])
+                msg = mensaje('Nuevo Código de Verificación - Intranet Julia Tours', recipients=[user.username])
                 msg.html = f"""<div style="font-family: Arial, sans-serif; text-align: center; padding: 20px;"><img src="cid:logo_jt" alt="Julia Tours Logo" style="max-width: 200px; margin-bottom: 20px;"><h1 style="color: #333;">Verificación Requerida</h1><p style="font-size: 16px;">Hola, parece que tu cuenta aún no ha sido verificada. Para activarla e iniciar sesión, utiliza este nuevo código:</p><p style="font-size: 24px; font-weight: bold; color: #008f39; letter-spacing: 5px; margin: 20px 0; padding: 10px; background-color: #f0f0f0; border-radius: 5px;">{new_code}</p></div>"""
-                with app.open_resource("static/logo.png") as fp:
+                with current_app.open_resource("static/logo.png") as fp:
                     msg.attach("logo.png", "image/png", fp.read(), headers={'Content-ID': '<logo_jt>'})
-                mail.send(msg)
+                mail().send(msg)
                 return jsonify({'message': 'La cuenta no está verificada. Se ha enviado un nuevo código a tu correo.', 'action_required': 'verify'}), 403
             except Exception as e:
                 print(f"Error reenviando código de verificación: {e}")
                 return jsonify({'message': 'Tu cuenta no está verificada y hubo un error al reenviar el código.'}), 500
         profile_incomplete = not all([user.nombre, user.apellido, user.interno, user.fecha_nacimiento, user.sector, user.sucursal])
-        token = jwt.encode({'id': user.id, 'role': user.role.name, 'profile_incomplete': profile_incomplete, 'profile_image': user.profile_image, 'sector': user.sector, 'exp': datetime.now(timezone.utc) + timedelta(hours=24)}, app.config['SECRET_KEY'], algorithm="HS256")
+        token = jwt.encode({'id': user.id, 'role': user.role.name, 'profile_incomplete': profile_incomplete, 'profile_image': user.profile_image, 'sector': user.sector, 'exp': datetime.now(timezone.utc) + timedelta(hours=24)}, current_app.config['SECRET_KEY'], algorithm="HS256")
         return jsonify({'token': token}), 200
     return jsonify({'message': 'Credenciales inválidas'}), 401
 
-@app.route('/request-reset', methods=['POST'])
+@api.route('/request-reset', methods=['POST'])
+@limitar('request_reset')
 def request_password_reset():
     data = request.get_json()
     username = data.get('username')
@@ -155,12 +226,13 @@ def request_password_reset():
         user.reset_token_expiration = datetime.utcnow() + timedelta(hours=1)
         db.session.commit()
         reset_link = f'http://localhost:3000/reset-password/{token}'
-        msg = Message('Restablecimiento de Contraseña - Intranet Julia Tours', recipients=[user.username])
+        msg = mensaje('Restablecimiento de Contraseña - Intranet Julia Tours', recipients=[user.username])
         msg.body = f'Para restablecer tu contraseña, visita el siguiente enlace: {reset_link}\n\nSi no solicitaste esto, ignora este correo.'
-        mail.send(msg)
+        mail().send(msg)
     return jsonify({'message': 'Si tu correo está registrado, recibirás un enlace para restablecer tu contraseña.'}), 200
 
-@app.route('/reset-password', methods=['POST'])
+@api.route('/reset-password', methods=['POST'])
+@limitar('reset_password')
 def reset_password():
     data = request.get_json()
     token = data.get('token')
@@ -168,26 +240,28 @@ def reset_password():
     user = User.query.filter_by(reset_token=token).filter(User.reset_token_expiration > datetime.utcnow()).first()
     if not user: return jsonify({'message': 'El token es inválido o ha expirado.'}), 400
     if len(new_password) < 8: return jsonify({'message': 'La nueva contraseña es muy corta.'}), 400
-    user.password = bcrypt.generate_password_hash(new_password).decode('utf-8')
+    user.password = hashear_password(new_password)
     user.reset_token = None
     user.reset_token_expiration = None
     db.session.commit()
     return jsonify({'message': 'Tu contraseña ha sido actualizada exitosamente.'}), 200
 
-@app.route('/login/refresh-token', methods=['POST'])
+@api.route('/login/refresh-token', methods=['POST'])
 @token_required
 def refresh_token(current_user):
     profile_incomplete = not all([current_user.nombre, current_user.apellido, current_user.interno, current_user.fecha_nacimiento, current_user.sector, current_user.sucursal])
-    token = jwt.encode({'id': current_user.id, 'role': current_user.role.name, 'profile_incomplete': profile_incomplete, 'profile_image': current_user.profile_image, 'sector': current_user.sector, 'exp': datetime.now(timezone.utc) + timedelta(hours=24)}, app.config['SECRET_KEY'], algorithm="HS256")
+    token = jwt.encode({'id': current_user.id, 'role': current_user.role.name, 'profile_incomplete': profile_incomplete, 'profile_image': current_user.profile_image, 'sector': current_user.sector, 'exp': datetime.now(timezone.utc) + timedelta(hours=24)}, current_app.config['SECRET_KEY'], algorithm="HS256")
     return jsonify({'token': token})
 
-@app.route('/profile', methods=['GET'])
+@api.route('/profile', methods=['GET'])
 @token_required
 def get_profile(current_user):
-    profile_data = {'nombre': current_user.nombre, 'apellido': current_user.apellido, 'interno': current_user.interno, 'correo': current_user.username, 'fecha_nacimiento': current_user.fecha_nacimiento.strftime('%Y-%m-%d') if current_user.fecha_nacimiento else '', 'sector': current_user.sector, 'sucursal': current_user.sucursal, 'profile_image': current_user.profile_image, 'guardia_nro': current_user.guardia_nro}
-    return jsonify(profile_data), 200
+    return jsonify(perfil_dict(current_user)), 200
+
+def perfil_dict(user):
+    return {'nombre': user.nombre, 'apellido': user.apellido, 'interno': user.interno, 'correo': user.username, 'fecha_nacimiento': user.fecha_nacimiento.strftime('%Y-%m-%d') if user.fecha_nacimiento else '', 'sector': user.sector, 'sucursal': user.sucursal, 'profile_image': user.profile_image, 'guardia_nro': user.guardia_nro}
 
-@app.route('/profile', methods=['POST'])
+@api.route('/profile', methods=['POST'])
 @token_required
 def update_profile(current_user):
     data = request.get_json()
@@ -203,9 +277,10 @@ def update_profile(current_user):
     else:
         current_user.guardia_nro = None
     db.session.commit()
+    feed.marcar_cambio('usuario')
     return jsonify({'message': 'Perfil actualizado exitosamente'}), 200
 
-@app.route('/profile/upload-image', methods=['POST'])
+@api.route('/profile/upload-image', methods=['POST'])
 @token_required
 def upload_profile_image(current_user):
     if 'profile_pic' not in request.files: return jsonify({'message': 'No se encontró el archivo (clave "profile_pic")'}), 400
@@ -214,13 +289,15 @@ def upload_profile_image(current_user):
     if file:
         filename = secure_filename(file.filename)
         unique_filename = f"{current_user.id}_{datetime.now().timestamp()}_{filename}"
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
+        meta = guardar_upload(file, os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename))
+        db.session.add(UploadMeta(saved_filename=unique_filename, user_id=current_user.id, **meta))
         current_user.profile_image = unique_filename
         db.session.commit()
+        feed.marcar_cambio('usuario')
         return jsonify({'message': 'Imagen actualizada correctamente', 'profile_image': unique_filename}), 200
     return jsonify({'message': 'Error inesperado'}), 500
 
-@app.route('/upload-file', methods=['POST'])
+@api.route('/upload-file', methods=['POST'])
 @permission_required('EDITOR', 'SUPERUSER')
 def upload_file(current_user):
     if 'upload' not in request.files:
@@ -230,15 +307,46 @@ def upload_file(current_user):
         return jsonify({'error': {'message': 'No se seleccionó ningún archivo'}}), 400
     filename = secure_filename(file.filename)
     unique_filename = f"{current_user.id}_{datetime.now().timestamp()}_{filename}"
-    file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
+    # Se guarda por bloques calculando tipo real, tamaño, hash y dimensiones / páginas
+    meta = guardar_upload(file, os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename))
+    db.session.add(UploadMeta(saved_filename=unique_filename, user_id=current_user.id, **meta))
+    db.session.commit()
     file_url = f"/uploads/{unique_filename}"
-    return jsonify({'url': file_url, 'name': filename})
-
-@app.route('/uploads/<path:filename>')
+    return jsonify({'url': file_url, 'name': filename, **meta})
+
+def guardar_imagen_inline(user_id):
+    """Devuelve la función que usa contenido.py para pasar imágenes data: URI al almacenamiento de uploads."""
+    def guardar(mimetype, datos):
+        sha256 = hashlib.sha256(datos).hexdigest()
+        # Si la misma imagen ya se subió antes, se reutiliza el archivo existente
+        existente = UploadMeta.query.filter_by(sha256=sha256, mimetype=mimetype).first()
+        if existente and os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], existente.saved_filename)):
+            return f"/uploads/{existente.saved_filename}"
+        extension = mimetypes.guess_extension(mimetype) or '.img'
+        unique_filename = f"{user_id}_{datetime.now().timestamp()}_imagen_{sha256[:12]}{extension}"
+        meta = guardar_upload(FileStorage(stream=io.BytesIO(datos), filename=unique_filename), os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename))
+        db.session.add(UploadMeta(saved_filename=unique_filename, user_id=user_id, **meta))
+        return f"/uploads/{unique_filename}"
+    return guardar
+
+@api.route('/uploads/<path:filename>')
 def serve_uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-@app.route('/user/<int:user_id>/profile', methods=['GET'])
+    # Solo archivos sueltos de la carpeta: ni subcarpetas (la cuarentena, ver uploads_gc.py), ni
+    # ocultos, ni rutas con . o .. que send_from_directory normalizaría
+    if not nombre_upload_valido(filename): return jsonify({'message': 'Archivo no encontrado'}), 404
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+
+def respuesta_zip(nombre, archivos):
+    """Descarga en ZIP de [(saved_filename, nombre, mimetype)], armado mientras se envía (ver zip_adjuntos.py)."""
+    # La lista se arma acá; el generador solo lee del disco, no usa la sesión ni el pedido
+    entradas = entradas_zip(current_app.config['UPLOAD_FOLDER'], archivos)
+    if not entradas: return jsonify({'message': 'No hay adjuntos para descargar'}), 404
+    return Response(generar_zip(entradas), mimetype='application/zip', headers={'Content-Disposition': f'attachment; filename="{nombre}"'})
+
+def archivos_adjuntos(attachments):
+    return [(att.saved_filename, att.original_filename, att.mimetype) for att in attachments]
+
+@api.route('/user/<int:user_id>/profile', methods=['GET'])
 @token_required
 def get_user_profile(current_user, user_id):
     user = db.session.get(User, user_id)
@@ -246,121 +354,438 @@ def get_user_profile(current_user, user_id):
     profile_data = {'nombre': user.nombre, 'apellido': user.apellido, 'interno': user.interno, 'correo': user.username, 'fecha_nacimiento': user.fecha_nacimiento.strftime('%Y-%m-%d') if user.fecha_nacimiento else None, 'sector': user.sector, 'sucursal': user.sucursal, 'profile_image': user.profile_image, 'guardia_nro': user.guardia_nro}
     return jsonify(profile_data), 200
 
-@app.route('/internos', methods=['GET'])
+@api.route('/internos', methods=['GET'])
 @token_required
 def get_internos(current_user):
     users = User.query.filter(User.nombre.isnot(None)).order_by(User.nombre).all()
     results = [{'id': user.id, 'nombre': user.nombre, 'apellido': user.apellido, 'username': user.username, 'sector': user.sector, 'interno': user.interno, 'sucursal': user.sucursal, 'fecha_nacimiento': user.fecha_nacimiento.strftime('%Y-%m-%d') if user.fecha_nacimiento else None, 'profile_image': user.profile_image, 'guardia_nro': user.guardia_nro} for user in users]
     return jsonify(results), 200
 
-@app.route('/admin/users', methods=['GET'])
+# Claves de orden permitidas para el listado de administración. Las columnas que admiten
+# nulos se ordenan con COALESCE para que la paginación por cursor sea estable.
+ORDEN_ADMIN_USUARIOS = {
+    'id': User.id,
+    'username': User.username,
+    'nombre': func.coalesce(User.nombre, ''),
+    'apellido': func.coalesce(User.apellido, ''),
+    'sector': func.coalesce(User.sector, ''),
+    'sucursal': func.coalesce(User.sucursal, ''),
+    'guardia_nro': func.coalesce(User.guardia_nro, 0),
+    'role': cast(User.role, db.String),
+}
+FACETAS_ADMIN_USUARIOS = {
+    'role': User.role,
+    'sector': User.sector,
+    'sucursal': User.sucursal,
+    'guardia_nro': User.guardia_nro,
+    'is_verified': User.is_verified,
+}
+
+def _codificar_cursor(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+def _decodificar_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+def _filtros_admin_usuarios(args):
+    filtros = []
+    if args.get('role'):
+        roles = [r for r in args.get('role').split(',') if r in UserRole.__members__]
+        filtros.append(User.role.in_([UserRole[r] for r in roles]))
+    for campo in ('sector', 'sucursal'):
+        if args.get(campo):
+            filtros.append(getattr(User, campo).in_(args.get(campo).split(',')))
+    if args.get('guardia_nro'):
+        valor = args.get('guardia_nro')
+        if valor == 'none':
+            filtros.append(User.guardia_nro.is_(None))
+        else:
+            filtros.append(User.guardia_nro.in_([int(g) for g in valor.split(',') if g.isdigit()]))
+    if args.get('verificado') in ('true', 'false'):
+        filtros.append(User.is_verified.is_(args.get('verificado') == 'true'))
+    if args.get('q'):
+        patron = f"%{args.get('q').strip().lower()}%"
+        filtros.append(or_(func.lower(User.username).like(patron), func.lower(User.nombre).like(patron), func.lower(User.apellido).like(patron)))
+    return filtros
+
+@api.route('/admin/users', methods=['GET'])
 @permission_required('SUPERUSER')
 def get_all_users(current_user):
-    users = User.query.all()
-    user_list = [{'id': user.id, 'username': user.username, 'role': user.role.name, 'guardia_nro': user.guardia_nro, 'sector': user.sector, 'sucursal': user.sucursal} for user in users]
-    return jsonify(user_list)
-
-@app.route('/admin/users/<int:user_id>/role', methods=['POST'])
-@permission_required('SUPERUSER')
-def set_user_role(current_user, user_id):
-    user_to_modify = db.session.get(User,user_id)
-    if not user_to_modify: return jsonify({'message': 'Usuario no encontrado'}), 404
-    data = request.get_json()
-    new_role_str = data.get('role')
-    if not new_role_str: return jsonify({'message': 'No se proporcionó un rol'}), 400
+    # Filtros, orden y paginación se resuelven en SQL: el panel ya no recibe la tabla completa.
+    # Parámetros: role, sector, sucursal, guardia_nro (listas separadas por coma, guardia_nro=none),
+    # verificado=true|false, q (busca en correo, nombre y apellido), sort (con '-' para descendente),
+    # limit (máx. 200) y cursor (el next_cursor de la página anterior).
+    sort = request.args.get('sort', 'username')
+    descendente = sort.startswith('-')
+    clave_orden = ORDEN_ADMIN_USUARIOS.get(sort.lstrip('-'))
+    if clave_orden is None:
+        return jsonify({'message': f'Orden inválido. Las claves válidas son: {list(ORDEN_ADMIN_USUARIOS)}'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+
+    filtros = _filtros_admin_usuarios(request.args)
+    query = db.session.query(User.id, User.username, User.nombre, User.apellido, User.role, User.guardia_nro, User.sector, User.sucursal, User.interno, User.is_verified, clave_orden.label('clave_orden')).filter(*filtros)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            ultimo_valor, ultimo_id = _decodificar_cursor(cursor)
+        except (ValueError, TypeError):
+            return jsonify({'message': 'Cursor inválido'}), 400
+        if descendente:
+            query = query.filter(or_(clave_orden < ultimo_valor, and_(clave_orden == ultimo_valor, User.id < ultimo_id)))
+        else:
+            query = query.filter(or_(clave_orden > ultimo_valor, and_(clave_orden == ultimo_valor, User.id > ultimo_id)))
+    orden = (clave_orden.desc(), User.id.desc()) if descendente else (clave_orden.asc(), User.id.asc())
+    filas = query.order_by(*orden).limit(limit + 1).all()
+
+    hay_mas = len(filas) > limit
+    filas = filas[:limit]
+    user_list = [{'id': u.id, 'username': u.username, 'nombre': u.nombre, 'apellido': u.apellido, 'role': u.role.name, 'guardia_nro': u.guardia_nro, 'sector': u.sector, 'sucursal': u.sucursal, 'interno': u.interno, 'is_verified': u.is_verified} for u in filas]
+    respuesta = {'users': user_list, 'next_cursor': _codificar_cursor([filas[-1].clave_orden, filas[-1].id]) if hay_mas else None}
+
+    # El resumen por facetas solo se calcula en la primera página
+    if not cursor:
+        facetas = {}
+        for nombre, columna in FACETAS_ADMIN_USUARIOS.items():
+            conteos = db.session.query(columna, func.count(User.id)).filter(*filtros).group_by(columna).all()
+            facetas[nombre] = [{'valor': valor.name if isinstance(valor, UserRole) else valor, 'total': total} for valor, total in conteos]
+        respuesta['facets'] = facetas
+        respuesta['total'] = sum(f['total'] for f in facetas['role'])
+    return jsonify(respuesta)
+
+# --- Validación compartida de cambios de usuario (panel de administración) ---
+# Cada validador recibe el valor enviado y devuelve (valor_normalizado, None) si es válido,
+# o (None, (mensaje, codigo_http)) si no lo es. Los usan tanto los endpoints individuales
+# como el PATCH por lotes y la importación CSV, para que las reglas sean siempre las mismas.
+def _validar_role(valor):
+    if not valor: return None, ('No se proporcionó un rol', 400)
     try:
-        new_role_enum = UserRole[new_role_str] 
+        return UserRole[valor], None
     except KeyError:
-        return jsonify({'message': f'Rol inválido. Los roles válidos son: {[role.name for role in UserRole]}'}), 400
-    user_to_modify.role = new_role_enum
+        return None, (f'Rol inválido. Los roles válidos son: {[role.name for role in UserRole]}', 400)
+
+def _validar_guardia(valor):
+    if valor is None or (isinstance(valor, int) and not isinstance(valor, bool) and 1 <= valor <= 4):
+        return valor, None
+    return None, ('Número de guardia inválido. Debe ser entre 1 y 4, o nulo.', 400)
+
+def _validar_sector(valor):
+    if valor and isinstance(valor, str) and len(valor) < 100: return valor, None
+    return None, ('El sector proporcionado es inválido.', 400)
+
+def _validar_interno(valor):
+    if valor and isinstance(valor, str) and len(valor) < 20: return valor, None
+    return None, ('El interno proporcionado es inválido.', 400)
+
+def _validar_sucursal(valor):
+    if valor and isinstance(valor, str): return valor, None
+    return None, ('La sucursal proporcionada es inválida.', 400)
+
+# campo -> (validador, mensaje si el superusuario intenta modificarse a sí mismo)
+CAMPOS_ADMIN_USUARIO = {
+    'role': (_validar_role, None),
+    'guardia_nro': (_validar_guardia, None),
+    'sector': (_validar_sector, 'No puedes modificar tu propio sector desde este panel.'),
+    'interno': (_validar_interno, 'No puedes modificar tu propio interno desde este panel.'),
+    'sucursal': (_validar_sucursal, 'No puedes modificar tu propia sucursal desde este panel.'),
+}
+
+def validar_cambio_usuario(current_user, user, campo, valor):
+    validador, mensaje_propio = CAMPOS_ADMIN_USUARIO[campo]
+    if mensaje_propio and user.id == current_user.id:
+        return None, (mensaje_propio, 403)
+    return validador(valor)
+
+def _aplicar_cambio_individual(current_user, user_id, campo):
+    user_to_modify = db.session.get(User, user_id)
+    if not user_to_modify: return None, (jsonify({'message': 'Usuario no encontrado'}), 404)
+    data = request.get_json()
+    valor, error = validar_cambio_usuario(current_user, user_to_modify, campo, data.get(campo))
+    if error: return None, (jsonify({'message': error[0]}), error[1])
+    setattr(user_to_modify, campo, valor)
     db.session.commit()
-    return jsonify({'message': f'Rol del usuario {user_to_modify.username} actualizado a {new_role_enum.name}'})
+    feed.marcar_cambio('usuario')
+    return user_to_modify, None
+
+@api.route('/admin/users/<int:user_id>/role', methods=['POST'])
+@permission_required('SUPERUSER')
+def set_user_role(current_user, user_id):
+    user, error = _aplicar_cambio_individual(current_user, user_id, 'role')
+    if error: return error
+    return jsonify({'message': f'Rol del usuario {user.username} actualizado a {user.role.name}'})
 
-@app.route('/admin/users/<int:user_id>/guardia', methods=['POST'])
+@api.route('/admin/users/<int:user_id>/guardia', methods=['POST'])
 @permission_required('SUPERUSER')
 def set_user_guardia(current_user, user_id):
-    user_to_modify = db.session.get(User, user_id)
-    if not user_to_modify: return jsonify({'message': 'Usuario no encontrado'}), 404
-    data = request.get_json()
-    guardia_nro = data.get('guardia_nro')
-    if guardia_nro is None or (isinstance(guardia_nro, int) and 1 <= guardia_nro <= 4):
-        user_to_modify.guardia_nro = guardia_nro
-        db.session.commit()
-        return jsonify({'message': f'Guardia para {user_to_modify.username} actualizada.'})
-    else:
-        return jsonify({'message': 'Número de guardia inválido. Debe ser entre 1 y 4, o nulo.'}), 400
-        
-@app.route('/admin/users/<int:user_id>/sector', methods=['POST'])
+    user, error = _aplicar_cambio_individual(current_user, user_id, 'guardia_nro')
+    if error: return error
+    return jsonify({'message': f'Guardia para {user.username} actualizada.'})
+
+@api.route('/admin/users/<int:user_id>/sector', methods=['POST'])
 @permission_required('SUPERUSER')
 def set_user_sector(current_user, user_id):
-    user_to_modify = db.session.get(User, user_id)
-    if not user_to_modify: return jsonify({'message': 'Usuario no encontrado'}), 404
-    if user_to_modify.id == current_user.id: return jsonify({'message': 'No puedes modificar tu propio sector desde este panel.'}), 403
-    data = request.get_json()
-    new_sector = data.get('sector')
-    if new_sector and isinstance(new_sector, str) and len(new_sector) < 100:
-        user_to_modify.sector = new_sector
-        db.session.commit()
-        return jsonify({'message': f'Sector de {user_to_modify.username} actualizado.'})
-    else:
-        return jsonify({'message': 'El sector proporcionado es inválido.'}), 400
+    user, error = _aplicar_cambio_individual(current_user, user_id, 'sector')
+    if error: return error
+    return jsonify({'message': f'Sector de {user.username} actualizado.'})
 
-@app.route('/admin/users/<int:user_id>/interno', methods=['POST'])
+@api.route('/admin/users/<int:user_id>/interno', methods=['POST'])
 @permission_required('SUPERUSER')
 def set_user_interno(current_user, user_id):
-    user_to_modify = db.session.get(User, user_id)
-    if not user_to_modify: return jsonify({'message': 'Usuario no encontrado'}), 404
-    if user_to_modify.id == current_user.id: return jsonify({'message': 'No puedes modificar tu propio interno desde este panel.'}), 403
-    data = request.get_json()
-    new_interno = data.get('interno')
-    if new_interno and isinstance(new_interno, str) and len(new_interno) < 20:
-        user_to_modify.interno = new_interno
-        db.session.commit()
-        return jsonify({'message': f'Interno de {user_to_modify.username} actualizado.'})
-    else:
-        return jsonify({'message': 'El interno proporcionado es inválido.'}), 400
-    
-@app.route('/admin/users/<int:user_id>/sucursal', methods=['POST'])
+    user, error = _aplicar_cambio_individual(current_user, user_id, 'interno')
+    if error: return error
+    return jsonify({'message': f'Interno de {user.username} actualizado.'})
+
+@api.route('/admin/users/<int:user_id>/sucursal', methods=['POST'])
 @permission_required('SUPERUSER')
 def set_user_sucursal(current_user, user_id):
-    user_to_modify = db.session.get(User, user_id)
-    if not user_to_modify:
-        return jsonify({'message': 'Usuario no encontrado'}), 404
-
-    if user_to_modify.id == current_user.id:
-        return jsonify({'message': 'No puedes modificar tu propia sucursal desde este panel.'}), 403
-
-    data = request.get_json()
-    new_sucursal = data.get('sucursal')
-
-    if new_sucursal and isinstance(new_sucursal, str):
-        user_to_modify.sucursal = new_sucursal
-        db.session.commit()
-        return jsonify({'message': f'Sucursal de {user_to_modify.username} actualizada.'})
+    user, error = _aplicar_cambio_individual(current_user, user_id, 'sucursal')
+    if error: return error
+    return jsonify({'message': f'Sucursal de {user.username} actualizada.'})
+
+def _identificador_usuario(valor, clave):
+    # Solo números y textos: una lista o un objeto no sirven para buscar (ni como clave del dict)
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        return None
+    if clave == 'username':
+        return str(valor).lower()
+    if isinstance(valor, str):
+        return int(valor) if valor.strip().isdigit() else None
+    return valor
+
+def aplicar_cambios_usuarios(current_user, cambios, clave='id', simular=False):
+    """Valida y aplica una lista de cambios ({clave: ..., campo: valor, ...}) en una sola transacción.
+
+    Carga todos los usuarios afectados con una única consulta. Si algún cambio es inválido
+    no se aplica ninguno y se devuelve la lista de errores indicando la posición de cada uno.
+    Los campos cuyo valor no cambia se ignoran. Con simular=True solo se valida.
+    """
+    columna = getattr(User, clave)
+    claves = [_identificador_usuario(c.get(clave), clave) for c in cambios]
+    identificadores = [i for i in claves if i is not None]
+    if clave == 'username':
+        usuarios = User.query.filter(func.lower(User.username).in_(identificadores)).all() if identificadores else []
+        por_clave = {u.username.lower(): u for u in usuarios}
     else:
-        return jsonify({'message': 'La sucursal proporcionada es inválida.'}), 400
+        usuarios = User.query.filter(columna.in_(identificadores)).all() if identificadores else []
+        por_clave = {u.id: u for u in usuarios}
+
+    errores, pendientes, actualizados = [], [], set()
+    for posicion, (cambio, identificador) in enumerate(zip(cambios, claves)):
+        if identificador is None and cambio.get(clave) is not None:
+            errores.append({'posicion': posicion, clave: cambio.get(clave), 'message': 'Identificador inválido'})
+            continue
+        user = por_clave.get(identificador)
+        if not user:
+            errores.append({'posicion': posicion, clave: cambio.get(clave), 'message': 'Usuario no encontrado'})
+            continue
+        campos = [campo for campo in cambio if campo != clave]
+        desconocidos = [campo for campo in campos if campo not in CAMPOS_ADMIN_USUARIO]
+        if desconocidos:
+            errores.append({'posicion': posicion, clave: cambio.get(clave), 'message': f'Campos no modificables: {desconocidos}'})
+            continue
+        for campo in campos:
+            actual = getattr(user, campo)
+            if campo == 'role' and actual is not None: actual = actual.name
+            if cambio[campo] == actual:
+                continue
+            valor, error = validar_cambio_usuario(current_user, user, campo, cambio[campo])
+            if error:
+                errores.append({'posicion': posicion, clave: cambio.get(clave), 'campo': campo, 'message': error[0]})
+                continue
+            pendientes.append((user, campo, valor))
+
+    if errores:
+        return 0, errores
+    if simular:
+        return len({user.id for user, _, _ in pendientes}), []
+    for user, campo, valor in pendientes:
+        setattr(user, campo, valor)
+        actualizados.add(user.id)
+    db.session.commit()
+    feed.marcar_cambio('usuario')
+    return len(actualizados), []
 
-@app.route('/admin/users/<int:user_id>', methods=['DELETE'])
+@api.route('/admin/users/batch', methods=['PATCH'])
+@permission_required('SUPERUSER')
+def batch_update_users(current_user):
+    data = request.get_json() or {}
+    cambios = data.get('cambios')
+    if not isinstance(cambios, list) or not all(isinstance(c, dict) for c in cambios):
+        return jsonify({'message': 'Se esperaba una lista "cambios" con un objeto por usuario'}), 400
+    actualizados, errores = aplicar_cambios_usuarios(current_user, cambios)
+    if errores:
+        return jsonify({'message': 'No se aplicó ningún cambio: hay errores de validación', 'errores': errores}), 400
+    return jsonify({'message': f'{actualizados} usuarios actualizados.', 'actualizados': actualizados})
+
+# Columnas del directorio de personal para exportar / importar en CSV
+COLUMNAS_CSV_PERSONAL = ['username', 'nombre', 'apellido', 'sector', 'sucursal', 'interno', 'guardia_nro']
+COLUMNAS_CSV_IMPORTABLES = ['sector', 'sucursal', 'interno', 'guardia_nro']
+
+@api.route('/admin/users/export.csv', methods=['GET'])
+@permission_required('SUPERUSER')
+def export_users_csv(current_user):
+    def generar():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNAS_CSV_PERSONAL)
+        consulta = db.session.query(*[getattr(User, c) for c in COLUMNAS_CSV_PERSONAL]).order_by(User.username)
+        for fila in consulta.yield_per(500):
+            writer.writerow(['' if v is None else v for v in fila])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+    return Response(stream_with_context(generar()), mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=personal.csv'})
+
+@api.route('/admin/users/import', methods=['POST'])
+@permission_required('SUPERUSER')
+def import_users_csv(current_user):
+    if 'file' not in request.files: return jsonify({'message': 'No se encontró el archivo (clave "file")'}), 400
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true')
+    try:
+        contenido = request.files['file'].read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return jsonify({'message': 'El archivo debe estar codificado en UTF-8'}), 400
+    reader = csv.DictReader(io.StringIO(contenido))
+    if not reader.fieldnames or 'username' not in reader.fieldnames:
+        return jsonify({'message': 'El CSV debe tener una columna "username"'}), 400
+
+    cambios, filas, errores = [], [], []
+    for numero_fila, fila in enumerate(reader, start=2):  # la fila 1 es el encabezado
+        cambio = {'username': (fila.get('username') or '').strip()}
+        for columna in COLUMNAS_CSV_IMPORTABLES:
+            valor = (fila.get(columna) or '').strip()
+            if columna not in reader.fieldnames or valor == '':
+                continue  # celda vacía: se mantiene el valor actual
+            if columna == 'guardia_nro':
+                if valor.lower() in ('-', 'null', 'ninguna'):
+                    valor = None
+                elif valor.isdigit():
+                    valor = int(valor)
+            cambio[columna] = valor
+        cambios.append(cambio)
+        filas.append(numero_fila)
+
+    actualizados, errores_validacion = aplicar_cambios_usuarios(current_user, cambios, clave='username', simular=dry_run)
+    for error in errores_validacion:
+        error['fila'] = filas[error.pop('posicion')]
+        errores.append(error)
+    if errores:
+        return jsonify({'message': 'No se aplicó ningún cambio: hay filas con errores', 'errores': errores}), 400
+    mensaje = f'{actualizados} usuarios se actualizarían.' if dry_run else f'{actualizados} usuarios actualizados.'
+    return jsonify({'message': mensaje, 'actualizados': actualizados, 'dry_run': dry_run})
+
+@api.route('/admin/users/<int:user_id>', methods=['DELETE'])
 @permission_required('SUPERUSER')
 def delete_user(current_user, user_id):
     user_to_delete = db.session.get(User, user_id)
     if not user_to_delete: return jsonify({'message': 'Usuario no encontrado'}), 404
     if user_to_delete.id == current_user.id: return jsonify({'message': 'No puedes eliminar tu propia cuenta de superusuario.'}), 403
     try:
+        Guardia.query.filter(or_(Guardia.user_id == user_id, Guardia.reemplaza_id == user_id)).delete(synchronize_session=False)
         db.session.delete(user_to_delete)
         db.session.commit()
+        feed.marcar_cambio('usuario')
         return jsonify({'message': f'Usuario {user_to_delete.username} ha sido eliminado.'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Error al eliminar el usuario: {str(e)}'}), 500
 
-@app.route('/informacion/<string:sector_name>/all', methods=['GET'])
+@api.route('/admin/storage', methods=['GET'])
+@permission_required('SUPERUSER')
+def get_storage_report(current_user):
+    return jsonify(reporte_almacenamiento(current_app._get_current_object()))
+
+@api.route('/admin/db/pool', methods=['GET'])
+@permission_required('SUPERUSER')
+def get_pool_report(current_user):
+    # Estado de los pools de conexiones (primario y réplica) y esperas por una conexión libre
+    return jsonify({'binds': reporte_pools(db.engines)})
+
+@api.route('/admin/db/esquema', methods=['GET'])
+@permission_required('SUPERUSER')
+def get_esquema_report(current_user):
+    # Restricciones que actualizar-db no pudo crear y las reservas superpuestas que lo impiden
+    return jsonify({'restricciones_faltantes': restricciones_faltantes(), 'reuniones_superpuestas': reuniones_superpuestas()})
+
+@api.route('/admin/limites', methods=['GET'])
+@permission_required('SUPERUSER')
+def get_limites_report(current_user):
+    # Pedidos rechazados por límite (429), uso del pool de bcrypt (503 cuando se llena) y latencias de los hashes
+    return jsonify({'limites': current_app.extensions['limites'].estado(), 'bcrypt': current_app.extensions['contrasenas'].estado()})
+
+@api.route('/admin/auditoria', methods=['GET'])
+@permission_required('SUPERUSER')
+def get_auditoria(current_user):
+    args = request.args
+    try:
+        limite = min(max(int(args.get('limit', 50)), 1), 200)
+        filtros = []
+        if args.get('entidad'): filtros.append(AuditLog.entidad == args['entidad'])
+        if args.get('entidad_id'): filtros.append(AuditLog.entidad_id == args['entidad_id'])
+        if args.get('actor_id'): filtros.append(AuditLog.actor_id == int(args['actor_id']))
+        if args.get('accion'): filtros.append(AuditLog.accion == args['accion'])
+        if args.get('desde'): filtros.append(AuditLog.fecha >= parse_date(args['desde']))
+        if args.get('hasta'): filtros.append(AuditLog.fecha < parse_date(args['hasta']))
+        if args.get('cursor'): filtros.append(AuditLog.id < _decodificar_cursor(args['cursor'])[0])
+    except (ValueError, TypeError, OverflowError):
+        return jsonify({'message': 'Parámetros de búsqueda inválidos'}), 400
+    # Los más nuevos primero; el cursor es el último id devuelto (usa los índices por id)
+    filas = db.session.query(AuditLog, User).outerjoin(User, User.id == AuditLog.actor_id).filter(*filtros).order_by(AuditLog.id.desc()).limit(limite + 1).all()
+    siguiente = _codificar_cursor([filas[limite - 1][0].id]) if len(filas) > limite else None
+    return jsonify({
+        'registros': [registro.to_dict(actor) for registro, actor in filas[:limite]],
+        'next_cursor': siguiente,
+        'escritor': current_app.extensions['auditoria'].estado()
+    })
+
+def _leer_adjuntos(attachments_data):
+    # saved_filename -> nombre original, sin duplicados y respetando el orden recibido
+    entrantes = {}
+    for att_data in attachments_data:
+        saved_filename = (att_data.get('url') or '').split('/')[-1]
+        if saved_filename:
+            entrantes.setdefault(saved_filename, att_data.get('name') or att_data.get('original_filename') or saved_filename)
+    return entrantes
+
+def filas_adjuntos(entrantes):
+    """Arma los datos de cada Attachment nuevo tomando los metadatos registrados en /upload-file."""
+    metas = {m.saved_filename: m for m in UploadMeta.query.filter(UploadMeta.saved_filename.in_(list(entrantes)))} if entrantes else {}
+    filas = []
+    for saved_filename, nombre in entrantes.items():
+        fila = {'original_filename': nombre, 'saved_filename': saved_filename, 'mimetype': 'application/octet-stream'}
+        if saved_filename in metas:
+            fila.update(metas[saved_filename].to_dict())
+        filas.append(fila)
+    return filas
+
+def sincronizar_adjuntos(owner, fk, attachments_data):
+    """Actualiza los adjuntos de un post o novedad comparando por saved_filename.
+
+    Solo inserta los nuevos y borra los quitados (con sentencias en bloque); los que se
+    mantienen conservan su id y metadatos.
+    """
+    columna_fk = getattr(Attachment, fk)
+    existentes = dict(db.session.query(Attachment.saved_filename, Attachment.id).filter(columna_fk == owner.id).all())
+    entrantes = _leer_adjuntos(attachments_data)
+
+    quitados = [att_id for saved_filename, att_id in existentes.items() if saved_filename not in entrantes]
+    nuevos = [dict(fila, **{fk: owner.id}) for fila in filas_adjuntos({k: v for k, v in entrantes.items() if k not in existentes})]
+    if quitados:
+        db.session.execute(delete(Attachment).where(Attachment.id.in_(quitados)))
+    if nuevos:
+        db.session.execute(insert(Attachment), nuevos)
+    if quitados or nuevos:
+        db.session.expire(owner, ['attachments'])
+
+@api.route('/informacion/<string:sector_name>/all', methods=['GET'])
 @token_required
 def get_all_posts_by_sector(current_user, sector_name):
-    posts = Post.query.filter_by(sector=sector_name).order_by(Post.created_at.desc()).all()
-    return jsonify([post.to_dict() for post in posts])
+    # El listado no trae el HTML completo: solo el extracto y los datos de resumen
+    posts = Post.query.filter_by(sector=sector_name).options(defer(Post.content), joinedload(Post.author), selectinload(Post.attachments)).order_by(Post.created_at.desc()).all()
+    return jsonify([post.to_summary_dict() for post in posts])
 
-@app.route('/informacion', methods=['POST'])
+@api.route('/informacion', methods=['POST'])
 @token_required
 def create_post(current_user):
     data = request.get_json()
@@ -371,15 +796,23 @@ def create_post(current_user):
     if not sector or not title: return jsonify({'message': 'Faltan datos (sector o título)'}), 400
     can_create = (current_user.role == UserRole.SUPERUSER or (current_user.role == UserRole.EDITOR and current_user.sector == sector))
     if not can_create: return jsonify({'message': 'Permiso denegado para publicar en este sector'}), 403
-    new_post = Post(sector=sector, title=title, content=content, user_id=current_user.id)
-    for att_data in attachments_data:
-        new_attachment = Attachment(original_filename=att_data.get('name'), saved_filename=att_data.get('url').split('/')[-1], mimetype='application/octet-stream', post=new_post)
-        db.session.add(new_attachment)
+    new_post = Post(sector=sector, title=title, user_id=current_user.id)
+    aplicar_contenido(new_post, content, guardar_imagen_inline(current_user.id))
+    for fila in filas_adjuntos(_leer_adjuntos(attachments_data)):
+        db.session.add(Attachment(post=new_post, **fila))
     db.session.add(new_post)
     db.session.commit()
+    publish_change('post', new_post.id, 'creado', sector=new_post.sector)
     return jsonify(new_post.to_dict()), 201
 
-@app.route('/informacion/post/<int:post_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/informacion/post/<int:post_id>/adjuntos.zip', methods=['GET'])
+@token_required
+def download_post_attachments(current_user, post_id):
+    post = db.session.get(Post, post_id)
+    if not post: return jsonify({'message': 'Publicación no encontrada'}), 404
+    return respuesta_zip(f'adjuntos-publicacion-{post_id}.zip', archivos_adjuntos(post.attachments))
+
+@api.route('/informacion/post/<int:post_id>', methods=['GET', 'PUT', 'DELETE'])
 @token_required
 def handle_single_post(current_user, post_id):
     post = db.session.get(Post, post_id)
@@ -391,36 +824,49 @@ def handle_single_post(current_user, post_id):
         if not can_edit: return jsonify({'message': 'Permiso denegado para editar esta publicación'}), 403
         data = request.get_json()
         post.title = data.get('title', post.title)
-        post.content = data.get('content', post.content)
-        for attachment in post.attachments:
-            db.session.delete(attachment)
-        attachments_data = data.get('attachments', [])
-        for att_data in attachments_data:
-            new_attachment = Attachment(original_filename=att_data.get('name') or att_data.get('original_filename'), saved_filename=att_data.get('url').split('/')[-1], mimetype='application/octet-stream', post=post)
-            db.session.add(new_attachment)
+        if 'content' in data:
+            aplicar_contenido(post, data.get('content'), guardar_imagen_inline(current_user.id))
+        if 'attachments' in data:
+            sincronizar_adjuntos(post, 'post_id', data.get('attachments') or [])
         db.session.commit()
+        publish_change('post', post.id, 'actualizado', sector=post.sector)
         return jsonify(post.to_dict()), 200
     if request.method == 'DELETE':
         can_delete = (current_user.role == UserRole.SUPERUSER or post.user_id == current_user.id)
         if not can_delete: return jsonify({'message': 'Permiso denegado para eliminar esta publicación'}), 403
         db.session.delete(post)
         db.session.commit()
+        publish_change('post', post_id, 'eliminado', sector=post.sector)
         return jsonify({'message': 'Publicación eliminada correctamente'}), 200
 
-@app.route('/novedades/all', methods=['GET'])
+@api.route('/novedades/all', methods=['GET'])
 @token_required
 def get_all_novedades(current_user):
-    novedades = Novedad.query.order_by(Novedad.created_at.desc()).all()
-    return jsonify([n.to_dict() for n in novedades])
+    novedades = Novedad.query.options(defer(Novedad.content), joinedload(Novedad.author), selectinload(Novedad.attachments)).order_by(Novedad.created_at.desc()).all()
+    if incluir_archivo():
+        novedades += NovedadArchivo.query.options(defer(NovedadArchivo.content), joinedload(NovedadArchivo.author), selectinload(NovedadArchivo.attachments)).order_by(NovedadArchivo.created_at.desc()).all()
+    return jsonify([n.to_summary_dict() for n in novedades])
+
+def _construir_pagina_novedades(page, items_per_page=10):
+    pagination = Novedad.query.options(defer(Novedad.content), joinedload(Novedad.author), selectinload(Novedad.attachments)).order_by(Novedad.created_at.desc()).paginate(page=page, per_page=items_per_page, error_out=False)
+    return {'novedades': [n.to_summary_dict() for n in pagination.items], 'total_pages': pagination.pages, 'current_page': pagination.page, 'has_next': pagination.has_next, 'has_prev': pagination.has_prev}
 
-@app.route('/novedades', methods=['GET', 'POST'])
+def pagina_novedades(page):
+    # Es igual para todos los usuarios: se cachea hasta la próxima novedad o cambio de autor
+    return cache_respuestas.get(('novedades', page), feed.version('novedad', 'usuario'), primario(lambda: _construir_pagina_novedades(page)))
+
+@api.route('/novedades', methods=['GET', 'POST'])
 @token_required
 def handle_novedades(current_user):
     if request.method == 'GET':
-        page = request.args.get('page', 1, type=int)
-        items_per_page = 10
-        pagination = Novedad.query.order_by(Novedad.created_at.desc()).paginate(page=page, per_page=items_per_page, error_out=False)
-        return jsonify({'novedades': [n.to_dict() for n in pagination.items], 'total_pages': pagination.pages, 'current_page': pagination.page, 'has_next': pagination.has_next, 'has_prev': pagination.has_prev})
+        if incluir_archivo():
+            # Las archivadas son todas más viejas que las actuales: van después, sin cache
+            pagina = paginar_consultas([
+                Novedad.query.options(defer(Novedad.content), joinedload(Novedad.author), selectinload(Novedad.attachments)).order_by(Novedad.created_at.desc()),
+                NovedadArchivo.query.options(defer(NovedadArchivo.content), joinedload(NovedadArchivo.author), selectinload(NovedadArchivo.attachments)).order_by(NovedadArchivo.created_at.desc()),
+            ], request.args.get('page', 1, type=int), 10)
+            return jsonify(dict(pagina, novedades=[n.to_summary_dict() for n in pagina.pop('items')]))
+        return jsonify(pagina_novedades(request.args.get('page', 1, type=int)))
 
     if request.method == 'POST':
         if not (current_user.role == UserRole.SUPERUSER or current_user.role == UserRole.EDITOR):
@@ -434,37 +880,73 @@ def handle_novedades(current_user):
         if not asunto or (not content and not attachments_data):
             return jsonify({'message': 'Se requiere un asunto y contenido o al menos un archivo adjunto.'}), 400
         
-        new_novedad = Novedad(asunto=asunto, content=content or '', user_id=current_user.id)
+        new_novedad = Novedad(asunto=asunto, user_id=current_user.id)
+        aplicar_contenido(new_novedad, content, guardar_imagen_inline(current_user.id))
 
-        for att_data in attachments_data:
-            new_attachment = Attachment(
-                original_filename=att_data.get('name'),
-                saved_filename=att_data.get('url').split('/')[-1],
-                mimetype='application/octet-stream',
-                novedad=new_novedad 
-            )
-            db.session.add(new_attachment)
+        for fila in filas_adjuntos(_leer_adjuntos(attachments_data)):
+            db.session.add(Attachment(novedad=new_novedad, **fila))
 
 
         db.session.add(new_novedad)
         db.session.commit() 
+        publish_change('novedad', new_novedad.id, 'creado')
 
 
     return jsonify(new_novedad.to_dict()), 201
 
-@app.route('/novedades/<int:novedad_id>', methods=['DELETE'])
+@api.route('/novedades/<int:novedad_id>/adjuntos.zip', methods=['GET'])
+@token_required
+def download_novedad_attachments(current_user, novedad_id):
+    novedad = db.session.get(Novedad, novedad_id) or (db.session.get(NovedadArchivo, novedad_id) if incluir_archivo() else None)
+    if not novedad: return jsonify({'message': 'Novedad no encontrada'}), 404
+    return respuesta_zip(f'adjuntos-novedad-{novedad_id}.zip', archivos_adjuntos(novedad.attachments))
+
+@api.route('/novedades/<int:novedad_id>', methods=['GET', 'PUT', 'DELETE'])
 @token_required
-def delete_novedad(current_user, novedad_id):
+def handle_single_novedad(current_user, novedad_id):
     novedad = db.session.get(Novedad, novedad_id)
+    if not novedad and request.method == 'GET' and incluir_archivo():
+        novedad = db.session.get(NovedadArchivo, novedad_id)   # las archivadas son de solo lectura
     if not novedad: return jsonify({'message': 'Novedad no encontrada'}), 404
+    if request.method == 'GET':
+        return jsonify(novedad.to_dict())
+    if request.method == 'PUT':
+        can_edit = (current_user.role == UserRole.SUPERUSER or (current_user.role == UserRole.EDITOR and novedad.user_id == current_user.id))
+        if not can_edit: return jsonify({'message': 'Permiso denegado para editar esta novedad'}), 403
+        data = request.get_json()
+        asunto = data.get('asunto', novedad.asunto)
+        content = data.get('content', novedad.content)
+        if not asunto: return jsonify({'message': 'Se requiere un asunto.'}), 400
+        novedad.asunto = asunto
+        if 'content' in data:
+            aplicar_contenido(novedad, content, guardar_imagen_inline(current_user.id))
+        if 'attachments' in data:
+            sincronizar_adjuntos(novedad, 'novedad_id', data.get('attachments') or [])
+        if not novedad.content and not novedad.attachments:
+            db.session.rollback()
+            return jsonify({'message': 'Se requiere contenido o al menos un archivo adjunto.'}), 400
+        db.session.commit()
+        publish_change('novedad', novedad.id, 'actualizado')
+        return jsonify(novedad.to_dict()), 200
     can_delete = (current_user.role == UserRole.SUPERUSER or novedad.user_id == current_user.id)
     if not can_delete: return jsonify({'message': 'Permiso denegado para eliminar esta novedad'}), 403
     db.session.delete(novedad)
     db.session.commit()
+    publish_change('novedad', novedad_id, 'eliminado')
     return jsonify({'message': 'Novedad eliminada correctamente'}), 200
 
+# --- FEED DE CAMBIOS ---
+# El canal principal es el servidor SSE de change_feed.py (FEED_PORT). Este endpoint es la
+# alternativa por polling: devuelve al instante los cambios visibles posteriores a `since`.
+@api.route('/cambios', methods=['GET'])
+@token_required
+def get_cambios(current_user):
+    since = request.args.get('since', 0, type=int)
+    usuario = {'id': current_user.id, 'role': current_user.role.name, 'sector': current_user.sector, 'sucursal': current_user.sucursal}
+    return jsonify({'cambios': feed.desde(since, usuario), 'ultimo_seq': feed.ultimo_seq})
+
 # --- SECCIÓN DE AGENDA ---
-@app.route('/agenda', methods=['GET', 'POST'])
+@api.route('/agenda', methods=['GET', 'POST'])
 @token_required
 def handle_agenda(current_user):
     if request.method == 'GET':
@@ -481,7 +963,7 @@ def handle_agenda(current_user):
         db.session.commit()
         return jsonify(new_contact.to_dict()), 201
 
-@app.route('/agenda/<int:contact_id>', methods=['PUT', 'DELETE'])
+@api.route('/agenda/<int:contact_id>', methods=['PUT', 'DELETE'])
 @permission_required('EDITOR', 'SUPERUSER')
 def handle_single_agenda_contact(current_user, contact_id):
     contact = db.session.get(AgendaContact, contact_id)
@@ -499,12 +981,181 @@ def handle_single_agenda_contact(current_user, contact_id):
         return jsonify({'message': 'Contacto eliminado correctamente'})
 
 # --- SECCIÓN DE REUNIONES Y GUARDIAS ---
-@app.route('/reuniones/all', methods=['GET'])
+# Reservas de salas: una reunión con ubicacion ocupa esa sala entre start_time y end_time, y una
+# serie recurrente la ocupa en cada ocurrencia. La comprobación previa permite responder con la
+# reunión que choca; entre reuniones sueltas, la restricción de exclusión de la base (ver
+# models._restriccion_salas) es la que garantiza que dos reservas simultáneas no queden
+# superpuestas, y su violación llega como IntegrityError.
+ZONA_LOCAL = tz.gettz(Config.ZONA_HORARIA)
+CAMPOS_REUNION = ['tema', 'ubicacion', 'cantidad_personas', 'zoom_link', 'convoca', 'proveedor', 'necesita_bebida', 'necesita_comida']
+# Horizonte en el que se controlan choques de las series sin fin
+HORIZONTE_SERIES = timedelta(days=365)
+# Ventana máxima en la que /reuniones/all expande las series (la grilla de un mes son 6 semanas)
+VENTANA_CALENDARIO = timedelta(days=42)
+
+def _hora_local(fecha, zona=ZONA_LOCAL):
+    # En SQLite (y en datos viejos) las fechas llegan sin zona: se toman como hora local
+    return fecha.replace(tzinfo=zona) if fecha.tzinfo is None else fecha.astimezone(zona)
+
+def series_en_ventana(desde, hasta, salas=None):
+    query = ReunionSerie.query.filter(ReunionSerie.dtstart < hasta, or_(ReunionSerie.fin.is_(None), ReunionSerie.fin > desde))
+    if salas is not None:
+        query = query.filter(ReunionSerie.ubicacion.in_(salas))
+    return query.all()
+
+def expandir_series(series, desde, hasta):
+    """(serie, inicio local sin zona) de cada ocurrencia de `series` dentro de [desde, hasta)."""
+    desde_local, hasta_local = a_hora_local(desde, ZONA_LOCAL), a_hora_local(hasta, ZONA_LOCAL)
+    for serie in series:
+        duracion = timedelta(minutes=serie.duracion_minutos)
+        for inicio in ocurrencias(serie.regla, a_hora_local(serie.dtstart, ZONA_LOCAL), duracion, serie.excepciones, desde_local, hasta_local):
+            yield serie, inicio
+
+def ocupacion_salas(salas, desde, hasta, excluir_reunion=None, excluir_serie=None):
+    """Intervalos ocupados (inicio, fin, descripción) por sala, ordenados, de reuniones y series."""
+    ocupados = {sala: [] for sala in salas}
+    if not salas:
+        return ocupados
+    # Una sola consulta (usa ix_reunion_sala_horario) con las reservas de todas las salas
+    query = db.session.query(Reunion.id, Reunion.tema, Reunion.ubicacion, Reunion.start_time, Reunion.end_time).filter(Reunion.ubicacion.in_(salas), Reunion.start_time < hasta, Reunion.end_time > desde)
+    if excluir_reunion:
+        query = query.filter(Reunion.id != excluir_reunion)
+    for reunion_id, tema, ubicacion, inicio, fin in query:
+        ocupados[ubicacion].append((_hora_local(inicio), _hora_local(fin), {'id': reunion_id, 'title': tema}))
+    series = [s for s in series_en_ventana(desde, hasta, salas) if s.id != excluir_serie]
+    for serie, inicio in expandir_series(series, desde, hasta):
+        ocurrencia = serie.ocurrencia_dict(inicio, ZONA_LOCAL)
+        ocupados[serie.ubicacion].append((_hora_local(inicio), _hora_local(inicio + timedelta(minutes=serie.duracion_minutos)), {'id': ocurrencia['id'], 'title': serie.tema}))
+    for intervalos in ocupados.values():
+        intervalos.sort(key=lambda intervalo: intervalo[0])
+    return ocupados
+
+def buscar_conflicto_sala(ubicacion, candidatos, excluir_reunion=None, excluir_serie=None):
+    """Primer choque entre los intervalos `candidatos` (ordenados) y lo ya reservado en la sala."""
+    if not ubicacion or not candidatos:
+        return None
+    ocupados = ocupacion_salas([ubicacion], candidatos[0][0], candidatos[-1][1], excluir_reunion, excluir_serie)[ubicacion]
+    i = 0
+    for inicio, fin in candidatos:
+        while i < len(ocupados) and ocupados[i][1] <= inicio:
+            i += 1
+        j = i
+        while j < len(ocupados) and ocupados[j][0] < fin:
+            if ocupados[j][1] > inicio:
+                return {**ocupados[j][2], 'start': ocupados[j][0].isoformat(), 'end': ocupados[j][1].isoformat(), 'ubicacion': ubicacion}
+            j += 1
+    return None
+
+def respuesta_sala_ocupada(conflicto):
+    respuesta = {'message': 'La sala ya está reservada en ese horario'}
+    if conflicto:
+        respuesta['conflicto'] = conflicto
+    return jsonify(respuesta), 409
+
+def validar_reserva_sala(reunion):
+    inicio, fin = _hora_local(reunion.start_time), _hora_local(reunion.end_time)
+    if fin <= inicio:
+        return jsonify({'message': 'La hora de fin debe ser posterior a la de inicio'}), 400
+    with db.session.no_autoflush:
+        conflicto = buscar_conflicto_sala(reunion.ubicacion, [(inicio, fin)], excluir_reunion=reunion.id)
+    if conflicto:
+        return respuesta_sala_ocupada(conflicto)
+    return None
+
+def calcular_horarios_libres(ocupados, franjas, duracion):
+    """Huecos de al menos `duracion` dentro de `franjas`, dados los intervalos `ocupados`.
+
+    Ambas listas son de pares (inicio, fin) ordenadas por inicio. Los ocupados se fusionan
+    (superpuestos o contiguos) y se recorren una sola vez junto con las franjas.
+    """
+    fusionados = []
+    for inicio, fin in ocupados:
+        if fusionados and inicio <= fusionados[-1][1]:
+            fusionados[-1][1] = max(fusionados[-1][1], fin)
+        else:
+            fusionados.append([inicio, fin])
+    libres, i = [], 0
+    for franja_inicio, franja_fin in franjas:
+        cursor = franja_inicio
+        while i < len(fusionados) and fusionados[i][1] <= franja_inicio:
+            i += 1
+        j = i
+        while j < len(fusionados) and fusionados[j][0] < franja_fin:
+            if fusionados[j][0] - cursor >= duracion:
+                libres.append((cursor, fusionados[j][0]))
+            cursor = max(cursor, fusionados[j][1])
+            j += 1
+        if franja_fin - cursor >= duracion:
+            libres.append((cursor, franja_fin))
+    return libres
+
+@api.route('/reuniones/disponibilidad', methods=['GET'])
+@token_required
+def get_disponibilidad_salas(current_user):
+    # Parámetros: desde, hasta (fechas u horas), duracion (minutos), salas (separadas por coma,
+    # por defecto todas) y cantidad_personas (descarta salas más chicas).
+    args = request.args
+    salas_config = current_app.config['SALAS_REUNION']
+    try:
+        desde = _hora_local(parse_date(args['desde']))
+        hasta = _hora_local(parse_date(args['hasta']))
+        duracion = timedelta(minutes=int(args.get('duracion', 60)))
+        personas = int(args.get('cantidad_personas') or 0)
+    except (KeyError, ValueError, OverflowError):
+        return jsonify({'message': 'Parámetros inválidos: se requieren desde, hasta y duracion (minutos)'}), 400
+    if hasta <= desde or duracion <= timedelta(0): return jsonify({'message': 'El rango o la duración no son válidos'}), 400
+    if hasta - desde > timedelta(days=31): return jsonify({'message': 'El rango no puede superar 31 días'}), 400
+
+    pedidas = [s.strip() for s in args.get('salas', '').split(',') if s.strip()] or list(salas_config)
+    salas = [s for s in pedidas if s in salas_config and salas_config[s] >= personas]
+
+    # Franjas del horario de salas para cada día del rango, recortadas a desde/hasta
+    apertura, cierre = (time.fromisoformat(h) for h in current_app.config['HORARIO_SALAS'])
+    franjas, dia = [], desde.date()
+    while dia <= hasta.date():
+        inicio = max(datetime.combine(dia, apertura, ZONA_LOCAL), desde)
+        fin = min(datetime.combine(dia, cierre, ZONA_LOCAL), hasta)
+        if fin > inicio:
+            franjas.append((inicio, fin))
+        dia += timedelta(days=1)
+
+    ocupados = ocupacion_salas(salas, desde, hasta) if franjas else {sala: [] for sala in salas}
+    resultado = []
+    for sala in salas:
+        libres = calcular_horarios_libres([(i, f) for i, f, _ in ocupados[sala]], franjas, duracion)
+        resultado.append({'ubicacion': sala, 'capacidad': salas_config[sala], 'libres': [{'start': i.isoformat(), 'end': f.isoformat()} for i, f in libres]})
+    return jsonify({'salas': resultado, 'duracion': int(duracion.total_seconds() // 60)})
+
+@api.route('/reuniones/all', methods=['GET'])
 @token_required
 def get_all_reuniones(current_user):
-    reuniones = Reunion.query.order_by(Reunion.start_time).all()
+    # desde/hasta (opcionales) limitan la respuesta a la ventana visible del calendario. Sin
+    # ellos se devuelven todas las reuniones sueltas. Las series se expanden solo dentro de la
+    # ventana, recortada a VENTANA_CALENDARIO (por defecto desde hoy).
+    hoy = datetime.now(ZONA_LOCAL).replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        desde = _hora_local(parse_date(request.args['desde'])) if request.args.get('desde') else None
+        hasta = _hora_local(parse_date(request.args['hasta'])) if request.args.get('hasta') else None
+    except (ValueError, OverflowError):
+        return jsonify({'message': 'Fechas inválidas'}), 400
+    if desde and hasta and hasta <= desde: return jsonify({'message': 'El rango no es válido'}), 400
+    reuniones, fechas_guardia = [], []
+    for modelo_reunion, modelo_guardia in [(Reunion, GuardiaFecha)] + ([(ReunionArchivo, GuardiaFechaArchivo)] if incluir_archivo() else []):
+        query_reuniones = modelo_reunion.query
+        query_guardias = modelo_guardia.query
+        if desde:
+            query_reuniones = query_reuniones.filter(modelo_reunion.end_time > desde)
+            query_guardias = query_guardias.filter(modelo_guardia.fecha >= desde.date())
+        if hasta:
+            query_reuniones = query_reuniones.filter(modelo_reunion.start_time < hasta)
+            query_guardias = query_guardias.filter(modelo_guardia.fecha <= hasta.date())
+        reuniones += query_reuniones.options(joinedload(modelo_reunion.creador)).order_by(modelo_reunion.start_time).all()
+        fechas_guardia += query_guardias.all()
     eventos_reuniones = [reunion.to_dict() for reunion in reuniones]
-    fechas_guardia = GuardiaFecha.query.all()
+    ventana_desde = desde or (hasta - VENTANA_CALENDARIO if hasta else hoy)
+    ventana_hasta = min(hasta or ventana_desde + VENTANA_CALENDARIO, ventana_desde + VENTANA_CALENDARIO)
+    series = series_en_ventana(ventana_desde, ventana_hasta)
+    eventos_reuniones += [serie.ocurrencia_dict(inicio, ZONA_LOCAL) for serie, inicio in expandir_series(series, ventana_desde, ventana_hasta)]
     eventos_guardia = []
     for guardia in fechas_guardia:
         if guardia.guardia_nro == 5:
@@ -517,21 +1168,27 @@ def get_all_reuniones(current_user):
     todos_los_eventos = eventos_reuniones + eventos_guardia
     return jsonify(todos_los_eventos)
 
-@app.route('/reuniones', methods=['POST'])
+@api.route('/reuniones', methods=['POST'])
 @permission_required('EDITOR', 'SUPERUSER')
 def create_reunion(current_user):
     data = request.get_json()
     if not data.get('tema') or not data.get('start') or not data.get('end'): return jsonify({'message': 'Tema y fechas son obligatorios'}), 400
     try:
         new_reunion = Reunion(tema=data.get('tema'), start_time=parse_date(data.get('start')), end_time=parse_date(data.get('end')), ubicacion=data.get('ubicacion'), cantidad_personas=data.get('cantidad_personas'), zoom_link=data.get('zoom_link'), convoca=data.get('convoca'), proveedor=data.get('proveedor'), necesita_bebida=data.get('necesita_bebida', False), necesita_comida=data.get('necesita_comida'), user_id=current_user.id)
+        error = validar_reserva_sala(new_reunion)
+        if error: return error
         db.session.add(new_reunion)
         db.session.commit()
+        publish_change('reunion', new_reunion.id, 'creado')
         return jsonify(new_reunion.to_dict()), 201
+    except IntegrityError:
+        db.session.rollback()
+        return respuesta_sala_ocupada(None)
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Error en el servidor: {str(e)}'}), 500
 
-@app.route('/reuniones/<int:reunion_id>', methods=['PUT', 'DELETE'])
+@api.route('/reuniones/<int:reunion_id>', methods=['PUT', 'DELETE'])
 @permission_required('EDITOR', 'SUPERUSER')
 def handle_single_reunion(current_user, reunion_id):
     reunion = db.session.get(Reunion, reunion_id)
@@ -556,9 +1213,17 @@ def handle_single_reunion(current_user, reunion_id):
             reunion.proveedor = data.get('proveedor', reunion.proveedor)
             reunion.necesita_bebida = data.get('necesita_bebida', reunion.necesita_bebida)
             reunion.necesita_comida = data.get('necesita_comida', reunion.necesita_comida)
-            
+
+            error = validar_reserva_sala(reunion)
+            if error:
+                db.session.rollback()
+                return error
             db.session.commit()
+            publish_change('reunion', reunion.id, 'actualizado')
             return jsonify(reunion.to_dict())
+        except IntegrityError:
+            db.session.rollback()
+            return respuesta_sala_ocupada(None)
         except Exception as e:
             db.session.rollback()
             print(f"Error al actualizar reunión: {e}") # Imprime el error real en la consola del backend
@@ -568,16 +1233,171 @@ def handle_single_reunion(current_user, reunion_id):
     if request.method == 'DELETE':
         db.session.delete(reunion)
         db.session.commit()
+        publish_change('reunion', reunion_id, 'eliminado')
         return jsonify({'message': 'Reunión eliminada correctamente'})
 
-@app.route('/guardias/fechas', methods=['GET', 'POST'])
+# --- Reuniones recurrentes (ReunionSerie) ---
+def _aplicar_datos_reunion(destino, data):
+    for campo in CAMPOS_REUNION:
+        if campo in data:
+            setattr(destino, campo, data[campo])
+
+def _normalizar_serie(serie):
+    """Valida la regla y recalcula serie.fin; devuelve una respuesta de error o None."""
+    if serie.duracion_minutos <= 0:
+        return jsonify({'message': 'La hora de fin debe ser posterior a la de inicio'}), 400
+    inicio = a_hora_local(serie.dtstart, ZONA_LOCAL)
+    try:
+        serie.regla = normalizar_regla(serie.regla, inicio)
+        ultima = ultima_ocurrencia(serie.regla, inicio)
+    except ReglaInvalida as e:
+        return jsonify({'message': str(e)}), 400
+    serie.fin = _hora_local(ultima + timedelta(minutes=serie.duracion_minutos)) if ultima else None
+    return None
+
+def _validar_sala_serie(serie):
+    # Se controlan las ocurrencias futuras hasta el horizonte (las series pueden no tener fin)
+    desde = max(_hora_local(serie.dtstart), datetime.now(ZONA_LOCAL))
+    hasta = min(_hora_local(serie.fin), desde + HORIZONTE_SERIES) if serie.fin else desde + HORIZONTE_SERIES
+    duracion = timedelta(minutes=serie.duracion_minutos)
+    candidatos = [(_hora_local(i), _hora_local(i + duracion)) for _, i in expandir_series([serie], desde, hasta)]
+    with db.session.no_autoflush:
+        conflicto = buscar_conflicto_sala(serie.ubicacion, candidatos, excluir_serie=serie.id)
+    return respuesta_sala_ocupada(conflicto) if conflicto else None
+
+def _preparar_serie(serie):
+    return _normalizar_serie(serie) or _validar_sala_serie(serie)
+
+def _desplazar_excepciones(excepciones, delta, desde=None, hasta=None):
+    resultado = []
+    for clave in excepciones or []:
+        inicio = datetime.fromisoformat(clave)
+        if (desde is None or inicio >= desde) and (hasta is None or inicio < hasta):
+            resultado.append(clave_ocurrencia(inicio + delta))
+    return resultado
+
+def _leer_horario(data, referencia, duracion):
+    """Nuevo (inicio, fin) en hora local a partir de data['start'] / data['end'] (opcionales)."""
+    inicio = a_hora_local(parse_date(data['start']), ZONA_LOCAL).replace(second=0) if data.get('start') else referencia
+    fin = a_hora_local(parse_date(data['end']), ZONA_LOCAL).replace(second=0) if data.get('end') else inicio + duracion
+    return inicio, fin
+
+@api.route('/reuniones/series', methods=['POST'])
+@permission_required('EDITOR', 'SUPERUSER')
+def create_reunion_serie(current_user):
+    # start/end son los de la primera ocurrencia; rrule usa la sintaxis RRULE (FREQ, INTERVAL, BYDAY,
+    # BYMONTHDAY, COUNT o UNTIL...); excepciones es una lista opcional de inicios a omitir.
+    data = request.get_json()
+    if not data.get('tema') or not data.get('start') or not data.get('end') or not data.get('rrule'):
+        return jsonify({'message': 'Tema, fechas y regla de recurrencia son obligatorios'}), 400
+    try:
+        inicio, fin = _leer_horario(data, None, None)
+    except (ValueError, OverflowError):
+        return jsonify({'message': 'Fechas inválidas'}), 400
+    excepciones = [parsear_ocurrencia(e, ZONA_LOCAL) for e in data.get('excepciones') or []]
+    serie = ReunionSerie(dtstart=_hora_local(inicio), duracion_minutos=int((fin - inicio).total_seconds() // 60), regla=data['rrule'], excepciones=[clave_ocurrencia(e) for e in excepciones if e], necesita_bebida=False, user_id=current_user.id)
+    _aplicar_datos_reunion(serie, data)
+    error = _preparar_serie(serie)
+    if error: return error
+    db.session.add(serie)
+    db.session.commit()
+    publish_change('reunion', f's{serie.id}', 'creado')
+    return jsonify(serie.to_dict()), 201
+
+@api.route('/reuniones/series/<int:serie_id>', methods=['PUT', 'DELETE'])
+@permission_required('EDITOR', 'SUPERUSER')
+def handle_single_reunion_serie(current_user, serie_id):
+    # alcance: 'serie' (todas las ocurrencias), 'ocurrencia' (solo la indicada) o 'siguientes'
+    # (la indicada y las posteriores: la serie se divide en dos). 'ocurrencia' es la clave de
+    # ocurrencia que devuelve /reuniones/all.
+    serie = db.session.get(ReunionSerie, serie_id)
+    if not serie: return jsonify({'message': 'Serie no encontrada'}), 404
+    data = (request.get_json(silent=True) or {}) if request.method == 'PUT' else request.args
+    alcance = data.get('alcance', 'serie')
+    if alcance not in ('serie', 'ocurrencia', 'siguientes'): return jsonify({'message': 'Alcance inválido'}), 400
+    dtstart = a_hora_local(serie.dtstart, ZONA_LOCAL)
+    duracion = timedelta(minutes=serie.duracion_minutos)
+    corte = None
+    if alcance != 'serie' or data.get('ocurrencia'):
+        # Con alcance 'serie' la ocurrencia es opcional: indica respecto de qué fecha se corre el horario
+        corte = parsear_ocurrencia(data.get('ocurrencia'), ZONA_LOCAL)
+        if not corte or not es_ocurrencia(serie.regla, dtstart, corte) or clave_ocurrencia(corte) in (serie.excepciones or []):
+            return jsonify({'message': 'Ocurrencia no encontrada'}), 404
+        if alcance == 'siguientes' and corte == primera_ocurrencia(serie.regla, dtstart):
+            alcance = 'serie'
+
+    if request.method == 'DELETE':
+        if alcance == 'serie':
+            db.session.delete(serie)
+        elif alcance == 'ocurrencia':
+            serie.excepciones = (serie.excepciones or []) + [clave_ocurrencia(corte)]
+        else:
+            serie.regla = dividir_regla(serie.regla, dtstart, corte)[0]
+            serie.excepciones = _desplazar_excepciones(serie.excepciones, timedelta(0), hasta=corte)
+            error = _normalizar_serie(serie)
+            if error:
+                db.session.rollback()
+                return error
+        db.session.commit()
+        publish_change('reunion', f's{serie_id}', 'eliminado')
+        return jsonify({'message': 'Reunión eliminada correctamente'})
+
+    # --- PUT ---
+    referencia = corte or dtstart
+    try:
+        inicio, fin = _leer_horario(data, referencia, duracion)
+    except (ValueError, OverflowError):
+        return jsonify({'message': 'Fechas inválidas'}), 400
+    delta = inicio - referencia
+    try:
+        if alcance == 'serie':
+            serie.dtstart = _hora_local(dtstart + delta)
+            serie.duracion_minutos = int((fin - inicio).total_seconds() // 60)
+            serie.excepciones = _desplazar_excepciones(serie.excepciones, delta)
+            serie.regla = data.get('rrule') or desplazar_regla(serie.regla, delta)
+            _aplicar_datos_reunion(serie, data)
+            error = _preparar_serie(serie)
+            resultado = serie
+        elif alcance == 'ocurrencia':
+            # La ocurrencia se separa de la serie y pasa a ser una reunión suelta
+            serie.excepciones = (serie.excepciones or []) + [clave_ocurrencia(corte)]
+            resultado = Reunion(tema=serie.tema, start_time=_hora_local(inicio), end_time=_hora_local(fin), user_id=current_user.id, **{c: getattr(serie, c) for c in CAMPOS_REUNION if c != 'tema'})
+            _aplicar_datos_reunion(resultado, data)
+            error = validar_reserva_sala(resultado)
+            if not error:
+                db.session.add(resultado)
+        else:
+            previa, siguiente = dividir_regla(serie.regla, dtstart, corte)
+            resultado = ReunionSerie(dtstart=_hora_local(corte + delta), duracion_minutos=int((fin - inicio).total_seconds() // 60), regla=data.get('rrule') or desplazar_regla(siguiente, delta), excepciones=_desplazar_excepciones(serie.excepciones, delta, desde=corte), user_id=current_user.id, **{c: getattr(serie, c) for c in CAMPOS_REUNION})
+            _aplicar_datos_reunion(resultado, data)
+            serie.regla = previa
+            serie.excepciones = _desplazar_excepciones(serie.excepciones, timedelta(0), hasta=corte)
+            error = _normalizar_serie(serie) or _preparar_serie(resultado)
+            if not error:
+                db.session.add(resultado)
+        if error:
+            db.session.rollback()
+            return error
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return respuesta_sala_ocupada(None)
+    publish_change('reunion', f's{serie_id}', 'actualizado')
+    return jsonify(resultado.to_dict())
+
+def puede_gestionar_guardias(user):
+    return user.role == UserRole.SUPERUSER or (user.role == UserRole.EDITOR and user.sector == 'Administracion')
+
+@api.route('/guardias/fechas', methods=['GET', 'POST'])
 @token_required
 def handle_guardias_fechas(current_user):
     if request.method == 'GET':
         fechas = GuardiaFecha.query.order_by(GuardiaFecha.fecha.asc()).all()
+        if incluir_archivo():
+            fechas = GuardiaFechaArchivo.query.order_by(GuardiaFechaArchivo.fecha.asc()).all() + fechas
         return jsonify([fecha.to_dict() for fecha in fechas])
     if request.method == 'POST':
-        if not (current_user.role == UserRole.SUPERUSER or (current_user.role == UserRole.EDITOR and current_user.sector == 'Administracion')):
+        if not puede_gestionar_guardias(current_user):
             return jsonify({'message': 'Permiso denegado'}), 403
         data = request.get_json()
         fecha_str, guardia_nro = data.get('fecha'), data.get('guardia_nro')
@@ -589,29 +1409,229 @@ def handle_guardias_fechas(current_user):
             new_guardia_fecha = GuardiaFecha(fecha=fecha_obj, guardia_nro=int(guardia_nro))
             db.session.add(new_guardia_fecha)
             db.session.commit()
+            publish_change('guardia_fecha', new_guardia_fecha.id, 'creado')
             return jsonify(new_guardia_fecha.to_dict()), 201
         except Exception as e:
             db.session.rollback()
             return jsonify({'message': f'Error en el servidor: {str(e)}'}), 500
 
-@app.route('/guardias/fechas/<int:id>', methods=['DELETE'])
+@api.route('/guardias/fechas/<int:id>', methods=['DELETE'])
 @token_required
 def delete_guardia_fecha(current_user, id):
-    if not (current_user.role == UserRole.SUPERUSER or (current_user.role == UserRole.EDITOR and current_user.sector == 'Administracion')):
+    if not puede_gestionar_guardias(current_user):
         return jsonify({'message': 'Permiso denegado'}), 403
     guardia_fecha = db.session.get(GuardiaFecha, id)
     if not guardia_fecha: return jsonify({'message': 'Fecha de guardia no encontrada'}), 404
     db.session.delete(guardia_fecha)
     db.session.commit()
+    publish_change('guardia_fecha', id, 'eliminado')
     return jsonify({'message': 'Fecha de guardia eliminada'})
 
-@app.route('/eventos', methods=['POST'])
+# --- Quién está de guardia ---
+# La guardia de una fecha la cubre el grupo de GuardiaFecha (los usuarios con ese guardia_nro),
+# con los cambios puntuales de la tabla Guardia aplicados encima. Se resuelve por mes con una sola
+# consulta y se cachea hasta que cambian las fechas, los cambios o los datos de los usuarios.
+def _roster_mes(anio, mes):
+    desde = date(anio, mes, 1)
+    hasta = (desde + timedelta(days=32)).replace(day=1)
+    persona = (User.id.label('user_id'), User.nombre, User.apellido, User.interno, User.sector)
+    del_grupo = db.select(GuardiaFecha.fecha, GuardiaFecha.guardia_nro, *persona, cast(db.null(), db.Integer).label('cambio_id'), cast(db.null(), db.Integer).label('reemplaza_id')).select_from(GuardiaFecha).outerjoin(User, User.guardia_nro == GuardiaFecha.guardia_nro).where(GuardiaFecha.fecha >= desde, GuardiaFecha.fecha < hasta)
+    cambios = db.select(Guardia.fecha, GuardiaFecha.guardia_nro, *persona, Guardia.id, Guardia.reemplaza_id).select_from(Guardia).join(User, User.id == Guardia.user_id).outerjoin(GuardiaFecha, GuardiaFecha.fecha == Guardia.fecha).where(Guardia.fecha >= desde, Guardia.fecha < hasta)
+    filas = db.session.execute(db.union_all(del_grupo, cambios).order_by('fecha')).all()
+
+    reemplazados = {(f.fecha, f.reemplaza_id) for f in filas if f.reemplaza_id}
+    por_id = {(f.fecha, f.user_id): f for f in filas if f.user_id}
+    dias = {}
+    for fila in filas:
+        dia = dias.setdefault(fila.fecha, {'fecha': fila.fecha.isoformat(), 'guardia_nro': fila.guardia_nro, 'feriado': fila.guardia_nro == 5, 'personas': []})
+        if not fila.user_id or (fila.cambio_id is None and (fila.fecha, fila.user_id) in reemplazados):
+            continue
+        if any(p['id'] == fila.user_id for p in dia['personas']):
+            continue
+        reemplaza = None
+        if fila.reemplaza_id:
+            otro = por_id.get((fila.fecha, fila.reemplaza_id))
+            reemplaza = {'id': fila.reemplaza_id, 'nombre': otro.nombre, 'apellido': otro.apellido} if otro else {'id': fila.reemplaza_id}
+        dia['personas'].append({'id': fila.user_id, 'nombre': fila.nombre, 'apellido': fila.apellido, 'interno': fila.interno, 'sector': fila.sector, 'origen': 'cambio' if fila.cambio_id else 'grupo', 'cambio_id': fila.cambio_id, 'reemplaza': reemplaza})
+    return dias
+
+@api.route('/guardias/roster', methods=['GET'])
+@token_required
+def get_guardias_roster(current_user):
+    # ?fecha=YYYY-MM-DD o ?desde=...&hasta=... (inclusive, hasta 93 días)
+    try:
+        if request.args.get('fecha'):
+            desde = hasta = datetime.strptime(request.args['fecha'], '%Y-%m-%d').date()
+        else:
+            desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date()
+            hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'message': 'Indicá fecha, o desde y hasta (YYYY-MM-DD)'}), 400
+    if hasta < desde or (hasta - desde).days > 93: return jsonify({'message': 'Rango de fechas inválido (máximo 93 días)'}), 400
+
+    version = feed.version('guardia_fecha', 'guardia', 'usuario')
+    resultado, anio, mes = [], desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        dias = cache_guardias.get(('roster', anio, mes), version, primario(lambda: _roster_mes(anio, mes)))
+        resultado.extend(dia for fecha, dia in sorted(dias.items()) if desde <= fecha <= hasta)
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    return jsonify(resultado)
+
+def _de_turno(fecha, user_id):
+    return db.session.query(GuardiaFecha.id).join(User, User.guardia_nro == GuardiaFecha.guardia_nro).filter(GuardiaFecha.fecha == fecha, User.id == user_id).first() is not None
+
+@api.route('/guardias/cambios', methods=['GET', 'POST'])
+@token_required
+def handle_guardias_cambios(current_user):
+    if request.method == 'GET':
+        try:
+            desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else None
+            hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else None
+        except ValueError:
+            return jsonify({'message': 'Fechas inválidas (YYYY-MM-DD)'}), 400
+        query = Guardia.query.options(joinedload(Guardia.usuario), joinedload(Guardia.reemplazado))
+        if desde: query = query.filter(Guardia.fecha >= desde)
+        if hasta: query = query.filter(Guardia.fecha <= hasta)
+        return jsonify([cambio.to_dict() for cambio in query.order_by(Guardia.fecha).all()])
+
+    # POST: {fecha, user_id, reemplaza_id?, fecha_devolucion?}. Con reemplaza_id, user_id cubre a esa
+    # persona en `fecha`; con fecha_devolucion además se registra el día en que se devuelve el cambio.
+    if not puede_gestionar_guardias(current_user):
+        return jsonify({'message': 'Permiso denegado'}), 403
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'message': 'Se esperaba un objeto JSON'}), 400
+    try:
+        fecha = datetime.strptime(data.get('fecha') or '', '%Y-%m-%d').date()
+        devolucion = datetime.strptime(data['fecha_devolucion'], '%Y-%m-%d').date() if data.get('fecha_devolucion') else None
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Fechas inválidas (YYYY-MM-DD)'}), 400
+    user_id, reemplaza_id = data.get('user_id'), data.get('reemplaza_id')
+    if any(i is not None and (not isinstance(i, int) or isinstance(i, bool)) for i in (user_id, reemplaza_id)):
+        return jsonify({'message': 'user_id y reemplaza_id deben ser números enteros'}), 400
+    ids = {i for i in (user_id, reemplaza_id) if i is not None}
+    if not user_id or User.query.filter(User.id.in_(ids)).count() != len(ids):
+        return jsonify({'message': 'Usuario no encontrado'}), 404
+    if user_id == reemplaza_id: return jsonify({'message': 'Una persona no puede reemplazarse a sí misma'}), 400
+    if devolucion and not reemplaza_id: return jsonify({'message': 'fecha_devolucion requiere reemplaza_id'}), 400
+    if reemplaza_id and not _de_turno(fecha, reemplaza_id):
+        return jsonify({'message': 'La persona reemplazada no está de guardia en esa fecha'}), 400
+    if devolucion and not _de_turno(devolucion, user_id):
+        return jsonify({'message': 'Quien cubre no está de guardia en la fecha de devolución'}), 400
+    nuevos = [Guardia(fecha=fecha, user_id=user_id, reemplaza_id=reemplaza_id)]
+    if devolucion:
+        nuevos.append(Guardia(fecha=devolucion, user_id=reemplaza_id, reemplaza_id=user_id))
+    try:
+        db.session.add_all(nuevos)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Esa persona ya tiene un cambio de guardia cargado en esa fecha'}), 409
+    for cambio in nuevos:
+        publish_change('guardia', cambio.id, 'creado')
+    return jsonify([cambio.to_dict() for cambio in nuevos]), 201
+
+@api.route('/guardias/cambios/<int:cambio_id>', methods=['DELETE'])
+@token_required
+def delete_guardia_cambio(current_user, cambio_id):
+    if not puede_gestionar_guardias(current_user):
+        return jsonify({'message': 'Permiso denegado'}), 403
+    cambio = db.session.get(Guardia, cambio_id)
+    if not cambio: return jsonify({'message': 'Cambio de guardia no encontrado'}), 404
+    db.session.delete(cambio)
+    db.session.commit()
+    publish_change('guardia', cambio_id, 'eliminado')
+    return jsonify({'message': 'Cambio de guardia eliminado'})
+
+# --- SECCIÓN DE SUSCRIPCIONES DE CALENDARIO (.ics) ---
+# Outlook y Google Calendar consultan estas URLs cada pocos minutos. El cuerpo se genera una sola
+# vez por versión de los datos (último cambio publicado en change_feed) y por día; el ETag se
+# calcula sin tocar la base, así que una consulta sin cambios se responde con 304 y solo cuesta
+# la búsqueda del token.
+def _urls_calendario(user):
+    base = request.host_url.rstrip('/')
+    return {
+        'reuniones': f'{base}/calendario/{user.calendar_token}/reuniones.ics',
+        'guardias': f'{base}/calendario/{user.calendar_token}/guardias.ics',
+    }
+
+@api.route('/calendario/token', methods=['GET', 'POST'])
+@token_required
+def handle_calendario_token(current_user):
+    # GET devuelve las URLs (creando el token la primera vez); POST lo rota e invalida las anteriores
+    if request.method == 'POST' or not current_user.calendar_token:
+        current_user.calendar_token = secrets.token_urlsafe(32)
+        db.session.commit()
+    return jsonify(_urls_calendario(current_user))
+
+def _ventana_calendario():
+    hoy = datetime.now(timezone.utc).date()
+    return hoy - timedelta(days=current_app.config['CALENDARIO_DIAS_ATRAS']), hoy + timedelta(days=current_app.config['CALENDARIO_DIAS_ADELANTE'])
+
+def _responder_ics(clave, entidad, construir):
+    seq, modificado = feed.version(entidad)
+    # El TTL también entra en el ETag y en Last-Modified: cubre cambios hechos por otro proceso que
+    # no pasaron por el feed, así los dos validadores vencen juntos
+    ttl = current_app.config['CALENDARIO_TTL']
+    tramo = int(datetime.now(timezone.utc).timestamp() // ttl)
+    etag = hashlib.sha1(repr((clave, seq, tramo)).encode()).hexdigest()
+    ultima_modificacion = datetime.fromtimestamp(max(int(modificado), int(tramo * ttl)), timezone.utc)
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': ultima_modificacion.strftime('%a, %d %b %Y %H:%M:%S GMT'),
+        'Cache-Control': f"private, max-age={current_app.config['CALENDARIO_TTL']}",
+    }
+    if request.if_none_match:
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+    elif request.if_modified_since and request.if_modified_since >= ultima_modificacion:
+        return Response(status=304, headers=headers)
+    cuerpo = cache_calendario.get(clave, seq, primario(lambda: ''.join(construir()).encode('utf-8')))
+    return Response(cuerpo, mimetype='text/calendar', headers=headers)
+
+@api.route('/calendario/<token>/reuniones.ics', methods=['GET'])
+def calendario_reuniones(token):
+    if not User.query.filter_by(calendar_token=token).with_entities(User.id).first():
+        return jsonify({'message': 'Calendario no encontrado'}), 404
+    desde, hasta = _ventana_calendario()
+
+    def construir():
+        reuniones = Reunion.query.options(defer(Reunion.necesita_comida), defer(Reunion.proveedor)).filter(Reunion.end_time >= datetime.combine(desde, time(0, 0), timezone.utc), Reunion.start_time < datetime.combine(hasta, time(0, 0), timezone.utc)).order_by(Reunion.start_time).yield_per(500)
+        series = series_en_ventana(datetime.combine(desde, time(0, 0), ZONA_LOCAL), datetime.combine(hasta, time(0, 0), ZONA_LOCAL))
+        dtstamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        return calendario('Reuniones - Julia Tours', chain(vevents_reuniones(reuniones, dtstamp), vevents_series(series, dtstamp, ZONA_LOCAL)))
+    return _responder_ics(('reuniones.ics', desde), 'reunion', construir)
+
+@api.route('/calendario/<token>/guardias.ics', methods=['GET'])
+def calendario_guardias(token):
+    fila = User.query.filter_by(calendar_token=token).with_entities(User.guardia_nro).first()
+    if not fila:
+        return jsonify({'message': 'Calendario no encontrado'}), 404
+    guardia_nro = fila.guardia_nro
+    desde, hasta = _ventana_calendario()
+
+    def construir():
+        # Las guardias del grupo del usuario más los feriados (guardia_nro 5)
+        grupos = [5] if guardia_nro is None else [guardia_nro, 5]
+        fechas = GuardiaFecha.query.filter(GuardiaFecha.guardia_nro.in_(grupos), GuardiaFecha.fecha >= desde, GuardiaFecha.fecha < hasta).order_by(GuardiaFecha.fecha).all()
+        dtstamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        nombre = f'Guardia {guardia_nro} - Julia Tours' if guardia_nro else 'Feriados - Julia Tours'
+        return calendario(nombre, vevents_guardias(fechas, dtstamp))
+    return _responder_ics(('guardias.ics', guardia_nro, desde), 'guardia_fecha', construir)
+
+@api.route('/eventos', methods=['POST'])
 @permission_required('EDITOR', 'SUPERUSER')
 def create_evento(current_user):
     data = request.get_json()
     
     if not data.get('titulo') or not data.get('fecha_hora') or not data.get('ubicacion_evento'):
         return jsonify({'message': 'Título, Fecha/Hora y Ubicación son obligatorios'}), 400
+    if data.get('banner_image') and not nombre_upload_valido(data.get('banner_image')):
+        return jsonify({'message': 'Imagen de banner inválida'}), 400
+    try:
+        form_dinamico = normalizar_esquema(data.get('form_dinamico'))
+    except EsquemaInvalido as e:
+        return jsonify({'message': 'El formulario de inscripción tiene errores', 'errores': e.errores}), 400
 
     nuevo_evento = Evento(
         titulo=data.get('titulo'),
@@ -622,61 +1642,64 @@ def create_evento(current_user):
         detalle=data.get('detalle'),
         ubicacion_evento=data.get('ubicacion_evento'),
         hidden_from_users=data.get('hidden_from_users') or [],
-        form_dinamico=data.get('form_dinamico'),
+        form_dinamico=form_dinamico,
+        form_version=1,
         user_id=current_user.id
     )
     db.session.add(nuevo_evento)
     db.session.commit()
+    publish_change('evento', nuevo_evento.id, 'creado', sucursal=nuevo_evento.ubicacion_evento, ocultar_a=nuevo_evento.hidden_from_users)
     return jsonify(nuevo_evento.to_dict()), 201
 
-@app.route('/eventos', methods=['GET'])
+@api.route('/eventos', methods=['GET'])
 @token_required
 def get_eventos(current_user):
-    now = datetime.now(timezone.utc)
-    
-    base_query = Evento.query.filter(Evento.fecha_hora >= now)
-    
-    if current_user.role != UserRole.SUPERUSER:
-        base_query = base_query.filter(
-            or_(
-                Evento.ubicacion_evento == current_user.sucursal,
-                Evento.ubicacion_evento == 'Julia Tours'
-            )
-        )
-
-    potential_events = base_query.order_by(Evento.fecha_hora.asc()).all()
-
-    eventos_visibles = []
-    for evento in potential_events:
-        if current_user.role == UserRole.SUPERUSER:
-            eventos_visibles.append(evento)
-            continue
-
-        hidden_list = evento.hidden_from_users or []
-        
+    return jsonify(eventos_visibles(current_user))
 
-        try:
-            hidden_ids = {int(uid) for uid in hidden_list}
-        except (ValueError, TypeError):
-            hidden_ids = set()
+def _construir_eventos_proximos():
+    eventos = Evento.query.options(joinedload(Evento.creador)).filter(Evento.fecha_hora >= datetime.now(timezone.utc)).order_by(Evento.fecha_hora.asc()).all()
+    return [(evento.fecha_hora, evento.to_dict()) for evento in eventos]
 
-        if current_user.id not in hidden_ids:
-            eventos_visibles.append(evento)
-        
-    user_inscripcion_ids = {insc.evento_id for insc in Inscripcion.query.filter_by(user_id=current_user.id).all()}
+def eventos_visibles(user):
+    """Eventos futuros que `user` puede ver, con la marca is_user_inscribed."""
+    proximos = cache_respuestas.get(('eventos',), feed.version('evento', 'usuario'), primario(_construir_eventos_proximos))
+    now = datetime.now(timezone.utc)
     eventos_data = []
-    for evento in eventos_visibles:
-        evento_dict = evento.to_dict()
-        evento_dict['is_user_inscribed'] = evento.id in user_inscripcion_ids
-        eventos_data.append(evento_dict)
-        
-    return jsonify(eventos_data)
+    for fecha_hora, evento in proximos:
+        # El cache puede guardar eventos que ya pasaron desde que se armó
+        if (fecha_hora if fecha_hora.tzinfo else fecha_hora.replace(tzinfo=timezone.utc)) < now:
+            continue
+        if user.role != UserRole.SUPERUSER:
+            if evento['ubicacion_evento'] not in (user.sucursal, 'Julia Tours'):
+                continue
+            try:
+                hidden_ids = {int(uid) for uid in evento['hidden_from_users']}
+            except (ValueError, TypeError):
+                hidden_ids = set()
+            if user.id in hidden_ids:
+                continue
+        eventos_data.append(evento)
+    user_inscripcion_ids = {evento_id for (evento_id,) in db.session.query(Inscripcion.evento_id).filter(Inscripcion.user_id == user.id, Inscripcion.evento_id.in_([e['id'] for e in eventos_data]))} if eventos_data else set()
+    return [dict(evento, is_user_inscribed=evento['id'] in user_inscripcion_ids) for evento in eventos_data]
+
 
+@api.route('/eventos/<int:evento_id>/adjuntos.zip', methods=['GET'])
+@token_required
+def download_evento_attachments(current_user, evento_id):
+    evento = db.session.get(Evento, evento_id) or (db.session.get(EventoArchivo, evento_id) if incluir_archivo() else None)
+    if not evento: return jsonify({'message': 'Evento no encontrado'}), 404
+    # Los eventos no tienen Attachment: se descargan el banner y los archivos subidos que usa el detalle
+    guardados = ([evento.banner_image] if evento.banner_image else []) + list(dict.fromkeys(URL_UPLOAD_REGEX.findall(evento.detalle or '')))
+    tipos = dict(db.session.query(UploadMeta.saved_filename, UploadMeta.mimetype).filter(UploadMeta.saved_filename.in_(guardados))) if guardados else {}
+    archivos = [(saved, f'banner{os.path.splitext(saved)[1]}' if i == 0 and evento.banner_image else saved, tipos.get(saved)) for i, saved in enumerate(guardados)]
+    return respuesta_zip(f'adjuntos-evento-{evento_id}.zip', archivos)
 
-@app.route('/eventos/<int:evento_id>', methods=['GET', 'PUT', 'DELETE'])
+@api.route('/eventos/<int:evento_id>', methods=['GET', 'PUT', 'DELETE'])
 @token_required
 def handle_single_evento(current_user, evento_id):
     evento = db.session.get(Evento, evento_id)
+    if not evento and request.method == 'GET' and incluir_archivo():
+        evento = db.session.get(EventoArchivo, evento_id)   # los archivados son de solo lectura
     if not evento:
         return jsonify({'message': 'Evento no encontrado'}), 404
 
@@ -690,6 +1713,8 @@ def handle_single_evento(current_user, evento_id):
 
     if request.method == 'PUT':
         data = request.get_json()
+        if data.get('banner_image') and not nombre_upload_valido(data.get('banner_image')):
+            return jsonify({'message': 'Imagen de banner inválida'}), 400
         evento.titulo = data.get('titulo', evento.titulo)
         evento.ubicacion_evento = data.get('ubicacion_evento', evento.ubicacion_evento)
         evento.banner_image = data.get('banner_image', evento.banner_image)
@@ -698,10 +1723,19 @@ def handle_single_evento(current_user, evento_id):
         if data.get('fecha_hora'):
             evento.fecha_hora = parse_date(data.get('fecha_hora'))
         evento.detalle = data.get('detalle', evento.detalle)
-        evento.form_dinamico = data.get('form_dinamico', evento.form_dinamico)
+        if 'form_dinamico' in data:
+            try:
+                form_dinamico = normalizar_esquema(data['form_dinamico'])
+            except EsquemaInvalido as e:
+                db.session.rollback()
+                return jsonify({'message': 'El formulario de inscripción tiene errores', 'errores': e.errores}), 400
+            if form_dinamico != evento.form_dinamico:
+                evento.form_dinamico = form_dinamico
+                evento.form_version = (evento.form_version or 0) + 1
         evento.hidden_from_users = data.get('hidden_from_users') or []
 
         db.session.commit()
+        publish_change('evento', evento.id, 'actualizado', sucursal=evento.ubicacion_evento, ocultar_a=evento.hidden_from_users)
         return jsonify(evento.to_dict()), 200
 
     # --- MÉTODO DELETE: Eliminar el evento ---
@@ -709,94 +1743,158 @@ def handle_single_evento(current_user, evento_id):
         try:
             # Opcional pero recomendado: eliminar el banner del disco si existe
             if evento.banner_image:
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], evento.banner_image)
+                image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], evento.banner_image)
                 if os.path.exists(image_path):
                     os.remove(image_path)
             
             db.session.delete(evento)
             db.session.commit()
+            publish_change('evento', evento_id, 'eliminado', sucursal=evento.ubicacion_evento, ocultar_a=evento.hidden_from_users)
             return jsonify({'message': 'Evento eliminado correctamente'}), 200
         except Exception as e:
             db.session.rollback()
             return jsonify({'message': f'Error al eliminar el evento: {str(e)}'}), 500
 
-@app.route('/eventos/<int:evento_id>/inscribir', methods=['POST'])
+@api.route('/eventos/<int:evento_id>/inscribir', methods=['POST'])
 @token_required
 def inscribir_evento(current_user, evento_id):
+    evento = db.session.get(Evento, evento_id)
+    if not evento: return jsonify({'message': 'Evento no encontrado'}), 404
+    data = request.get_json()
+    participa = data.get('participa', False)
+    respuestas = None
+    if participa:
+        # Las preguntas solo aplican a quien participa
+        respuestas, errores = validador_para(evento).validar(data.get('respuestas_dinamicas'))
+        if errores: return jsonify({'message': 'Hay respuestas inválidas', 'errores': errores}), 400
     inscripcion = Inscripcion.query.filter_by(user_id=current_user.id, evento_id=evento_id).first()
     if not inscripcion: inscripcion = Inscripcion(user_id=current_user.id, evento_id=evento_id)
-    data = request.get_json()
-    inscripcion.participa, inscripcion.detalles_usuario, inscripcion.respuestas_dinamicas = data.get('participa', False), data.get('detalles_usuario'), data.get('respuestas_dinamicas')
+    inscripcion.participa, inscripcion.detalles_usuario, inscripcion.respuestas_dinamicas = participa, data.get('detalles_usuario'), respuestas
     db.session.add(inscripcion)
     db.session.commit()
     return jsonify(inscripcion.to_dict())
 
-@app.route('/eventos/<int:evento_id>/mi-inscripcion', methods=['GET'])
+@api.route('/eventos/<int:evento_id>/mi-inscripcion', methods=['GET'])
 @token_required
 def get_mi_inscripcion(current_user, evento_id):
     inscripcion = Inscripcion.query.filter_by(user_id=current_user.id, evento_id=evento_id).first()
+    if not inscripcion and incluir_archivo():
+        inscripcion = InscripcionArchivo.query.filter_by(user_id=current_user.id, evento_id=evento_id).first()
     if not inscripcion: return jsonify(None), 200
     return jsonify(inscripcion.to_dict())
 
-@app.route('/eventos/<int:evento_id>/inscripciones', methods=['GET'])
+@api.route('/eventos/<int:evento_id>/inscripciones', methods=['GET'])
 @permission_required('EDITOR', 'SUPERUSER')
 def get_inscripciones_evento(current_user, evento_id):
     evento = db.session.get(Evento, evento_id)
+    if not evento and incluir_archivo() and db.session.get(EventoArchivo, evento_id):
+        return jsonify([insc.to_dict() for insc in InscripcionArchivo.query.filter_by(evento_id=evento_id).all()])
     if not evento: return jsonify({'message': 'Evento no encontrado'}), 404
     inscripciones = evento.inscripciones.all()
     return jsonify([insc.to_dict() for insc in inscripciones])
 
-@app.route('/cumpleanos', methods=['GET'])
+@api.route('/cumpleanos', methods=['GET'])
 @token_required
 def get_cumpleanos(current_user):
-    today = datetime.now().date()
-    
+    return jsonify(cumpleanos_de_hoy())
+
+def _construir_cumpleanos_de_hoy(today):
     # 1. Buscamos a los cumpleañeros de hoy
     cumpleaneros = User.query.filter(
         func.extract('month', User.fecha_nacimiento) == today.month,
         func.extract('day', User.fecha_nacimiento) == today.day
     ).all()
+    gifs_de_hoy = dict(db.session.query(CumpleGif.user_id, CumpleGif.gif_url).filter(CumpleGif.fecha == today, CumpleGif.user_id.in_([u.id for u in cumpleaneros])).all()) if cumpleaneros else {}
+    datos = [(user.id, user.nombre, user.apellido, user.sector, user.profile_image) for user in cumpleaneros]
 
     results = []
-    for user in cumpleaneros:
-        # 2. Para cada cumpleañero, buscamos si ya tiene un GIF asignado para hoy
-        gif_asignado = CumpleGif.query.filter_by(user_id=user.id, fecha=today).first()
-
-        if not gif_asignado:
-            # Si NO tiene GIF, le asignamos uno aleatorio
-            try:
-                giphy_url = f"https://api.giphy.com/v1/gifs/search?api_key=9OgBGuwBfcLyAMuxeKkqNFQMelskBRVN&q=happy+birthday+funny&limit=50&rating=g"
-                response = requests.get(giphy_url)
-                response.raise_for_status() # Lanza un error si la petición falla (ej. 4xx o 5xx)
-                
-                gifs = response.json().get('data', [])
-                if gifs:
-                    random_gif = random.choice(gifs)
-                    gif_url = random_gif['images']['original']['url']
-                    
-                    # Guardamos el GIF en nuestra base de datos
-                    nuevo_gif = CumpleGif(user_id=user.id, fecha=today, gif_url=gif_url)
-                    db.session.add(nuevo_gif)
-                    db.session.commit()
-                    gif_asignado = nuevo_gif
-            except Exception as e:
-                print(f"Error al obtener GIF de Giphy: {e}")
-                gif_asignado = None # En caso de error, no habrá GIF
-
+    for user_id, nombre, apellido, sector, profile_image in datos:
+        # 2. Si el cumpleañero todavía no tiene GIF para hoy, se le asigna uno
         results.append({
-            'id': user.id,
-            'nombre': user.nombre,
-            'apellido': user.apellido,
-            'sector': user.sector,
-            'profile_image': user.profile_image,
-            'gif_url': gif_asignado.gif_url if gif_asignado else None
+            'id': user_id,
+            'nombre': nombre,
+            'apellido': apellido,
+            'sector': sector,
+            'profile_image': profile_image,
+            'gif_url': gifs_de_hoy.get(user_id) or asignar_gif(user_id, today)
         })
-        
-    return jsonify(results)
+    return results
+
+GIPHY_URL = "https://api.giphy.com/v1/gifs/search?api_key=9OgBGuwBfcLyAMuxeKkqNFQMelskBRVN&q=happy+birthday+funny&limit=50&rating=g"
+# Después de un error de Giphy no se lo vuelve a llamar por este tiempo (segundos)
+GIPHY_REINTENTO = 60
+_giphy_caido_hasta = 0.0
+
+def _gif_aleatorio():
+    response = http().get(GIPHY_URL, timeout=5)
+    response.raise_for_status() # Lanza un error si la petición falla (ej. 4xx o 5xx)
+    gifs = response.json().get('data', [])
+    return random.choice(gifs)['images']['original']['url'] if gifs else None
+
+def asignar_gif(user_id, fecha):
+    """URL del GIF de cumpleaños de `user_id` para `fecha`; si no tiene, le asigna uno (o None si Giphy falla)."""
+    # Los pedidos simultáneos de este proceso esperan al primero en lugar de repetir la llamada a Giphy
+    return vuelos.hacer(('cumple_gif', user_id, fecha), lambda: _asignar_gif(user_id, fecha))
+
+def _asignar_gif(user_id, fecha):
+    global _giphy_caido_hasta
+    consulta = select(CumpleGif.gif_url).filter_by(user_id=user_id, fecha=fecha)
+    # Otro worker pudo guardarlo después de que el pedido leyó los GIFs de hoy: una lectura
+    # barata antes de salir a Giphy
+    with db.engine.connect() as conn:
+        existente = conn.execute(consulta).scalar()
+    if existente:
+        return existente
+    # Giphy se llama sin transacción ni lock tomados: mientras espera no retiene una conexión
+    gif_url = None
+    if monotonic() >= _giphy_caido_hasta:
+        try:
+            gif_url = _gif_aleatorio()
+        except Exception as e:
+            _giphy_caido_hasta = monotonic() + GIPHY_REINTENTO
+            print(f"Error al obtener GIF de Giphy: {e}")
+    if not gif_url:
+        # No se guarda nada y cambia la versión: la lista sin GIF no queda en el cache
+        feed.marcar_cambio('cumple_gif')
+        return None
+    try:
+        # Conexión y transacción propias: la sesión del pedido no se toca. Entre procesos, el
+        # advisory lock hace esperar a los otros workers, que encuentran el GIF ya guardado.
+        with db.engine.begin() as conn:
+            bloqueo_db(conn, 'cumple_gif', user_id, fecha.isoformat())
+            existente = conn.execute(consulta).scalar()
+            if existente:
+                return existente
+            conn.execute(insert(CumpleGif).values(user_id=user_id, fecha=fecha, gif_url=gif_url))
+    except IntegrityError:
+        # Otro proceso lo guardó primero (sin advisory lock, ej. SQLite): se usa el suyo
+        with db.engine.connect() as conn:
+            return conn.execute(consulta).scalar()
+    return gif_url
+
+def cumpleanos_de_hoy():
+    # Se arma una vez por día (y al cambiar usuarios o GIFs): evita repetir las llamadas a Giphy
+    today = datetime.now().date()
+    return cache_respuestas.get(('cumpleanos', today), feed.version('usuario', 'cumple_gif'), primario(lambda: _construir_cumpleanos_de_hoy(today)))
+
+def _construir_proximos_cumpleanos(today, dias=7):
+    # Mismo criterio que la página de cumpleaños: de mañana a `dias` días
+    proximos = []
+    for user in db.session.query(User.id, User.nombre, User.apellido, User.sector, User.profile_image, User.fecha_nacimiento).filter(User.fecha_nacimiento.isnot(None)):
+        for i in range(1, dias + 1):
+            fecha = today + timedelta(days=i)
+            if (user.fecha_nacimiento.month, user.fecha_nacimiento.day) == (fecha.month, fecha.day):
+                proximos.append({'id': user.id, 'nombre': user.nombre, 'apellido': user.apellido, 'sector': user.sector, 'profile_image': user.profile_image, 'fecha': fecha.isoformat()})
+    return sorted(proximos, key=lambda p: p['fecha'])
+
+def proximos_cumpleanos():
+    today = datetime.now().date()
+    return cache_respuestas.get(('proximos_cumpleanos', today), feed.version('usuario'), primario(lambda: _construir_proximos_cumpleanos(today)))
 
 # Endpoint para cambiar el GIF de un usuario
-@app.route('/cumpleanos/<int:user_id>/change-gif', methods=['POST'])
+@api.route('/cumpleanos/<int:user_id>/change-gif', methods=['POST'])
 @token_required
+@limitar('change_gif')
 def change_cumple_gif(current_user, user_id):
     today = datetime.now().date()
     
@@ -810,17 +1908,13 @@ def change_cumple_gif(current_user, user_id):
 
     # Obtenemos un nuevo GIF aleatorio de Giphy
     try:
-        giphy_url = f"https://api.giphy.com/v1/gifs/search?api_key=9OgBGuwBfcLyAMuxeKkqNFQMelskBRVN&q=happy+birthday+funny&limit=50&rating=g"
-        response = requests.get(giphy_url)
-        response.raise_for_status()
-        
-        gifs = response.json().get('data', [])
-        if gifs:
-            new_gif_url = random.choice(gifs)['images']['original']['url']
-            
+        new_gif_url = _gif_aleatorio()
+        if new_gif_url:
+
             # Actualizamos la URL en la base de datos
             gif_a_cambiar.gif_url = new_gif_url
             db.session.commit()
+            feed.marcar_cambio('cumple_gif')
             
             return jsonify({'message': 'GIF actualizado', 'new_gif_url': new_gif_url}), 200
         else:
@@ -829,8 +1923,183 @@ def change_cumple_gif(current_user, user_id):
         return jsonify({'message': f'Error al contactar con Giphy: {str(e)}'}), 500
 
 
+# --- SECCIÓN DE DASHBOARD ---
+# Todo lo que muestra la página de inicio en una sola respuesta. Las partes que son iguales para
+# todos (primera página de novedades, cumpleaños, eventos próximos) salen de cache_respuestas; las
+# que falten se arman en paralelo, cada una en su propio contexto y conexión.
+ejecutor_dashboard = ThreadPoolExecutor(max_workers=3, thread_name_prefix='dashboard')
+
+def _en_contexto(funcion):
+    app = current_app._get_current_object()
+    def correr():
+        with app.app_context():
+            return funcion()
+    return correr
+
+@api.route('/dashboard', methods=['GET'])
+@token_required
+def get_dashboard(current_user):
+    partes = {
+        'novedades': ejecutor_dashboard.submit(_en_contexto(lambda: pagina_novedades(1))),
+        'cumpleanos_hoy': ejecutor_dashboard.submit(_en_contexto(cumpleanos_de_hoy)),
+        'proximos_cumpleanos': ejecutor_dashboard.submit(_en_contexto(proximos_cumpleanos)),
+    }
+    eventos = eventos_visibles(current_user)
+    return jsonify({
+        'perfil': dict(perfil_dict(current_user), id=current_user.id, role=current_user.role.name),
+        'novedades': partes['novedades'].result(),
+        'cumpleanos': {'hoy': partes['cumpleanos_hoy'].result(), 'proximos': partes['proximos_cumpleanos'].result()},
+        'eventos': eventos,
+    })
+
+
+# --- COMANDOS DE MANTENIMIENTO (flask --app app <comando>) ---
+@api.cli.command('enviar-digest')
+def enviar_digest_command():
+    """Envía por correo el resumen de novedades, publicaciones y eventos nuevos."""
+    from digest import enviar_digest
+    enviados, errores = enviar_digest(current_app._get_current_object(), mail())
+    print(f"Resúmenes enviados: {enviados}")
+    for error in errores:
+        print(f"Error enviando a usuario {error['user_id']}: {error['error']}")
+
+@api.cli.command('limpiar-uploads')
+@click.option('--dry-run', is_flag=True, help='Solo informa, no mueve ni borra archivos.')
+def limpiar_uploads_command(dry_run):
+    """Pone en cuarentena los archivos subidos que ya no se usan y borra los que cumplieron la cuarentena."""
+    resumen = limpiar_uploads(current_app._get_current_object(), dry_run=dry_run)
+    print(f"En cuarentena: {len(resumen['en_cuarentena'])}, restaurados: {len(resumen['restaurados'])}, eliminados: {len(resumen['eliminados'])} ({resumen['bytes_liberados']} bytes)")
+
+@api.cli.command('procesar-contenido')
+@click.option('--todo', is_flag=True, help='Reprocesa todas las filas, no solo las que no tienen extracto.')
+def procesar_contenido_command(todo):
+    """Sanea el HTML y calcula extracto y contadores de posts y novedades existentes."""
+    for modelo in (Post, Novedad):
+        procesados, ultimo_id = 0, 0
+        while True:
+            # Por lotes ordenados por id para no cargar toda la tabla en memoria
+            query = modelo.query.filter(modelo.id > ultimo_id)
+            if not todo:
+                query = query.filter(modelo.excerpt.is_(None))
+            lote = query.order_by(modelo.id).limit(200).all()
+            if not lote:
+                break
+            for entidad in lote:
+                aplicar_contenido(entidad, entidad.content)
+            ultimo_id = lote[-1].id
+            db.session.commit()
+            procesados += len(lote)
+        print(f"{modelo.__tablename__}: {procesados} filas procesadas")
+
+@api.cli.command('extraer-imagenes-inline')
+def extraer_imagenes_inline_command():
+    """Pasa a UPLOAD_FOLDER las imágenes data: URI guardadas dentro del HTML de posts y novedades."""
+    for modelo in (Post, Novedad):
+        procesados, ultimo_id = 0, 0
+        while True:
+            # Se traen de a pocas filas: cada una puede pesar varios MB de base64
+            lote = modelo.query.filter(modelo.id > ultimo_id, modelo.content.like('%data:image/%')).order_by(modelo.id).limit(20).all()
+            if not lote:
+                break
+            for entidad in lote:
+                antes = len(entidad.content)
+                aplicar_contenido(entidad, entidad.content, guardar_imagen_inline(entidad.user_id))
+                print(f"{modelo.__tablename__} {entidad.id}: {antes} -> {len(entidad.content)} bytes")
+            ultimo_id = lote[-1].id
+            db.session.commit()
+            procesados += len(lote)
+        print(f"{modelo.__tablename__}: {procesados} filas con imágenes embebidas procesadas")
+
+@api.cli.command('revalidar-inscripciones')
+@click.option('--evento', 'evento_id', type=int, default=None, help='Solo las inscripciones de este evento.')
+@click.option('--limpiar', is_flag=True, help='Guarda las respuestas normalizadas de las inscripciones válidas.')
+def revalidar_inscripciones_command(evento_id, limpiar):
+    """Valida las respuestas de las inscripciones existentes contra el formulario actual de cada evento."""
+    query = Inscripcion.query.filter(Inscripcion.participa.is_(True)).order_by(Inscripcion.evento_id, Inscripcion.id)
+    if evento_id:
+        query = query.filter(Inscripcion.evento_id == evento_id)
+    eventos = {evento.id: evento for evento in Evento.query.options(defer(Evento.detalle)).all()}
+    revisadas, invalidas, limpiadas = 0, 0, 0
+    for inscripcion in query.yield_per(500):
+        respuestas, errores = validador_para(eventos[inscripcion.evento_id]).validar(inscripcion.respuestas_dinamicas)
+        revisadas += 1
+        if errores:
+            invalidas += 1
+            print(f"Evento {inscripcion.evento_id}, inscripción {inscripcion.id} (usuario {inscripcion.user_id}): {errores}")
+        elif limpiar and respuestas != (inscripcion.respuestas_dinamicas or {}):
+            inscripcion.respuestas_dinamicas = respuestas
+            limpiadas += 1
+    if limpiar:
+        db.session.commit()
+    print(f"Inscripciones revisadas: {revisadas}, con errores: {invalidas}, normalizadas: {limpiadas}")
+
+@api.cli.command('purgar-auditoria')
+@click.option('--dias', type=int, default=None, help='Antigüedad máxima a conservar (por defecto AUDITORIA_RETENCION_DIAS).')
+def purgar_auditoria_command(dias):
+    """Borra los registros de auditoría más viejos que la retención configurada."""
+    borrados = purgar_auditoria(current_app.config['AUDITORIA_RETENCION_DIAS'] if dias is None else dias)
+    print(f"Registros de auditoría borrados: {borrados}")
+
+@api.cli.command('archivar')
+@click.option('--solo', multiple=True, help='Archivar solo estos grupos (novedad, evento, reunion, guardia_fecha, cumple_gif).')
+@click.option('--dry-run', is_flag=True, help='Solo cuenta las filas que se moverían.')
+def archivar_command(solo, dry_run):
+    """Mueve a las tablas de archivo las filas más viejas que ARCHIVO_HORIZONTE_DIAS."""
+    for grupo, cantidad in archivar(current_app._get_current_object(), solo=solo, simular=dry_run).items():
+        print(f"{grupo}: {cantidad} filas {'a archivar' if dry_run else 'archivadas'}")
+
+@api.cli.command('actualizar-db')
+def actualizar_db_command():
+    """Crea las tablas nuevas y agrega las columnas que falten en las existentes."""
+    problemas = actualizar_esquema()
+    for problema in problemas:
+        print(f"No se pudo crear la restricción {problema['restriccion']}: {problema['error']}")
+        for conflicto in problema['conflictos']:
+            a, b = conflicto['reuniones']
+            print(f"  {conflicto['ubicacion']}: reunión {a['id']} ({a['start_time']} a {a['end_time']}) se superpone con {b['id']} ({b['start_time']} a {b['end_time']})")
+    if problemas:
+        print("Hay que corregir esas reservas y volver a correr actualizar-db.")
+        sys.exit(1)
+    print("Esquema actualizado.")
+
+# --- APLICACIÓN ---
+def create_app(config=None, **ajustes):
+    """Arma la aplicación con el perfil `config` ('dev', 'test', 'bench', 'prod' o una clase de
+    configuración); sin argumento usa INTRANET_PERFIL. `ajustes` pisa valores puntuales del perfil."""
+    inicio = perf_counter()
+    if config is None or isinstance(config, str):
+        perfil = config or os.environ.get('INTRANET_PERFIL', 'prod')
+        if perfil not in PERFILES:
+            raise ValueError(f"Perfil desconocido: {perfil} (opciones: {', '.join(PERFILES)})")
+        config = PERFILES[perfil]
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.config.update(ajustes)
+
+    configurar_motores(app)
+    db.init_app(app)
+    bcrypt.init_app(app)
+    # El frontend lee y repite HEADER_ESCRITURA (ver basedatos.py)
+    CORS(app, expose_headers=[HEADER_ESCRITURA])
+    app.register_blueprint(api)
+    cache_calendario.ttl = app.config['CALENDARIO_TTL']
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    if app.config.get('CREAR_ESQUEMA'):
+        with app.app_context():
+            actualizar_esquema()
+    app.extensions['auditoria'] = RegistroAuditoria(app).iniciar()
+    app.extensions['limites'] = Limitador(app)
+    app.extensions['contrasenas'] = HasherContrasenas(app, bcrypt)
+    app.extensions['cambios_externos'] = CambiosExternos(app)
+    app.before_request(app.extensions['cambios_externos'].revisar)
+    app.after_request(anunciar_escritura)
+
+    app.config['ARRANQUE_MS'] = round((perf_counter() - inicio) * 1000, 1)
+    app.logger.info('Aplicación creada en %s ms', app.config['ARRANQUE_MS'])
+    return app
 
 if __name__ == '__main__':
+    app = create_app('dev')
     with app.app_context():
-        db.create_all()
+        actualizar_esquema()
     app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
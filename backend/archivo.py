@@ -0,0 +1,111 @@
+import time
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Date, delete, func, insert, select
+
+from change_feed import feed, registrar_cambio_externo
+from models import (db, Novedad, NovedadArchivo, Attachment, AttachmentArchivo, Evento, EventoArchivo, Inscripcion,
+                    InscripcionArchivo, Reunion, ReunionArchivo, GuardiaFecha, GuardiaFechaArchivo, CumpleGif, CumpleGifArchivo)
+
+
+# --- Archivo de filas viejas ---
+# Las novedades, eventos (con sus inscripciones), reuniones, fechas de guardia y GIFs de cumpleaños
+# más viejos que ARCHIVO_HORIZONTE_DIAS se mueven a las tablas *_archivo (ver models.py). Se mueven
+# de a ARCHIVO_LOTE filas, cada lote en su propia transacción corta (copiar + borrar), con una pausa
+# entre lotes: la tabla original nunca queda bloqueada más que lo que tarda un lote.
+#
+# Las tablas existentes no están particionadas y convertirlas requiere recrearlas; mover a tablas
+# de archivo funciona igual en PostgreSQL y en SQLite y no necesita parar la aplicación.
+
+# nombre (clave de ARCHIVO_HORIZONTE_DIAS y entidad del feed), modelo, archivo, columna de fecha e hijos
+# [(modelo, archivo, FK al padre)] que se mueven junto con cada fila
+Grupo = namedtuple('Grupo', 'nombre modelo archivo fecha hijos')
+
+GRUPOS = [
+    Grupo('novedad', Novedad, NovedadArchivo, Novedad.created_at, [(Attachment, AttachmentArchivo, Attachment.novedad_id)]),
+    Grupo('evento', Evento, EventoArchivo, Evento.fecha_hora, [(Inscripcion, InscripcionArchivo, Inscripcion.evento_id)]),
+    Grupo('reunion', Reunion, ReunionArchivo, Reunion.end_time, []),
+    Grupo('guardia_fecha', GuardiaFecha, GuardiaFechaArchivo, GuardiaFecha.fecha, []),
+    Grupo('cumple_gif', CumpleGif, CumpleGifArchivo, CumpleGif.fecha, []),
+]
+
+
+def _corte(grupo, dias):
+    corte = datetime.now(timezone.utc) - timedelta(days=dias)
+    return corte.date() if isinstance(grupo.fecha.type, Date) else corte
+
+
+def _copiar_y_borrar(conn, modelo, archivo, condicion):
+    origen = modelo.__table__
+    columnas = [c.name for c in origen.columns]
+    conn.execute(insert(archivo.__table__).from_select(columnas, select(*origen.columns).where(condicion)))
+    conn.execute(delete(origen).where(condicion))
+
+
+def _mover_lote(grupo, corte, lote):
+    tabla = grupo.modelo.__table__
+    with db.engine.begin() as conn:
+        # FOR UPDATE SKIP LOCKED (PostgreSQL): no espera filas que alguien está editando, las toma en otra pasada
+        ids = conn.execute(
+            select(tabla.c.id).where(grupo.fecha < corte).order_by(tabla.c.id).limit(lote).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            return 0
+        for modelo, archivo, fk in grupo.hijos:
+            _copiar_y_borrar(conn, modelo, archivo, fk.in_(ids))
+        _copiar_y_borrar(conn, grupo.modelo, grupo.archivo, tabla.c.id.in_(ids))
+        # Para los servidores: el comando corre en otro proceso y su feed no es el de ellos
+        registrar_cambio_externo(conn, grupo.nombre)
+    return len(ids)
+
+
+def archivar(app, solo=None, simular=False):
+    """Mueve al archivo las filas más viejas que el horizonte de cada grupo.
+
+    Devuelve {grupo: filas movidas} (con simular=True, las que se moverían).
+    """
+    horizontes = app.config['ARCHIVO_HORIZONTE_DIAS']
+    lote, pausa = app.config['ARCHIVO_LOTE'], app.config['ARCHIVO_PAUSA']
+    resumen = {}
+    for grupo in GRUPOS:
+        dias = horizontes.get(grupo.nombre)
+        if not dias or (solo and grupo.nombre not in solo):
+            continue
+        corte = _corte(grupo, dias)
+        if simular:
+            resumen[grupo.nombre] = db.session.query(func.count()).select_from(grupo.modelo).filter(grupo.fecha < corte).scalar()
+            continue
+        movidas = 0
+        while True:
+            cantidad = _mover_lote(grupo, corte, lote)
+            movidas += cantidad
+            if cantidad < lote:
+                break
+            time.sleep(pausa)
+        if movidas:
+            feed.marcar_cambio(grupo.nombre)
+        resumen[grupo.nombre] = movidas
+    return resumen
+
+
+def iniciar_archivo_periodico(app):
+    """Corre archivar cada ARCHIVO_INTERVALO_HORAS en un hilo de fondo (0 = desactivado)."""
+    intervalo = app.config.get('ARCHIVO_INTERVALO_HORAS') or 0
+    if intervalo <= 0:
+        return None
+
+    def bucle():
+        while True:
+            time.sleep(intervalo * 3600)
+            try:
+                with app.app_context():
+                    resumen = archivar(app)
+                print(f"Archivo de filas viejas: {resumen}")
+            except Exception as e:
+                print(f"Error archivando filas viejas: {e}")
+
+    hilo = threading.Thread(target=bucle, name='archivo', daemon=True)
+    hilo.start()
+    return hilo
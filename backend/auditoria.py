@@ -0,0 +1,261 @@
+import atexit
+import enum
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import delete, event, inspect, insert, select
+
+from basedatos import SesionRuteada
+from models import db, AuditLog, User, Post, Novedad, Attachment, Evento, AgendaContact, Reunion, ReunionSerie, Guardia, GuardiaFecha
+
+
+# --- Registro de auditoría ---
+# Los cambios se toman de la sesión de SQLAlchemy (lo que se insertó, modificó o borró en cada
+# flush, y las sentencias INSERT / UPDATE / DELETE en bloque que pasan por session.execute) y
+# recién pasan al registro cuando la transacción hace commit; si hay rollback se descartan. El pedido solo agrega los registros a un buffer en memoria: un hilo los escribe en
+# AuditLog en lotes (INSERT de varias filas), así los endpoints no pagan un INSERT extra.
+# Si el buffer se llena, el pedido espera un momento a que el hilo libere lugar; si sigue lleno,
+# el registro se descarta y se cuenta en `descartados`.
+
+AUDITADOS = {
+    User: 'usuario',
+    Post: 'post',
+    Novedad: 'novedad',
+    Attachment: 'adjunto',
+    Evento: 'evento',
+    AgendaContact: 'agenda',
+    Reunion: 'reunion',
+    ReunionSerie: 'reunion_serie',
+    Guardia: 'guardia',
+    GuardiaFecha: 'guardia_fecha',
+}
+# Cambian solos (login, recuperación de contraseña, datos derivados del HTML): no se registran
+CAMPOS_IGNORADOS = {'verification_code', 'reset_token', 'reset_token_expiration', 'excerpt', 'word_count', 'image_count', 'link_count'}
+# Se registra que cambiaron, pero no el valor
+CAMPOS_SENSIBLES = {'password', 'calendar_token'}
+LARGO_MAXIMO = 200
+
+
+def _valor(campo, valor):
+    if campo in CAMPOS_SENSIBLES:
+        return '***' if valor is not None else None
+    if isinstance(valor, enum.Enum):
+        return valor.name
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, str) and len(valor) > LARGO_MAXIMO:
+        return valor[:LARGO_MAXIMO] + '…'
+    if valor is None or isinstance(valor, (bool, int, float, str, list, dict)):
+        return valor
+    return str(valor)
+
+
+def _identificador(estado):
+    # En after_flush los objetos nuevos todavía no tienen identity, pero sí la PK asignada
+    clave = estado.mapper.primary_key_from_instance(estado.obj())
+    return ','.join(str(v) for v in clave) if any(v is not None for v in clave) else None
+
+
+def _registro(entidad, entidad_id, accion, cambios):
+    return {
+        'fecha': datetime.now(timezone.utc),
+        'actor_id': g.get('usuario_id') if has_request_context() else None,
+        'entidad': entidad,
+        'entidad_id': entidad_id,
+        'accion': accion,
+        'cambios': cambios or None,
+        'ip': request.remote_addr if has_request_context() else None,
+    }
+
+
+def _capturar(session):
+    registros = []
+    for objetos, accion in ((session.new, 'creado'), (session.dirty, 'modificado'), (session.deleted, 'borrado')):
+        for objeto in objetos:
+            entidad = AUDITADOS.get(type(objeto))
+            if not entidad:
+                continue
+            estado = inspect(objeto)
+            cambios = {}
+            for atributo in estado.mapper.column_attrs:
+                campo = atributo.key
+                if campo in CAMPOS_IGNORADOS:
+                    continue
+                if accion == 'modificado':
+                    historia = estado.attrs[campo].history
+                    if not historia.has_changes():
+                        continue
+                    antes = historia.deleted[0] if historia.deleted else None
+                    despues = historia.added[0] if historia.added else None
+                    cambios[campo] = {'antes': _valor(campo, antes), 'despues': _valor(campo, despues)}
+                elif campo != 'id' and estado.dict.get(campo) is not None:
+                    cambios[campo] = _valor(campo, estado.dict[campo])
+            if accion == 'modificado' and not cambios:
+                continue
+            registros.append(_registro(entidad, _identificador(estado), accion, cambios))
+    return registros
+
+
+def _datos_fila(fila):
+    return {campo: _valor(campo, valor) for campo, valor in fila.items() if campo != 'id' and campo not in CAMPOS_IGNORADOS and valor is not None}
+
+
+def _capturar_en_bloque(estado):
+    """Registros de un INSERT / UPDATE / DELETE en bloque (session.execute, Query.delete())."""
+    mapper = estado.bind_mapper
+    entidad = AUDITADOS.get(mapper.class_) if mapper is not None else None
+    if not entidad:
+        return []
+    filas = estado.parameters if isinstance(estado.parameters, list) else [estado.parameters] if estado.parameters else []
+    if estado.is_insert:
+        # Sin RETURNING no se conoce el id: queda en los datos de la fila
+        return [_registro(entidad, None, 'creado', _datos_fila(fila)) for fila in filas or [{}]]
+    clave = mapper.primary_key[0]
+    condicion = estado.statement.whereclause
+    if condicion is None and filas:
+        # UPDATE por clave primaria: una fila de parámetros por objeto
+        return [_registro(entidad, str(fila.get(clave.key)), 'modificado', _datos_fila(fila)) for fila in filas]
+    # Las filas afectadas se leen antes de ejecutar la sentencia, con la misma condición
+    consulta = select(clave) if condicion is None else select(clave).where(condicion)
+    ids = estado.session.execute(consulta, bind_arguments={'mapper': mapper}).scalars().all()
+    accion = 'borrado' if estado.is_delete else 'modificado'
+    return [_registro(entidad, str(entidad_id), accion, None) for entidad_id in ids]
+
+
+@event.listens_for(SesionRuteada, 'after_flush')
+def _despues_de_flush(session, flush_context):
+    if not has_app_context() or 'auditoria' not in current_app.extensions:
+        return
+    registros = _capturar(session)
+    if registros:
+        session.info.setdefault('auditoria', []).extend(registros)
+
+
+@event.listens_for(SesionRuteada, 'do_orm_execute')
+def _al_ejecutar(estado):
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    if not has_app_context() or 'auditoria' not in current_app.extensions:
+        return
+    registros = _capturar_en_bloque(estado)
+    if registros:
+        estado.session.info.setdefault('auditoria', []).extend(registros)
+
+
+@event.listens_for(SesionRuteada, 'after_commit')
+def _despues_de_commit(session):
+    registros = session.info.pop('auditoria', None)
+    if registros and has_app_context() and 'auditoria' in current_app.extensions:
+        current_app.extensions['auditoria'].agregar(registros)
+
+
+@event.listens_for(SesionRuteada, 'after_rollback')
+def _despues_de_rollback(session):
+    session.info.pop('auditoria', None)
+
+
+class RegistroAuditoria:
+    def __init__(self, app):
+        self.app = app
+        self.capacidad = app.config['AUDITORIA_CAPACIDAD']
+        self.lote = app.config['AUDITORIA_LOTE']
+        self.intervalo = app.config['AUDITORIA_INTERVALO']
+        self.espera_max = app.config['AUDITORIA_ESPERA_MAX']
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._escribiendo = threading.Lock()
+        self._detenido = threading.Event()
+        self._hilo = None
+        self._ultima_purga = 0
+        self.escritos = 0
+        self.descartados = 0
+        self.errores = 0
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._correr, name='auditoria', daemon=True)
+        self._hilo.start()
+        atexit.register(self.detener)
+        return self
+
+    def agregar(self, registros):
+        with self._cond:
+            for registro in registros:
+                if len(self._buffer) >= self.capacidad:
+                    # Contrapresión: se despierta al escritor y se espera un poco a que haya lugar
+                    self._cond.notify_all()
+                    if not self._cond.wait_for(lambda: len(self._buffer) < self.capacidad, self.espera_max):
+                        self.descartados += 1
+                        continue
+                self._buffer.append(registro)
+            if len(self._buffer) >= self.lote:
+                self._cond.notify_all()
+
+    def vaciar(self):
+        """Escribe todo lo pendiente; devuelve cuántos registros se guardaron."""
+        guardados = 0
+        with self._escribiendo:
+            while True:
+                with self._cond:
+                    lote = [self._buffer.popleft() for _ in range(min(self.lote, len(self._buffer)))]
+                    self._cond.notify_all()
+                if not lote:
+                    return guardados
+                try:
+                    with self.app.app_context(), db.engine.begin() as conn:
+                        conn.execute(insert(AuditLog.__table__).values(lote))
+                except Exception as e:
+                    # Se devuelven al buffer y se reintenta en la próxima pasada
+                    with self._cond:
+                        self._buffer.extendleft(reversed(lote))
+                    self.errores += 1
+                    self.app.logger.error('No se pudo escribir el registro de auditoría: %s', e)
+                    return guardados
+                guardados += len(lote)
+                self.escritos += len(lote)
+
+    def _correr(self):
+        while not self._detenido.is_set():
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._buffer) >= self.lote or self._detenido.is_set(), self.intervalo)
+            errores = self.errores
+            self.vaciar()
+            if self.errores != errores:
+                self._detenido.wait(self.intervalo)   # base caída: no reintentar en un bucle
+            if time.monotonic() - self._ultima_purga > 86400:
+                self._ultima_purga = time.monotonic()
+                try:
+                    with self.app.app_context():
+                        purgar_auditoria(self.app.config['AUDITORIA_RETENCION_DIAS'])
+                except Exception as e:
+                    self.app.logger.error('No se pudo purgar el registro de auditoría: %s', e)
+
+    def detener(self, espera=10):
+        self._detenido.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+        self.vaciar()
+
+    def estado(self):
+        with self._cond:
+            pendientes = len(self._buffer)
+        return {'pendientes': pendientes, 'escritos': self.escritos, 'descartados': self.descartados, 'errores': self.errores}
+
+
+def purgar_auditoria(dias, lote=5000):
+    """Borra, de a lotes, los registros más viejos que `dias`. Con dias=0 no borra nada."""
+    if not dias:
+        return 0
+    corte = datetime.now(timezone.utc) - timedelta(days=dias)
+    borrados = 0
+    while True:
+        ids = select(AuditLog.id).where(AuditLog.fecha < corte).order_by(AuditLog.id).limit(lote).scalar_subquery()
+        with db.engine.begin() as conn:
+            cantidad = conn.execute(delete(AuditLog.__table__).where(AuditLog.id.in_(ids))).rowcount
+        borrados += cantidad
+        if cantidad < lote:
+            return borrados
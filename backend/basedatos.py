@@ -0,0 +1,246 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic, perf_counter, time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+# --- Motores, réplica de lectura y telemetría de los pools ---
+# Las opciones de los pools salen de la configuración (DB_POOL_*). Si DATABASE_REPLICA_URL está
+# definida se agrega el bind 'replica' y los SELECT de los pedidos GET van a la réplica, salvo:
+#   - si la misma sesión ya escribió algo (lee lo que acaba de escribir),
+#   - si el usuario escribió hace menos de DB_LECTURA_PRIMARIO_SEGUNDOS (la réplica puede venir
+#     atrasada y el usuario tiene que ver su propio cambio). Cada proceso recuerda las escrituras
+#     que atendió en _escrituras; para que valga también entre workers, la respuesta a un pedido
+#     que escribió lleva HEADER_ESCRITURA con el momento de la escritura y el cliente lo repite en
+#     los pedidos siguientes (el interceptor de src/api.js en el frontend),
+#   - dentro de desde_primario() (lo que se guarda en los caches versionados).
+# Todo lo demás (escrituras, SELECT ... FOR UPDATE, comandos, hilos sin pedido) usa el primario.
+
+BIND_REPLICA = 'replica'
+METODOS_LECTURA = ('GET', 'HEAD')
+HEADER_ESCRITURA = 'X-Ultima-Escritura'
+
+_lock = threading.Lock()
+_escrituras = {}   # user_id -> momento (monotonic) de su última escritura
+
+
+class TelemetriaPool:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.conexiones_nuevas = 0
+        self.conexiones_overflow = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self._esperas = deque(maxlen=1000)
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            self._esperas.append(segundos)
+
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def registrar_conexion(self, overflow):
+        with self._lock:
+            self.conexiones_nuevas += 1
+            if overflow:
+                self.conexiones_overflow += 1
+
+    def resumen(self):
+        with self._lock:
+            recientes = sorted(self._esperas)
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'conexiones_nuevas': self.conexiones_nuevas,
+                'conexiones_overflow': self.conexiones_overflow,
+                'espera_promedio_ms': round(self.espera_total / self.checkouts * 1000, 2) if self.checkouts else 0,
+                'espera_p95_ms': round(recientes[int(len(recientes) * 0.95)] * 1000, 2) if recientes else 0,
+                'espera_max_ms': round(self.espera_max * 1000, 2),
+            }
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout (incluye abrir la conexión si hace falta)."""
+    telemetria = None
+
+    def _do_get(self):
+        inicio = perf_counter()
+        try:
+            conexion = super()._do_get()
+        except PoolTimeoutError:
+            self.telemetria.registrar_timeout()
+            raise
+        self.telemetria.registrar_espera(perf_counter() - inicio)
+        return conexion
+
+    def _create_connection(self):
+        # Se llama con el contador ya incrementado: overflow() > 0 es una conexión por encima de pool_size
+        self.telemetria.registrar_conexion(self.overflow() > 0)
+        return super()._create_connection()
+
+
+def pool_medido(nombre):
+    # Una subclase por motor: Pool.recreate() (engine.dispose) conserva la clase y su telemetría
+    return type(f'PoolMedido_{nombre}', (PoolMedido,), {'telemetria': TelemetriaPool(nombre)})
+
+
+def opciones_motor(url, config, nombre, solo_lectura=False):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}   # una sola conexión compartida (StaticPool de Flask-SQLAlchemy)
+    opciones = {
+        'poolclass': pool_medido(nombre),
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if url.get_backend_name() == 'postgresql':
+        parametros = []
+        if config.get('DB_STATEMENT_TIMEOUT_MS'):
+            parametros.append(f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT_MS'])}")
+        if solo_lectura:
+            parametros.append('-c default_transaction_read_only=on')
+        if parametros:
+            opciones['connect_args'] = {'options': ' '.join(parametros)}
+    return opciones
+
+
+def configurar_motores(app):
+    """Completa SQLALCHEMY_ENGINE_OPTIONS y SQLALCHEMY_BINDS; se llama antes de db.init_app()."""
+    config = app.config
+    opciones = opciones_motor(config['SQLALCHEMY_DATABASE_URI'], config, 'primario')
+    opciones.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones
+    if config.get('DATABASE_REPLICA_URL'):
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[BIND_REPLICA] = {'url': config['DATABASE_REPLICA_URL'], **opciones_motor(config['DATABASE_REPLICA_URL'], config, BIND_REPLICA, solo_lectura=True)}
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def reporte_pools(engines):
+    reporte = []
+    for clave, engine in engines.items():
+        pool = engine.pool
+        datos = {'bind': clave or 'primario', 'url': engine.url.render_as_string(hide_password=True), 'pool': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            datos.update({'tamano': pool.size(), 'en_uso': pool.checkedout(), 'libres': pool.checkedin(), 'overflow': max(pool.overflow(), 0)})
+        if isinstance(pool, PoolMedido):
+            datos.update(pool.telemetria.resumen())
+        reporte.append(datos)
+    return reporte
+
+
+# --- Ruteo de lecturas ---
+
+def marcar_usuario(user_id):
+    """Lo llaman los decoradores de autenticación antes de la primera consulta del pedido."""
+    g.usuario_id = user_id
+
+
+def _escribio_hace_poco(user_id, ventana):
+    with _lock:
+        momento = _escrituras.get(user_id)
+    return momento is not None and monotonic() - momento < ventana
+
+
+def _escritura_informada(ventana):
+    # Época (time()) que el cliente repite de una respuesta anterior, quizá de otro worker. Uno del
+    # futuro o que no es un número se ignora: solo puede pedir leer del primario durante `ventana`.
+    try:
+        momento = float(request.headers.get(HEADER_ESCRITURA, ''))
+    except ValueError:
+        return False
+    return 0 <= time() - momento < ventana
+
+
+def anunciar_escritura(response):
+    """after_request: informa al cliente cuándo escribió, para que lo repita en los pedidos siguientes."""
+    if g.get('escribio_en') is not None:
+        response.headers[HEADER_ESCRITURA] = f"{g.escribio_en:.3f}"
+    return response
+
+
+def _registrar_escritura(session):
+    session.info['escribio'] = True
+    if not has_request_context():
+        return
+    g.escribio_en = time()
+    if g.get('usuario_id') is None:
+        return
+    ahora = monotonic()
+    with _lock:
+        _escrituras[g.usuario_id] = ahora
+        if len(_escrituras) > 5000:
+            ventana = current_app.config['DB_LECTURA_PRIMARIO_SEGUNDOS']
+            for user_id in [u for u, m in _escrituras.items() if ahora - m >= ventana]:
+                del _escrituras[user_id]
+
+
+@contextmanager
+def desde_primario():
+    anterior = g.get('forzar_primario') if has_request_context() else None
+    if has_request_context():
+        g.forzar_primario = True
+    try:
+        yield
+    finally:
+        if has_request_context():
+            g.forzar_primario = anterior
+
+
+def primario(funcion):
+    def envuelta(*args, **kwargs):
+        with desde_primario():
+            return funcion(*args, **kwargs)
+    return envuelta
+
+
+class SesionRuteada(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._lee_de_replica(clause):
+            return self._db.engines[BIND_REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _lee_de_replica(self, clause):
+        if clause is None or not getattr(clause, 'is_select', False) or getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        if self._flushing or self.info.get('escribio') or not has_request_context():
+            return False
+        if request.method not in METODOS_LECTURA or g.get('forzar_primario'):
+            return False
+        engines = self._db.engines
+        if BIND_REPLICA not in engines:
+            return False
+        ventana = current_app.config['DB_LECTURA_PRIMARIO_SEGUNDOS']
+        if _escritura_informada(ventana):
+            return False
+        user_id = g.get('usuario_id')
+        return user_id is None or not _escribio_hace_poco(user_id, ventana)
+
+
+@event.listens_for(SesionRuteada, 'after_flush')
+def _despues_de_flush(session, flush_context):
+    _registrar_escritura(session)
+
+
+@event.listens_for(SesionRuteada, 'do_orm_execute')
+def _al_ejecutar(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        _registrar_escritura(estado.session)
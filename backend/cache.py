@@ -0,0 +1,52 @@
+import time
+import threading
+from collections import OrderedDict
+
+from singleflight import SingleFlight
+
+
+# --- Cache en memoria para respuestas costosas ---
+# Cada entrada se guarda junto con la "versión" de los datos de los que depende (normalmente el
+# número de secuencia del último cambio publicado en change_feed para esa entidad). Si la versión
+# cambió o venció el TTL, se vuelve a construir. El TTL cubre cambios hechos fuera de este proceso.
+# Si varios pedidos encuentran la misma entrada vencida a la vez, solo uno la construye.
+
+class CacheVersionado:
+    def __init__(self, max_entradas=256, ttl=600):
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._vuelos = SingleFlight()
+
+    def get(self, clave, version, construir):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[0] == version and ahora - entrada[1] < self.ttl:
+                self._entradas.move_to_end(clave)
+                return entrada[2]
+        return self._vuelos.hacer((clave, version), lambda: self._construir(clave, version, construir))
+
+    def _construir(self, clave, version, construir):
+        ahora = time.monotonic()
+        with self._lock:
+            # Otro hilo pudo terminar de construirla justo antes de que este tomara el turno
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[0] == version and ahora - entrada[1] < self.ttl:
+                return entrada[2]
+        valor = construir()
+        with self._lock:
+            self._entradas[clave] = (version, ahora, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+    def invalidar(self, prefijo=None):
+        with self._lock:
+            if prefijo is None:
+                self._entradas.clear()
+                return
+            for clave in [c for c in self._entradas if c[0] == prefijo]:
+                del self._entradas[clave]
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone, time
+
+from recurrencia import partes_regla, armar_regla, a_hora_local
+
+
+# --- Feeds iCalendar (.ics) ---
+# Generación del texto iCalendar (RFC 5545) para las suscripciones de Outlook / Google Calendar.
+# Los eventos se generan de a uno (generadores) y el cuerpo completo se arma una sola vez por
+# versión de los datos; ver los endpoints /calendario/... en app.py.
+
+PRODID = '-//Julia Tours//Intranet//ES'
+DOMINIO_UID = 'intranet.juliatours.com.ar'
+ZONA_HORARIA = 'America/Argentina/Buenos_Aires'
+
+
+def _escapar(texto):
+    return (texto or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _plegar(linea):
+    # Las líneas de más de 75 octetos se parten y continúan con un espacio al inicio
+    datos = linea.encode('utf-8')
+    if len(datos) <= 75:
+        return linea + '\r\n'
+    partes, actual = [], b''
+    for caracter in linea:
+        codificado = caracter.encode('utf-8')
+        if len(actual) + len(codificado) > (75 if not partes else 74):
+            partes.append(actual.decode('utf-8'))
+            actual = b''
+        actual += codificado
+    partes.append(actual.decode('utf-8'))
+    return '\r\n '.join(partes) + '\r\n'
+
+
+def _utc(fecha):
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return fecha.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _vevent(propiedades):
+    yield _plegar('BEGIN:VEVENT')
+    for nombre, valor in propiedades:
+        if valor is not None:
+            yield _plegar(f'{nombre}:{valor}')
+    yield _plegar('END:VEVENT')
+
+
+def vevents_reuniones(reuniones, dtstamp):
+    for reunion in reuniones:
+        descripcion = '\n'.join(filter(None, [
+            f'Convoca: {reunion.convoca}' if reunion.convoca else None,
+            f'Zoom: {reunion.zoom_link}' if reunion.zoom_link else None,
+            f'Personas: {reunion.cantidad_personas}' if reunion.cantidad_personas else None,
+        ]))
+        yield from _vevent([
+            ('UID', f'reunion-{reunion.id}@{DOMINIO_UID}'),
+            ('DTSTAMP', dtstamp),
+            ('DTSTART', _utc(reunion.start_time)),
+            ('DTEND', _utc(reunion.end_time)),
+            ('SUMMARY', _escapar(reunion.tema)),
+            ('LOCATION', _escapar(reunion.ubicacion) if reunion.ubicacion else None),
+            ('DESCRIPTION', _escapar(descripcion) if descripcion else None),
+            ('URL', reunion.zoom_link or None),
+        ])
+
+
+def _local(fecha):
+    return fecha.strftime('%Y%m%dT%H%M%S')
+
+
+def vevents_series(series, dtstamp, zona):
+    # Las series se publican con su RRULE: el cliente de calendario expande las ocurrencias
+    for serie in series:
+        inicio = a_hora_local(serie.dtstart, zona)
+        partes = partes_regla(serie.regla)
+        if 'UNTIL' in partes:
+            # Con DTSTART en una zona horaria, UNTIL tiene que ir en UTC
+            hasta = datetime.strptime(partes['UNTIL'], '%Y%m%dT%H%M%S').replace(tzinfo=zona)
+            partes['UNTIL'] = _utc(hasta)
+        excepciones = ','.join(_local(datetime.fromisoformat(e)) for e in serie.excepciones or [])
+        yield from _vevent([
+            ('UID', f'serie-{serie.id}@{DOMINIO_UID}'),
+            ('DTSTAMP', dtstamp),
+            (f'DTSTART;TZID={ZONA_HORARIA}', _local(inicio)),
+            (f'DTEND;TZID={ZONA_HORARIA}', _local(inicio + timedelta(minutes=serie.duracion_minutos))),
+            ('RRULE', armar_regla(partes)),
+            (f'EXDATE;TZID={ZONA_HORARIA}', excepciones or None),
+            ('SUMMARY', _escapar(serie.tema)),
+            ('LOCATION', _escapar(serie.ubicacion) if serie.ubicacion else None),
+            ('URL', serie.zoom_link or None),
+        ])
+
+
+def vevents_guardias(fechas, dtstamp):
+    # Mismo criterio que /reuniones/all: guardia_nro 5 es feriado (día completo), el resto de 10 a 13 hs
+    for guardia in fechas:
+        if guardia.guardia_nro == 5:
+            inicio = ('DTSTART;VALUE=DATE', guardia.fecha.strftime('%Y%m%d'))
+            fin = ('DTEND;VALUE=DATE', (guardia.fecha + timedelta(days=1)).strftime('%Y%m%d'))
+            resumen = 'FERIADO'
+        else:
+            inicio = (f'DTSTART;TZID={ZONA_HORARIA}', datetime.combine(guardia.fecha, time(10, 0)).strftime('%Y%m%dT%H%M%S'))
+            fin = (f'DTEND;TZID={ZONA_HORARIA}', datetime.combine(guardia.fecha, time(13, 0)).strftime('%Y%m%dT%H%M%S'))
+            resumen = f'GUARDIA {guardia.guardia_nro}'
+        yield from _vevent([
+            ('UID', f'guardia-{guardia.id}@{DOMINIO_UID}'),
+            ('DTSTAMP', dtstamp),
+            inicio,
+            fin,
+            ('SUMMARY', resumen),
+            ('TRANSP', 'TRANSPARENT' if guardia.guardia_nro == 5 else 'OPAQUE'),
+        ])
+
+
+def calendario(nombre, vevents):
+    yield _plegar('BEGIN:VCALENDAR')
+    yield _plegar('VERSION:2.0')
+    yield _plegar(f'PRODID:{PRODID}')
+    yield _plegar('CALSCALE:GREGORIAN')
+    yield _plegar('METHOD:PUBLISH')
+    yield _plegar(f'X-WR-CALNAME:{_escapar(nombre)}')
+    yield _plegar(f'X-WR-TIMEZONE:{ZONA_HORARIA}')
+    # Sugerencia de frecuencia de actualización para los clientes que la respetan
+    yield _plegar('REFRESH-INTERVAL;VALUE=DURATION:PT1H')
+    yield _plegar('X-PUBLISHED-TTL:PT1H')
+    # Definición mínima de la zona (Argentina no tiene horario de verano: UTC-3 fijo)
+    yield _plegar('BEGIN:VTIMEZONE')
+    yield _plegar(f'TZID:{ZONA_HORARIA}')
+    yield _plegar('BEGIN:STANDARD')
+    yield _plegar('DTSTART:19700101T000000')
+    yield _plegar('TZOFFSETFROM:-0300')
+    yield _plegar('TZOFFSETTO:-0300')
+    yield _plegar('TZNAME:-03')
+    yield _plegar('END:STANDARD')
+    yield _plegar('END:VTIMEZONE')
+    yield from vevents
+    yield _plegar('END:VCALENDAR')
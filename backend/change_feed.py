@@ -0,0 +1,272 @@
+import asyncio
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs
+
+import jwt
+from sqlalchemy import insert, select, update
+
+
+# --- Feed de cambios (novedades, posts, eventos, calendario) ---
+# Los endpoints que modifican contenido publican una notificación pequeña después del commit
+# (tipo de entidad, id, acción, sector). Las notificaciones se guardan en un buffer circular con
+# un número de secuencia creciente y se reparten a los clientes conectados por Server-Sent Events.
+#
+# El servidor SSE corre en su propio hilo con un event loop de asyncio y en su propio puerto:
+# cada conexión inactiva cuesta un socket y no un hilo de waitress.
+
+# Momento de arranque del proceso: es la "última modificación" de lo que no cambió desde entonces
+INICIO = time.time()
+
+
+class ChangeFeed:
+    def __init__(self, capacidad=1000):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=capacidad)
+        self._seq = 0
+        self._versiones = {}
+        self._loop = None
+        self._suscriptores = set()
+
+    @property
+    def ultimo_seq(self):
+        return self._seq
+
+    def version(self, *entidades):
+        """(seq, timestamp) del último cambio publicado de esas entidades; sirve como clave de cache."""
+        with self._lock:
+            versiones = [self._versiones.get(e, (0, INICIO)) for e in entidades]
+        return max(versiones)
+
+    def marcar_cambio(self, entidad):
+        """Cambia la versión de `entidad` sin notificar a los clientes (datos que solo usan los caches)."""
+        with self._lock:
+            self._seq += 1
+            self._versiones[entidad] = (self._seq, time.time())
+
+    def publish(self, entidad, entidad_id, accion, sector=None, sucursal=None, ocultar_a=None):
+        with self._lock:
+            self._seq += 1
+            self._versiones[entidad] = (self._seq, time.time())
+            cambio = {
+                'seq': self._seq,
+                'entidad': entidad,
+                'id': entidad_id,
+                'accion': accion,
+                'sector': sector,
+                # Datos de visibilidad: se usan para filtrar y nunca se envían al cliente
+                '_sucursal': sucursal,
+                '_ocultar_a': {int(uid) for uid in (ocultar_a or []) if str(uid).isdigit()},
+            }
+            self._buffer.append(cambio)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._repartir, cambio)
+        return cambio['seq']
+
+    def desde(self, seq, usuario):
+        """Cambios posteriores a `seq` visibles para `usuario` (para reconexiones y polling)."""
+        with self._lock:
+            pendientes = [c for c in self._buffer if c['seq'] > seq]
+        return [publico(c) for c in pendientes if es_visible(c, usuario)]
+
+    def _repartir(self, cambio):
+        for suscriptor in list(self._suscriptores):
+            suscriptor.entregar(cambio)
+
+
+def publico(cambio):
+    return {k: v for k, v in cambio.items() if not k.startswith('_')}
+
+
+def es_visible(cambio, usuario):
+    """Aplica las mismas reglas de visibilidad que los endpoints de lectura.
+
+    `usuario` es un dict con id, role, sector y sucursal.
+    """
+    if usuario['role'] == 'SUPERUSER':
+        return True
+    if cambio['entidad'] == 'post':
+        return cambio['sector'] == usuario['sector']
+    if cambio['entidad'] == 'evento':
+        if cambio['_sucursal'] not in (usuario['sucursal'], 'Julia Tours'):
+            return False
+        return usuario['id'] not in cambio['_ocultar_a']
+    return True
+
+
+feed = ChangeFeed()
+
+
+def publish_change(entidad, entidad_id, accion, **kwargs):
+    return feed.publish(entidad, entidad_id, accion, **kwargs)
+
+
+# --- Cambios hechos por otros procesos ---
+# Un comando (`flask archivar`) o un worker que cambia datos cacheados solo puede marcar su propio
+# feed. Para que los servidores se enteren, registra el cambio en VersionEntidad dentro de la misma
+# transacción; cada servidor lee esa tabla cada CAMBIOS_EXTERNOS_SEGUNDOS (antes de un pedido) y
+# marca en su feed las entidades cuya versión cambió. Los caches dejan de servir datos viejos a
+# más tardar en ese intervalo, en vez de esperar su TTL.
+
+def registrar_cambio_externo(conn, entidad):
+    """Sube la versión de `entidad` en VersionEntidad, en la transacción de `conn`."""
+    from models import VersionEntidad
+    tabla = VersionEntidad.__table__
+    ahora = datetime.now(timezone.utc)
+    actualizado = conn.execute(update(tabla).where(tabla.c.entidad == entidad).values(seq=tabla.c.seq + 1, modificado=ahora))
+    if actualizado.rowcount == 0:
+        conn.execute(insert(tabla).values(entidad=entidad, seq=1, modificado=ahora))
+
+
+class CambiosExternos:
+    def __init__(self, app, change_feed=feed):
+        self.app = app
+        self.feed = change_feed
+        self.intervalo = app.config['CAMBIOS_EXTERNOS_SEGUNDOS']
+        self._lock = threading.Lock()
+        self._proxima = 0.0
+        self._vistas = None
+
+    def revisar(self):
+        """Marca en el feed las entidades que otro proceso cambió desde la última revisión."""
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora < self._proxima:
+                return
+            self._proxima = ahora + self.intervalo
+        from models import db, VersionEntidad
+        tabla = VersionEntidad.__table__
+        try:
+            with db.engine.connect() as conn:
+                versiones = dict(conn.execute(select(tabla.c.entidad, tabla.c.seq)).all())
+        except Exception as e:
+            self.app.logger.warning('No se pudieron leer los cambios externos: %s', e)
+            return
+        with self._lock:
+            vistas, self._vistas = self._vistas, versiones
+        # En la primera lectura no hay nada cacheado todavía
+        if vistas is None:
+            return
+        for entidad, seq in versiones.items():
+            if vistas.get(entidad) != seq:
+                self.feed.marcar_cambio(entidad)
+
+
+class _Suscriptor:
+    def __init__(self, usuario, max_pendientes=100):
+        self.usuario = usuario
+        self.cola = asyncio.Queue(maxsize=max_pendientes)
+        self.desbordado = False
+
+    def entregar(self, cambio):
+        if not es_visible(cambio, self.usuario):
+            return
+        try:
+            self.cola.put_nowait(cambio)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se corta la conexión y al reconectar recupera
+            # lo que falte usando Last-Event-ID.
+            self.desbordado = True
+
+
+class FeedServer:
+    HEARTBEAT_SEGUNDOS = 25
+
+    def __init__(self, app, change_feed=feed):
+        self.app = app
+        self.feed = change_feed
+        self.max_conexiones = app.config.get('FEED_MAX_CONEXIONES', 1000)
+
+    def _cargar_usuario(self, user_id):
+        from models import db, User
+        with self.app.app_context():
+            user = db.session.get(User, user_id)
+            if not user:
+                return None
+            return {'id': user.id, 'role': user.role.name, 'sector': user.sector, 'sucursal': user.sucursal}
+
+    async def _responder(self, writer, estado, cuerpo=b''):
+        writer.write(f'HTTP/1.1 {estado}\r\nAccess-Control-Allow-Origin: *\r\nAccess-Control-Allow-Headers: Last-Event-ID\r\nContent-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n'.encode() + cuerpo)
+        await writer.drain()
+
+    async def _atender(self, reader, writer):
+        suscriptor = None
+        try:
+            linea = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                header = await reader.readline()
+                if header in (b'\r\n', b'\n', b''):
+                    break
+                nombre, _, valor = header.decode('latin-1').partition(':')
+                headers[nombre.strip().lower()] = valor.strip()
+            if len(linea) < 2:
+                return
+            metodo, destino = linea[0], urlsplit(linea[1])
+            if metodo == 'OPTIONS':
+                return await self._responder(writer, '204 No Content')
+            if metodo != 'GET' or destino.path != '/cambios':
+                return await self._responder(writer, '404 Not Found')
+            if len(self.feed._suscriptores) >= self.max_conexiones:
+                return await self._responder(writer, '503 Service Unavailable')
+
+            # EventSource no permite enviar headers propios, por eso el token viaja en la URL
+            params = parse_qs(destino.query)
+            token = (params.get('token') or [None])[0]
+            try:
+                data = jwt.decode(token, self.app.config['SECRET_KEY'], algorithms=["HS256"])
+            except Exception:
+                return await self._responder(writer, '401 Unauthorized')
+            usuario = await asyncio.get_running_loop().run_in_executor(None, self._cargar_usuario, data.get('id'))
+            if not usuario:
+                return await self._responder(writer, '401 Unauthorized')
+
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: keep-alive\r\nAccess-Control-Allow-Origin: *\r\n\r\nretry: 5000\n\n')
+            suscriptor = _Suscriptor(usuario)
+            self.feed._suscriptores.add(suscriptor)
+
+            ultimo = headers.get('last-event-id') or (params.get('since') or [None])[0]
+            if ultimo and ultimo.isdigit():
+                for cambio in self.feed.desde(int(ultimo), usuario):
+                    writer.write(self._formatear(cambio))
+            await writer.drain()
+
+            while not suscriptor.desbordado:
+                try:
+                    cambio = await asyncio.wait_for(suscriptor.cola.get(), self.HEARTBEAT_SEGUNDOS)
+                    writer.write(self._formatear(publico(cambio)))
+                except asyncio.TimeoutError:
+                    writer.write(b': ping\n\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if suscriptor is not None:
+                self.feed._suscriptores.discard(suscriptor)
+            writer.close()
+
+    @staticmethod
+    def _formatear(cambio):
+        return f"id: {cambio['seq']}\nevent: cambio\ndata: {json.dumps(cambio)}\n\n".encode()
+
+    def _correr(self, host, port, listo):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.feed._loop = loop
+        servidor = loop.run_until_complete(asyncio.start_server(self._atender, host, port))
+        listo.set()
+        try:
+            loop.run_forever()
+        finally:
+            servidor.close()
+            self.feed._loop = None
+
+    def start(self, host='127.0.0.1', port=5001):
+        listo = threading.Event()
+        hilo = threading.Thread(target=self._correr, args=(host, port, listo), name='feed-sse', daemon=True)
+        hilo.start()
+        listo.wait(5)
+        return hilo
@@ -0,0 +1,171 @@
+import re
+import base64
+import binascii
+from html import escape
+from html.parser import HTMLParser
+
+
+# --- Procesamiento del HTML enriquecido de posts y novedades ---
+# Se corre una sola vez al guardar: limpia el HTML que llega del editor (lista blanca de
+# etiquetas y atributos) y calcula un extracto en texto plano, la cantidad de palabras y
+# cuántas imágenes y enlaces contiene. Los listados devuelven estos datos en lugar del HTML.
+
+LARGO_EXTRACTO = 300
+
+ETIQUETAS_PERMITIDAS = {
+    'p', 'br', 'hr', 'div', 'span', 'strong', 'b', 'em', 'i', 'u', 's', 'strike', 'sub', 'sup', 'mark',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'blockquote', 'pre', 'code',
+    'a', 'img', 'figure', 'figcaption', 'iframe', 'oembed',
+    'table', 'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'colgroup', 'col', 'caption',
+}
+ETIQUETAS_VACIAS = {'br', 'hr', 'img', 'col', 'embed'}
+# Su contenido se descarta entero, no solo la etiqueta
+ETIQUETAS_DESCARTADAS = {'script', 'style', 'head', 'title', 'object', 'embed', 'noscript', 'template'}
+ETIQUETAS_BLOQUE = {'p', 'br', 'div', 'li', 'tr', 'td', 'th', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'figcaption', 'hr', 'caption'}
+
+ATRIBUTOS_GLOBALES = {'class', 'style'}
+ATRIBUTOS_PERMITIDOS = {
+    'a': {'href', 'target', 'rel', 'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'iframe': {'src', 'width', 'height', 'allowfullscreen', 'frameborder', 'allow'},
+    'oembed': {'url'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'col': {'span'},
+    'ol': {'start', 'type', 'reversed'},
+    'li': {'value'},
+}
+ATRIBUTOS_URL = {'href', 'src', 'url'}
+ESQUEMAS_PERMITIDOS = ('http:', 'https:', 'mailto:', 'tel:')
+ESTILO_PELIGROSO = re.compile(r'expression\s*\(|url\s*\(\s*[\'"]?\s*javascript:', re.IGNORECASE)
+# Imágenes pegadas en el editor que llegan embebidas en el HTML como data: URI
+DATA_URI_IMAGEN = re.compile(r'^data:(image/(?:png|jpeg|gif|webp|bmp));base64,(.*)$', re.IGNORECASE | re.DOTALL)
+
+
+def _url_segura(etiqueta, valor):
+    limpio = re.sub(r'[\x00-\x20]', '', valor).lower()
+    if ':' not in limpio.split('/', 1)[0]:
+        return True  # URL relativa, ej. /uploads/...
+    if etiqueta == 'img' and limpio.startswith('data:image/'):
+        return True
+    return limpio.startswith(ESQUEMAS_PERMITIDOS)
+
+
+def _decodificar_data_uri(valor):
+    coincidencia = DATA_URI_IMAGEN.match(valor.strip())
+    if not coincidencia:
+        return None, None
+    try:
+        return coincidencia.group(1).lower(), base64.b64decode(re.sub(r'\s+', '', coincidencia.group(2)), validate=True)
+    except (binascii.Error, ValueError):
+        return None, None
+
+
+class _Procesador(HTMLParser):
+    def __init__(self, guardar_imagen=None):
+        super().__init__(convert_charrefs=True)
+        self.guardar_imagen = guardar_imagen
+        self.salida = []
+        self.texto = []
+        self.abiertas = []
+        self.descartando = 0
+        self.imagenes = 0
+        self.enlaces = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ETIQUETAS_DESCARTADAS:
+            if tag not in ETIQUETAS_VACIAS:
+                self.descartando += 1
+            return
+        if self.descartando:
+            return
+        if tag in ETIQUETAS_BLOQUE:
+            self.texto.append(' ')
+        if tag not in ETIQUETAS_PERMITIDAS:
+            return
+        permitidos = ATRIBUTOS_GLOBALES | ATRIBUTOS_PERMITIDOS.get(tag, set())
+        partes = [tag]
+        for nombre, valor in attrs:
+            if nombre not in permitidos:
+                continue
+            valor = valor or ''
+            if nombre in ATRIBUTOS_URL and not _url_segura(tag, valor):
+                continue
+            if nombre == 'style' and ESTILO_PELIGROSO.search(valor):
+                continue
+            if tag == 'img' and nombre == 'src' and self.guardar_imagen and valor.lstrip()[:5].lower() == 'data:':
+                # Se pasa la imagen al almacenamiento de uploads y se la referencia por URL
+                mimetype, datos = _decodificar_data_uri(valor)
+                if not datos:
+                    continue
+                valor = self.guardar_imagen(mimetype, datos)
+            partes.append(f'{nombre}="{escape(valor, quote=True)}"')
+        if tag == 'img':
+            self.imagenes += 1
+        elif tag == 'a' and any(parte.startswith('href=') for parte in partes):
+            self.enlaces += 1
+        self.salida.append(f"<{' '.join(partes)}>")
+        if tag not in ETIQUETAS_VACIAS:
+            self.abiertas.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in ETIQUETAS_DESCARTADAS:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag in self.abiertas and self.abiertas[-1] == tag and tag not in ETIQUETAS_VACIAS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in ETIQUETAS_DESCARTADAS:
+            self.descartando = max(0, self.descartando - 1)
+            return
+        if self.descartando or tag not in self.abiertas:
+            return
+        if tag in ETIQUETAS_BLOQUE:
+            self.texto.append(' ')
+        # Cierra también las etiquetas que quedaron abiertas adentro
+        while self.abiertas:
+            abierta = self.abiertas.pop()
+            self.salida.append(f'</{abierta}>')
+            if abierta == tag:
+                break
+
+    def handle_data(self, data):
+        if self.descartando:
+            return
+        self.salida.append(escape(data, quote=False))
+        self.texto.append(data)
+
+    def resultado(self):
+        self.close()
+        while self.abiertas:
+            self.salida.append(f'</{self.abiertas.pop()}>')
+        return ''.join(self.salida)
+
+
+def procesar_html(html, guardar_imagen=None):
+    """Devuelve el HTML saneado y sus datos de resumen (excerpt, word_count, image_count, link_count).
+
+    Si se pasa `guardar_imagen(mimetype, datos) -> url`, las imágenes embebidas como data: URI se
+    guardan con esa función y el HTML pasa a apuntar a la URL devuelta.
+    """
+    procesador = _Procesador(guardar_imagen)
+    procesador.feed(html or '')
+    saneado = procesador.resultado()
+    texto = re.sub(r'\s+', ' ', ''.join(procesador.texto)).strip()
+    extracto = texto
+    if len(texto) > LARGO_EXTRACTO:
+        extracto = texto[:LARGO_EXTRACTO].rsplit(' ', 1)[0] + '…'
+    return {
+        'content': saneado,
+        'excerpt': extracto,
+        'word_count': len(texto.split()),
+        'image_count': procesador.imagenes,
+        'link_count': procesador.enlaces,
+    }
+
+
+def aplicar_contenido(entidad, html, guardar_imagen=None):
+    """Guarda en un Post o Novedad el HTML saneado y los campos de resumen calculados."""
+    for campo, valor in procesar_html(html, guardar_imagen).items():
+        setattr(entidad, campo, valor)
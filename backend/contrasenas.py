@@ -0,0 +1,79 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from limites import CupoConcurrencia
+
+
+# --- Hashes de contraseñas en un pool propio ---
+# bcrypt es CPU pura y tarda cientos de milisegundos con el costo de producción. Los hashes corren
+# en un pool fijo de BCRYPT_HILOS hilos (bcrypt suelta el GIL mientras calcula), no en los hilos de
+# waitress: a las 08:30, cuando entra toda la empresa, los logins hacen cola en el pool y el resto
+# de los pedidos sigue atendiéndose. Al pool se entra con CupoConcurrencia (BCRYPT_CONCURRENCIA
+# lugares entre los que calculan y los que esperan en la cola del pool); si no hay lugar en
+# BCRYPT_ESPERA_MAX segundos, o ya hay BCRYPT_EN_ESPERA pedidos esperando lugar, la app responde 503
+# con Retry-After. Así los logins nunca ocupan todos los hilos de waitress.
+#
+# El costo objetivo es BCRYPT_LOG_ROUNDS. Los hashes guardados con otro costo se rehacen en el
+# siguiente login exitoso (necesita_rehash), así subir o bajar el costo no requiere migración.
+
+class Latencias:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cantidad = 0
+        self._recientes = deque(maxlen=1000)
+
+    def registrar(self, segundos):
+        with self._lock:
+            self.cantidad += 1
+            self._recientes.append(segundos)
+
+    def resumen(self):
+        with self._lock:
+            recientes = sorted(self._recientes)
+        percentil = lambda p: round(recientes[min(int(len(recientes) * p), len(recientes) - 1)] * 1000, 1) if recientes else 0
+        return {'cantidad': self.cantidad, 'p50_ms': percentil(0.5), 'p95_ms': percentil(0.95), 'p99_ms': percentil(0.99)}
+
+
+class HasherContrasenas:
+    def __init__(self, app, bcrypt):
+        self.bcrypt = bcrypt
+        self.costo = app.config['BCRYPT_LOG_ROUNDS']
+        self.hilos = app.config['BCRYPT_HILOS']
+        self.cupo = CupoConcurrencia(max(app.config['BCRYPT_CONCURRENCIA'], self.hilos), app.config['BCRYPT_ESPERA_MAX'], app.config['BCRYPT_EN_ESPERA'])
+        self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix='bcrypt')
+        self.espera = Latencias()    # tiempo en la cola del pool
+        self.calculo = {'hash': Latencias(), 'verificar': Latencias()}
+
+    def _correr(self, operacion, funcion, *args):
+        # Saturado (de cupo.usar) si no hay lugar a tiempo
+        with self.cupo.usar():
+            encolado = perf_counter()
+
+            def medido():
+                inicio = perf_counter()
+                self.espera.registrar(inicio - encolado)
+                try:
+                    return funcion(*args)
+                finally:
+                    self.calculo[operacion].registrar(perf_counter() - inicio)
+
+            return self._pool.submit(medido).result()
+
+    def hashear(self, password):
+        return self._correr('hash', self.bcrypt.generate_password_hash, password, self.costo).decode('utf-8')
+
+    def verificar(self, hash_guardado, password):
+        return self._correr('verificar', self.bcrypt.check_password_hash, hash_guardado, password)
+
+    def necesita_rehash(self, hash_guardado):
+        # Formato $2b$12$...: el segundo campo es el costo
+        try:
+            return int(hash_guardado.split('$')[2]) != self.costo
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def estado(self):
+        return dict(self.cupo.estado(), costo=self.costo, hilos=self.hilos, espera=self.espera.resumen(),
+                    **{operacion: latencias.resumen() for operacion, latencias in self.calculo.items()})
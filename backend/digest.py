@@ -0,0 +1,215 @@
+import re
+import time
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+from html import escape
+
+from flask_mail import Message
+from sqlalchemy import func, or_, update, insert
+
+from models import db, User, UserRole, Novedad, Post, Evento, DigestEnvio
+
+
+# --- Resumen periódico por correo ---
+# Junta las novedades, publicaciones del sector y eventos visibles que cada usuario todavía no
+# recibió, arma un único correo por usuario y envía toda la tanda reutilizando unas pocas
+# conexiones SMTP (en lugar de abrir una conexión por mensaje como hace mail.send()).
+# Después de cada envío exitoso se guarda el punto de control del usuario, así que si el proceso
+# se corta, al volver a correrlo no se reenvía nada de lo ya enviado.
+#
+# El punto de control es el id más alto leído, pero en PostgreSQL los ids se asignan al insertar y
+# no al confirmar: una fila con id más bajo puede confirmarse después de que se leyó una más alta.
+# Por eso cada resumen vuelve a revisar los últimos DIGEST_VENTANA_IDS ids bajo la marca y el punto
+# de control guarda cuáles de ellos ya se vieron (vistos_recientes); los que faltan se envían ahora.
+
+_FIN = object()
+
+
+def _texto_plano(html, largo=200):
+    texto = re.sub(r'\s+', ' ', re.sub(r'<[^>]+>', ' ', html or '')).strip()
+    return texto if len(texto) <= largo else texto[:largo].rsplit(' ', 1)[0] + '…'
+
+
+def _con_zona(fecha):
+    return fecha if fecha is None or fecha.tzinfo else fecha.replace(tzinfo=timezone.utc)
+
+
+def _evento_visible(evento, user):
+    if user.role == UserRole.SUPERUSER:
+        return True
+    if evento.ubicacion_evento not in (user.sucursal, 'Julia Tours'):
+        return False
+    try:
+        hidden_ids = {int(uid) for uid in (evento.hidden_from_users or [])}
+    except (ValueError, TypeError):
+        hidden_ids = set()
+    return user.id not in hidden_ids
+
+
+def _pendientes(app):
+    """Genera (user, novedades, posts, eventos, marcas) para cada usuario con algo nuevo.
+
+    Trae el contenido nuevo con una consulta por tabla (desde la marca más antigua de todos los
+    usuarios) y reparte en memoria, en lugar de consultar por usuario.
+    """
+    ahora = datetime.now(timezone.utc)
+    desde_inicial = ahora - timedelta(days=app.config['DIGEST_DIAS_INICIALES'])
+    ventana = app.config['DIGEST_VENTANA_IDS']
+    usuarios = User.query.filter(User.is_verified.is_(True)).order_by(User.id).all()
+    checkpoints = {c.user_id: c for c in DigestEnvio.query.all()}
+
+    def minimo(campo):
+        marcas = [getattr(c, campo) for c in checkpoints.values()]
+        return min(marcas) if marcas else None
+
+    def desde(modelo, campo):
+        # Lo posterior a la marca más antigua (menos la ventana de commits tardíos), más la ventana
+        # inicial para quienes no tienen marca
+        marca = minimo(campo)
+        if marca is None:
+            return modelo.created_at >= desde_inicial
+        return or_(modelo.id > marca - ventana, modelo.created_at >= desde_inicial)
+
+    # Las marcas se leen antes que el contenido y las consultas no pasan de ellas: una fila que se
+    # inserta mientras tanto queda para el próximo resumen (si no, la marca la saltearía)
+    marcas_actuales = {
+        'ultima_novedad_id': db.session.query(func.coalesce(func.max(Novedad.id), 0)).scalar(),
+        'ultimo_post_id': db.session.query(func.coalesce(func.max(Post.id), 0)).scalar(),
+        'ultimo_evento_id': db.session.query(func.coalesce(func.max(Evento.id), 0)).scalar(),
+    }
+    novedades = Novedad.query.filter(desde(Novedad, 'ultima_novedad_id'), Novedad.id <= marcas_actuales['ultima_novedad_id']).order_by(Novedad.id).all()
+    posts = Post.query.filter(desde(Post, 'ultimo_post_id'), Post.id <= marcas_actuales['ultimo_post_id']).order_by(Post.id).all()
+    eventos = Evento.query.filter(Evento.fecha_hora >= ahora, Evento.id <= marcas_actuales['ultimo_evento_id']).order_by(Evento.fecha_hora).all()
+
+    # Lo que se leyó ahora dentro de la ventana bajo las marcas nuevas: queda como visto para quienes
+    # reciban este resumen (enviado o no, porque no les correspondía)
+    vistos = {tipo: [f.id for f in filas if f.id > marcas_actuales[campo] - ventana]
+              for tipo, campo, filas in (('novedad', 'ultima_novedad_id', novedades), ('post', 'ultimo_post_id', posts), ('evento', 'ultimo_evento_id', eventos))}
+    marcas_envio = dict(marcas_actuales, vistos_recientes=vistos)
+
+    def sin_ver(filas, tipo, marca, checkpoint):
+        if checkpoint.vistos_recientes is None:
+            # Punto de control guardado antes de que existiera la ventana
+            return [f for f in filas if f.id > marca]
+        ya_vistos = set(checkpoint.vistos_recientes.get(tipo, []))
+        return [f for f in filas if f.id > marca - ventana and f.id not in ya_vistos]
+
+    posts_por_sector = {}
+    for post in posts:
+        posts_por_sector.setdefault(post.sector, []).append(post)
+
+    for user in usuarios:
+        checkpoint = checkpoints.get(user.id)
+        if checkpoint:
+            nuevas = sin_ver(novedades, 'novedad', checkpoint.ultima_novedad_id, checkpoint)
+            del_sector = sin_ver(posts_por_sector.get(user.sector, []), 'post', checkpoint.ultimo_post_id, checkpoint)
+            visibles = [e for e in sin_ver(eventos, 'evento', checkpoint.ultimo_evento_id, checkpoint) if _evento_visible(e, user)]
+        else:
+            nuevas = [n for n in novedades if n.created_at and _con_zona(n.created_at) >= desde_inicial]
+            del_sector = [p for p in posts_por_sector.get(user.sector, []) if p.created_at and _con_zona(p.created_at) >= desde_inicial]
+            visibles = [e for e in eventos if _evento_visible(e, user)]
+        if nuevas or del_sector or visibles:
+            yield user, nuevas, del_sector, visibles, marcas_envio
+
+
+def _armar_mensaje(app, user, novedades, posts, eventos, logo):
+    url = app.config['FRONTEND_URL']
+    secciones = []
+    if novedades:
+        items = ''.join(f'<li><strong>{escape(n.asunto)}</strong><br><span style="color: #555;">{escape(n.excerpt or _texto_plano(n.content))}</span></li>' for n in novedades)
+        secciones.append(f'<h2 style="color: #008f39;">Novedades</h2><ul>{items}</ul>')
+    if posts:
+        items = ''.join(f'<li><strong>{escape(p.title)}</strong><br><span style="color: #555;">{escape(p.excerpt or _texto_plano(p.content))}</span></li>' for p in posts)
+        secciones.append(f'<h2 style="color: #008f39;">Información de {escape(user.sector or "")}</h2><ul>{items}</ul>')
+    if eventos:
+        items = ''.join(f'<li><strong>{escape(e.titulo)}</strong> — {e.fecha_hora.strftime("%d/%m/%Y %H:%M")}<br><span style="color: #555;">{escape(e.ubicacion_texto or "")}</span></li>' for e in eventos)
+        secciones.append(f'<h2 style="color: #008f39;">Próximos eventos</h2><ul>{items}</ul>')
+
+    msg = Message('Resumen de novedades - Intranet Julia Tours', recipients=[user.username])
+    msg.html = f"""<div style="font-family: Arial, sans-serif; padding: 20px;"><img src="cid:logo_jt" alt="Julia Tours Logo" style="max-width: 200px; margin-bottom: 20px;"><h1 style="color: #333;">Hola {escape(user.nombre or '')}, esto es lo nuevo en la Intranet</h1>{''.join(secciones)}<p style="font-size: 14px;"><a href="{url}">Ir a la Intranet</a></p></div>"""
+    msg.attach("logo.png", "image/png", logo, headers={'Content-ID': '<logo_jt>'})
+    return msg
+
+
+def _trabajador(app, mail, pendientes, resultados):
+    intervalo = app.config['DIGEST_INTERVALO_ENVIO']
+    with app.app_context():
+        conexion = None
+        try:
+            while True:
+                tarea = pendientes.get()
+                if tarea is _FIN:
+                    break
+                user_id, msg, marcas = tarea
+                for intento in range(2):
+                    try:
+                        if conexion is None:
+                            conexion = mail.connect().__enter__()
+                        inicio = time.monotonic()
+                        conexion.send(msg)
+                        resultados.put((user_id, marcas, None))
+                        time.sleep(max(0, intervalo - (time.monotonic() - inicio)))
+                        break
+                    except Exception as e:
+                        # Conexión caída: se descarta y se reintenta una vez con una nueva
+                        if conexion is not None:
+                            try:
+                                conexion.__exit__(None, None, None)
+                            except Exception:
+                                pass
+                            conexion = None
+                        if intento == 1:
+                            resultados.put((user_id, marcas, str(e)))
+        finally:
+            if conexion is not None:
+                try:
+                    conexion.__exit__(None, None, None)
+                except Exception:
+                    pass
+
+
+def enviar_digest(app, mail):
+    """Envía el resumen a todos los usuarios con contenido nuevo. Devuelve (enviados, errores)."""
+    cantidad_conexiones = app.config['DIGEST_CONEXIONES_SMTP']
+    pendientes = queue.Queue(maxsize=cantidad_conexiones * 2)
+    resultados = queue.Queue()
+    with app.open_resource("static/logo.png") as fp:
+        logo = fp.read()
+
+    hilos = [threading.Thread(target=_trabajador, args=(app, mail, pendientes, resultados), daemon=True) for _ in range(cantidad_conexiones)]
+    for hilo in hilos:
+        hilo.start()
+
+    enviados, errores = 0, []
+
+    def registrar(user_id, marcas, error):
+        nonlocal enviados
+        if error:
+            errores.append({'user_id': user_id, 'error': error})
+            return
+        # Se escribe por una conexión aparte para no expirar los objetos de la sesión que
+        # todavía se están usando para armar los siguientes correos
+        valores = dict(marcas, enviado_at=datetime.now(timezone.utc))
+        with db.engine.begin() as conn:
+            actualizado = conn.execute(update(DigestEnvio).where(DigestEnvio.user_id == user_id).values(**valores))
+            if actualizado.rowcount == 0:
+                conn.execute(insert(DigestEnvio).values(user_id=user_id, **valores))
+        enviados += 1
+
+    def vaciar_resultados():
+        while True:
+            try:
+                registrar(*resultados.get_nowait())
+            except queue.Empty:
+                return
+
+    for user, novedades, posts, eventos, marcas in _pendientes(app):
+        pendientes.put((user.id, _armar_mensaje(app, user, novedades, posts, eventos, logo), marcas))
+        vaciar_resultados()
+    for _ in hilos:
+        pendientes.put(_FIN)
+    for hilo in hilos:
+        hilo.join()
+    vaciar_resultados()
+    return enviados, errores
@@ -0,0 +1,176 @@
+import threading
+from collections import OrderedDict
+
+
+# --- Formularios dinámicos de inscripción a eventos ---
+# Evento.form_dinamico es una lista de preguntas:
+#   {"id": "q1", "type": "select", "label": "Menú", "options": ["Carne", "Vegetariano"], "required": true}
+# Tipos: checkbox (sí/no), select (una opción de `options`), text (texto libre, `max_length`) y
+# number (`min` / `max` opcionales). `required` por defecto es true para select y false para el resto,
+# igual que se comportaba el formulario antes de validar en el servidor.
+#
+# El esquema se normaliza al guardar el evento. Para validar inscripciones se "compila" una vez por
+# versión del formulario (Evento.form_version) a una lista de funciones, y se guarda en memoria.
+
+TIPOS = ('checkbox', 'select', 'text', 'number')
+MAX_LENGTH_TEXTO = 500
+MAX_LENGTH_LIMITE = 5000
+
+
+class EsquemaInvalido(ValueError):
+    def __init__(self, errores):
+        super().__init__('; '.join(errores))
+        self.errores = errores
+
+
+def normalizar_esquema(form, estricto=True):
+    """Valida la definición del formulario y la devuelve limpia; lanza EsquemaInvalido si no sirve.
+
+    Con estricto=False se omiten las preguntas inválidas (formularios guardados antes de validar).
+    """
+    if form in (None, ''):
+        return []
+    if not isinstance(form, list):
+        if not estricto:
+            return []
+        raise EsquemaInvalido(['El formulario debe ser una lista de preguntas'])
+    errores, limpio, ids = [], [], set()
+    for posicion, campo in enumerate(form, start=1):
+        if not isinstance(campo, dict):
+            errores.append(f'Pregunta {posicion}: formato inválido')
+            continue
+        campo_id = str(campo.get('id') or '').strip()
+        tipo = campo.get('type')
+        label = str(campo.get('label') or '').strip()
+        if not campo_id or campo_id in ids:
+            errores.append(f'Pregunta {posicion}: falta el id o está repetido')
+            continue
+        ids.add(campo_id)
+        if tipo not in TIPOS:
+            errores.append(f'Pregunta {posicion}: tipo desconocido ({tipo})')
+            continue
+        if not label:
+            errores.append(f'Pregunta {posicion}: falta el texto de la pregunta')
+            continue
+        normalizado = {'id': campo_id, 'type': tipo, 'label': label, 'required': bool(campo.get('required', tipo == 'select'))}
+        if tipo == 'select':
+            # El editor deja opciones vacías al agregar una nueva: se descartan
+            opciones = list(dict.fromkeys(str(o).strip() for o in campo.get('options') or [] if str(o).strip()))
+            if not opciones:
+                errores.append(f'Pregunta {posicion}: el menú desplegable necesita al menos una opción')
+                continue
+            normalizado['options'] = opciones
+        elif tipo == 'text':
+            try:
+                largo = int(campo.get('max_length') or MAX_LENGTH_TEXTO)
+            except (TypeError, ValueError):
+                largo = 0
+            if not 0 < largo <= MAX_LENGTH_LIMITE:
+                errores.append(f'Pregunta {posicion}: max_length debe estar entre 1 y {MAX_LENGTH_LIMITE}')
+                continue
+            normalizado['max_length'] = largo
+        elif tipo == 'number':
+            for limite in ('min', 'max'):
+                if campo.get(limite) not in (None, ''):
+                    try:
+                        normalizado[limite] = float(campo[limite])
+                    except (TypeError, ValueError):
+                        errores.append(f'Pregunta {posicion}: {limite} debe ser un número')
+        limpio.append(normalizado)
+    if errores and estricto:
+        raise EsquemaInvalido(errores)
+    return limpio
+
+
+def _compilar_campo(campo):
+    tipo, requerido = campo['type'], campo['required']
+
+    if tipo == 'checkbox':
+        def validar(valor):
+            if valor in (None, ''):
+                valor = False
+            if not isinstance(valor, bool):
+                return None, 'Debe ser sí o no'
+            if requerido and not valor:
+                return None, 'Es obligatorio marcar esta opción'
+            return valor, None
+    elif tipo == 'select':
+        opciones = frozenset(campo['options'])
+
+        def validar(valor):
+            if valor in (None, ''):
+                return (None, 'Elegí una opción') if requerido else (None, None)
+            if valor not in opciones:
+                return None, 'La opción elegida no es válida'
+            return valor, None
+    elif tipo == 'text':
+        largo = campo['max_length']
+
+        def validar(valor):
+            valor = valor.strip() if isinstance(valor, str) else valor
+            if valor in (None, ''):
+                return (None, 'Este campo es obligatorio') if requerido else (None, None)
+            if not isinstance(valor, str):
+                return None, 'Debe ser un texto'
+            if len(valor) > largo:
+                return None, f'Máximo {largo} caracteres'
+            return valor, None
+    else:
+        minimo, maximo = campo.get('min'), campo.get('max')
+
+        def validar(valor):
+            if valor in (None, ''):
+                return (None, 'Este campo es obligatorio') if requerido else (None, None)
+            try:
+                numero = float(valor) if not isinstance(valor, bool) else None
+            except (TypeError, ValueError):
+                numero = None
+            if numero is None:
+                return None, 'Debe ser un número'
+            if minimo is not None and numero < minimo:
+                return None, f'El mínimo es {minimo:g}'
+            if maximo is not None and numero > maximo:
+                return None, f'El máximo es {maximo:g}'
+            return int(numero) if numero.is_integer() else numero, None
+    return campo['id'], validar
+
+
+class ValidadorFormulario:
+    def __init__(self, form):
+        self.campos = [_compilar_campo(campo) for campo in normalizar_esquema(form, estricto=False)]
+
+    def validar(self, respuestas):
+        """Devuelve (respuestas limpias, errores por id de pregunta). Descarta claves desconocidas."""
+        if respuestas is None:
+            respuestas = {}
+        if not isinstance(respuestas, dict):
+            return {}, {'_': 'Las respuestas deben ser un objeto'}
+        limpias, errores = {}, {}
+        for campo_id, validar in self.campos:
+            valor, error = validar(respuestas.get(campo_id))
+            if error:
+                errores[campo_id] = error
+            elif valor is not None:
+                limpias[campo_id] = valor
+        return limpias, errores
+
+
+_lock = threading.Lock()
+_compilados = OrderedDict()
+MAX_COMPILADOS = 256
+
+
+def validador_para(evento):
+    """Validador compilado del formulario del evento; se recompila solo si cambió form_version."""
+    clave = (evento.id, evento.form_version or 0)
+    with _lock:
+        validador = _compilados.get(clave)
+        if validador is not None:
+            _compilados.move_to_end(clave)
+            return validador
+    validador = ValidadorFormulario(evento.form_dinamico)
+    with _lock:
+        _compilados[clave] = validador
+        while len(_compilados) > MAX_COMPILADOS:
+            _compilados.popitem(last=False)
+    return validador
@@ -0,0 +1,227 @@
+import math
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+
+
+# --- Límite de pedidos y control de admisión ---
+# Algunas rutas son mucho más caras que el resto (login y registro calculan bcrypt, registro y
+# recuperación de contraseña mandan correo, cambiar el GIF llama a Giphy). Cada una tiene, en
+# LIMITES_RUTAS, una o más reglas "cubeta de fichas" por IP y/o por usuario: la cubeta tiene
+# `capacidad` fichas, se recarga de a capacidad / periodo por segundo y cada pedido gasta una.
+# Sin fichas el pedido se rechaza con 429 y Retry-After. Las cubetas de una ruta se miran juntas:
+# el pedido gasta una ficha de cada una solo si todas tienen; uno rechazado no gasta ninguna (si
+# no, alguien sin fichas en su IP podría seguir vaciando la cubeta del usuario de otro).
+#
+# Las cubetas viven en memoria del proceso. Con varios workers en la misma máquina se puede usar
+# LIMITES_ALMACEN = ruta de un archivo SQLite compartido, así el límite es uno solo para todos.
+#
+# Aparte, CupoConcurrencia limita cuántos pedidos entran a la vez a un trabajo caro (lo usa el pool
+# de bcrypt, ver contrasenas.py): una ráfaga de logins espera un poco y, si no hay lugar, recibe 503
+# en vez de ocupar todos los hilos del servidor.
+
+class AlmacenMemoria:
+    def __init__(self, max_claves=10000):
+        self._lock = threading.Lock()
+        self._cubetas = {}   # clave -> (fichas, momento, momento en que vuelve a estar llena)
+        self.max_claves = max_claves
+
+    def tomar(self, cubetas):
+        """Gasta una ficha de cada cubeta [(clave, capacidad, periodo)] si todas tienen.
+
+        Devuelve 0 si las gastó, o los segundos hasta que todas tengan una (sin gastar nada).
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            estados = [(clave, capacidad, capacidad / periodo, _recargar(self._cubetas.get(clave), capacidad, capacidad / periodo, ahora))
+                       for clave, capacidad, periodo in cubetas]
+            espera = max((_espera(fichas, tasa) for _, _, tasa, fichas in estados), default=0)
+            if not espera:
+                for clave, capacidad, tasa, fichas in estados:
+                    self._cubetas[clave] = (fichas - 1, ahora, ahora + (capacidad - fichas + 1) / tasa)
+                if len(self._cubetas) > self.max_claves:
+                    self._podar(ahora)
+        return espera
+
+    def _podar(self, ahora):
+        # Una cubeta llena es igual a una que no existe
+        for clave in [c for c, (_, _, llena) in self._cubetas.items() if llena <= ahora]:
+            del self._cubetas[clave]
+
+
+class AlmacenSQLite:
+    """Cubetas compartidas entre procesos de la misma máquina (un archivo SQLite local)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        with self._conexion() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cubeta (clave TEXT PRIMARY KEY, fichas REAL NOT NULL, momento REAL NOT NULL, llena REAL NOT NULL)')
+        self._ultima_poda = 0
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.ruta, timeout=2, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def tomar(self, cubetas):
+        ahora = time.time()   # reloj de pared: lo comparten todos los procesos
+        conn = self._conexion()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            estados = []
+            for clave, capacidad, periodo in cubetas:
+                fila = conn.execute('SELECT fichas, momento FROM cubeta WHERE clave = ?', (clave,)).fetchone()
+                tasa = capacidad / periodo
+                estados.append((clave, capacidad, tasa, _recargar(fila, capacidad, tasa, ahora)))
+            espera = max((_espera(fichas, tasa) for _, _, tasa, fichas in estados), default=0)
+            if not espera:
+                conn.executemany('INSERT OR REPLACE INTO cubeta (clave, fichas, momento, llena) VALUES (?, ?, ?, ?)',
+                                 [(clave, fichas - 1, ahora, ahora + (capacidad - fichas + 1) / tasa) for clave, capacidad, tasa, fichas in estados])
+            if ahora - self._ultima_poda > 600:
+                self._ultima_poda = ahora
+                conn.execute('DELETE FROM cubeta WHERE llena <= ?', (ahora,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return espera
+
+
+def _recargar(guardada, capacidad, tasa, ahora):
+    """Fichas de la cubeta ahora; `guardada` es (fichas, momento, ...) o None si no existe (llena)."""
+    if guardada is None:
+        return capacidad
+    fichas, momento = guardada[0], guardada[1]
+    return min(capacidad, fichas + max(ahora - momento, 0) * tasa)
+
+
+def _espera(fichas, tasa):
+    return 0 if fichas >= 1 else (1 - fichas) / tasa
+
+
+class Limitador:
+    def __init__(self, app):
+        self.reglas = app.config['LIMITES_RUTAS']
+        self.activo = app.config['LIMITES_ACTIVOS']
+        ruta = app.config.get('LIMITES_ALMACEN')
+        self.almacen = AlmacenSQLite(ruta) if ruta else AlmacenMemoria()
+        self._lock = threading.Lock()
+        self.rechazados = {}
+        self.errores = 0
+
+    def verificar(self, ruta):
+        """Devuelve los segundos a esperar si alguna regla de la ruta no tiene fichas (0 = pasa)."""
+        if not self.activo:
+            return 0
+        cubetas = []
+        for tipo, capacidad, periodo in self.reglas.get(ruta, ()):
+            clave = _clave(tipo)
+            if clave is not None:
+                cubetas.append((f'{ruta}:{tipo}:{clave}', capacidad, periodo))
+        if not cubetas:
+            return 0
+        try:
+            espera = self.almacen.tomar(cubetas)
+        except Exception as e:
+            # Si el almacén compartido falla, se deja pasar: el límite no puede tirar el login
+            self.errores += 1
+            current_app.logger.error('Límite de pedidos no disponible: %s', e)
+            return 0
+        if espera:
+            with self._lock:
+                self.rechazados[ruta] = self.rechazados.get(ruta, 0) + 1
+        return espera
+
+    def estado(self):
+        with self._lock:
+            return {'activo': self.activo, 'almacen': type(self.almacen).__name__, 'rechazados': dict(self.rechazados), 'errores': self.errores}
+
+
+def _clave(tipo):
+    if tipo == 'ip':
+        return request.remote_addr
+    # Usuario: el autenticado, o el correo que viene en el cuerpo (login, registro, recuperación)
+    # junto con la IP: desde otra IP no se puede dejar sin fichas a un compañero
+    if g.get('usuario_id') is not None:
+        return g.usuario_id
+    datos = request.get_json(silent=True)
+    usuario = datos.get('username') if isinstance(datos, dict) else None
+    return f'{request.remote_addr}|{usuario.strip().lower()}' if isinstance(usuario, str) and usuario.strip() else None
+
+
+def limitar(ruta):
+    """Aplica las reglas LIMITES_RUTAS[ruta]; va debajo de token_required si la ruta es autenticada."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            espera = current_app.extensions['limites'].verificar(ruta)
+            if espera:
+                segundos = max(1, math.ceil(espera))
+                return jsonify({'message': f'Demasiados intentos. Probá de nuevo en {segundos} segundos.'}), 429, {'Retry-After': str(segundos)}
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+class Saturado(Exception):
+    def __init__(self, reintentar):
+        super().__init__('Servidor ocupado')
+        self.reintentar = reintentar
+
+
+class CupoConcurrencia:
+    """Semáforo con espera máxima: si no hay lugar a tiempo, lanza Saturado (la app responde 503).
+
+    Con max_esperando, si ya hay tantos pedidos esperando se rechaza enseguida: los que esperan
+    también ocupan un hilo del servidor.
+    """
+
+    def __init__(self, maximo, espera_max, max_esperando=None):
+        self.maximo = maximo
+        self.espera_max = espera_max
+        self.max_esperando = max_esperando
+        self._semaforo = threading.BoundedSemaphore(maximo)
+        self._lock = threading.Lock()
+        self.en_uso = 0
+        self.esperando = 0
+        self.rechazados = 0
+
+    @contextmanager
+    def usar(self):
+        # Si hay lugar se entra sin esperar; max_esperando solo cuenta a los que tienen que esperar
+        obtenido = self._semaforo.acquire(blocking=False)
+        if not obtenido:
+            with self._lock:
+                lleno = self.max_esperando is not None and self.esperando >= self.max_esperando
+                if lleno:
+                    self.rechazados += 1
+                else:
+                    self.esperando += 1
+            if lleno:
+                raise Saturado(max(1, math.ceil(self.espera_max)))
+            obtenido = self._semaforo.acquire(timeout=self.espera_max)
+            with self._lock:
+                self.esperando -= 1
+                if not obtenido:
+                    self.rechazados += 1
+            if not obtenido:
+                raise Saturado(max(1, math.ceil(self.espera_max)))
+        with self._lock:
+            self.en_uso += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.en_uso -= 1
+            self._semaforo.release()
+
+    def estado(self):
+        with self._lock:
+            return {'maximo': self.maximo, 'en_uso': self.en_uso, 'esperando': self.esperando, 'rechazados': self.rechazados}
@@ -0,0 +1,52 @@
+# medir_arranque.py
+# Mide el arranque en frío de la aplicación: cada corrida es un proceso nuevo de Python, como un
+# worker recién levantado o una corrida de pruebas / benchmarks.
+#
+# Uso:  python medir_arranque.py [perfil] [corridas]      (por defecto: test 10)
+import sys
+import json
+import subprocess
+from statistics import median
+
+# --- CÓDIGO QUE CORRE EN CADA PROCESO NUEVO ---
+MEDICION = r'''
+import sys, json
+from time import perf_counter
+t0 = perf_counter()
+from app import create_app
+t1 = perf_counter()
+app = create_app(sys.argv[1])
+t2 = perf_counter()
+respuesta = app.test_client().get('/profile')
+t3 = perf_counter()
+print(json.dumps({
+    'importar': (t1 - t0) * 1000,
+    'create_app': (t2 - t1) * 1000,
+    'primer_pedido': (t3 - t2) * 1000,
+    'total': (t3 - t0) * 1000,
+    'diferidos': [m for m in ('flask_mail', 'requests', 'dateutil.parser', 'psycopg2') if m not in sys.modules],
+}))
+'''
+
+
+def medir(perfil, corridas):
+    resultados = []
+    for _ in range(corridas):
+        salida = subprocess.run([sys.executable, '-c', MEDICION, perfil], capture_output=True, text=True, check=True)
+        resultados.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+    return resultados
+
+
+# --- EJECUCIÓN DEL SCRIPT ---
+if __name__ == '__main__':
+    perfil = sys.argv[1] if len(sys.argv) > 1 else 'test'
+    corridas = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    resultados = medir(perfil, corridas)
+
+    print(f"\nArranque en frío, perfil '{perfil}', {corridas} corridas (mediana / máximo, en ms)")
+    print("========================================================")
+    for etapa in ('importar', 'create_app', 'primer_pedido', 'total'):
+        valores = [r[etapa] for r in resultados]
+        print(f"{etapa:<15} {median(valores):8.1f} {max(valores):8.1f}")
+    print(f"Sin cargar hasta el primer uso: {', '.join(resultados[0]['diferidos']) or '-'}")
+    print("========================================================\n")
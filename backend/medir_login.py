@@ -0,0 +1,126 @@
+# medir_login.py
+# Simula la entrada de la mañana: muchos logins a la vez contra un servidor waitress real, mientras
+# otro grupo de clientes pide /profile (un pedido barato). Mide la latencia de los dos, con y sin
+# la tormenta de logins, y muestra el estado del pool de bcrypt al final.
+#
+# Uso:  python medir_login.py [logins] [clientes_login] [hilos_bcrypt]      (por defecto: 200 32 2)
+#
+# Un login rechazado con 503 (pool de bcrypt lleno) se reintenta después de Retry-After, como haría
+# el usuario; la latencia del login es la total, con los reintentos.
+import sys
+import random
+import json
+import tempfile
+import threading
+import http.client
+from time import perf_counter, sleep
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+from waitress.server import create_server
+
+from app import create_app, bcrypt
+from models import db, User, UserRole
+
+PUERTO = 5099
+USUARIOS = 50
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(int(len(valores) * p), len(valores) - 1)] * 1000 if valores else 0
+
+
+def pedir(metodo, ruta, cuerpo=None, headers=None):
+    conexion = http.client.HTTPConnection('127.0.0.1', PUERTO, timeout=60)
+    inicio = perf_counter()
+    conexion.request(metodo, ruta, body=json.dumps(cuerpo) if cuerpo else None, headers={'Content-Type': 'application/json', **(headers or {})})
+    respuesta = conexion.getresponse()
+    respuesta.read()
+    conexion.close()
+    return respuesta.status, perf_counter() - inicio, respuesta.getheader('Retry-After')
+
+
+def preparar(app):
+    with app.app_context():
+        db.create_all()
+        # Un solo hash para todos: el costo es el mismo y la carga inicial no tarda minutos
+        password = bcrypt.generate_password_hash('Clave1234', app.config['BCRYPT_LOG_ROUNDS']).decode('utf-8')
+        db.session.add_all([User(username=f'usuario{i}@juliatours.com.ar', password=password, is_verified=True, role=UserRole.VIEWER,
+                                 nombre=f'Usuario{i}', apellido='Prueba', sector='Ventas', sucursal='Centro', interno=str(100 + i))
+                            for i in range(USUARIOS)])
+        db.session.commit()
+        user = User.query.first()
+        return {'x-access-token': jwt.encode({'id': user.id, 'role': user.role.name}, app.config['SECRET_KEY'], algorithm='HS256')}
+
+
+def medir_baratos(token, detener, latencias):
+    while not detener.is_set():
+        estado, segundos, _ = pedir('GET', '/profile', headers=token)
+        if estado == 200:
+            latencias.append(segundos)
+        sleep(0.01)
+
+
+def tormenta(logins, clientes):
+    resultados = []
+    def login(i):
+        inicio, rechazos = perf_counter(), 0
+        while True:
+            estado, _, reintentar = pedir('POST', '/login', {'username': f'usuario{i % USUARIOS}@juliatours.com.ar', 'password': 'Clave1234'})
+            if estado != 503:
+                break
+            rechazos += 1
+            sleep(float(reintentar or 1) * random.uniform(1, 1.5))
+        resultados.append((estado, perf_counter() - inicio, rechazos))
+    with ThreadPoolExecutor(max_workers=clientes) as pool:
+        list(pool.map(login, range(logins)))
+    return resultados
+
+
+def fase(token, duracion=None, logins=0, clientes=0):
+    detener, latencias = threading.Event(), []
+    hilos = [threading.Thread(target=medir_baratos, args=(token, detener, latencias)) for _ in range(2)]
+    for hilo in hilos:
+        hilo.start()
+    inicio = perf_counter()
+    resultados = tormenta(logins, clientes) if logins else (sleep(duracion) or [])
+    total = perf_counter() - inicio
+    detener.set()
+    for hilo in hilos:
+        hilo.join()
+    return latencias, resultados, total
+
+
+# --- EJECUCIÓN DEL SCRIPT ---
+if __name__ == '__main__':
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    clientes = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    hilos_bcrypt = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    app = create_app('bench', SQLALCHEMY_DATABASE_URI='sqlite:///' + tempfile.mktemp(suffix='.db'),
+                     LIMITES_ACTIVOS=False, BCRYPT_LOG_ROUNDS=12, BCRYPT_HILOS=hilos_bcrypt)
+    token = preparar(app)
+    servidor = create_server(app, host='127.0.0.1', port=PUERTO, threads=app.config['WAITRESS_HILOS'])
+    threading.Thread(target=servidor.run, daemon=True).start()
+    sleep(0.2)
+
+    base, _, _ = fase(token, duracion=3)
+    durante, resultados, total = fase(token, logins=logins, clientes=clientes)
+    servidor.close()
+
+    tiempos_login = [s for estado, s, _ in resultados if estado == 200]
+    estados = {}
+    for estado, _, _ in resultados:
+        estados[estado] = estados.get(estado, 0) + 1
+    rechazos = sum(r for _, _, r in resultados)
+
+    print(f"\nTormenta de logins: {logins} logins, {clientes} clientes, {hilos_bcrypt} hilos de bcrypt, {app.config['WAITRESS_HILOS']} hilos de waitress")
+    print("========================================================")
+    print(f"Logins por segundo:        {len(tiempos_login) / total:8.1f}   (respuestas: {estados}, 503 reintentados: {rechazos})")
+    print(f"Login p50 / p99 (ms):      {percentil(tiempos_login, 0.5):8.1f} {percentil(tiempos_login, 0.99):8.1f}")
+    print(f"/profile sin tormenta:     {percentil(base, 0.5):8.1f} {percentil(base, 0.99):8.1f}   (p50 / p99 ms, {len(base)} pedidos)")
+    print(f"/profile con tormenta:     {percentil(durante, 0.5):8.1f} {percentil(durante, 0.99):8.1f}   (p50 / p99 ms, {len(durante)} pedidos)")
+    with app.app_context():
+        print(f"Pool de bcrypt: {json.dumps(app.extensions['contrasenas'].estado())}")
+    print("========================================================\n")
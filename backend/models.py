@@ -1,11 +1,15 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta 
 import enum 
+from sqlalchemy.orm import aliased
 from sqlalchemy.sql import func 
-from dateutil.parser import parse as parse_date
+
+from basedatos import SesionRuteada
 
 # Se crea una instancia de SQLAlchemy que se conectará a la app más adelante.
-db = SQLAlchemy()
+# La sesión elige entre el primario y la réplica de lectura (ver basedatos.py).
+db = SQLAlchemy(session_options={'class_': SesionRuteada})
 
 class UserRole(enum.Enum):
     VIEWER = 'viewer' # Rol por defecto, solo lectura
@@ -31,13 +35,25 @@ class User(db.Model):
     apellido = db.Column(db.String(100), nullable=True)
     interno = db.Column(db.String(20), nullable=True)
     fecha_nacimiento = db.Column(db.Date, nullable=True)
-    sector = db.Column(db.String(100), nullable=True)
-    sucursal = db.Column(db.String(100), nullable=True)
+    sector = db.Column(db.String(100), nullable=True, index=True)
+    sucursal = db.Column(db.String(100), nullable=True, index=True)
     profile_image = db.Column(db.String(100), nullable=False, default='default.png')
-    guardia_nro = db.Column(db.Integer, nullable=True)
+    guardia_nro = db.Column(db.Integer, nullable=True, index=True)
+    # Token secreto de las URLs de suscripción .ics (los clientes de calendario no mandan el JWT)
+    calendar_token = db.Column(db.String(64), nullable=True, unique=True, index=True)
 
     role = db.Column(db.Enum(UserRole), nullable=False, default=UserRole.VIEWER)
 
+def author_dict(author):
+    if not author:
+        return {'id': None, 'nombre': 'Usuario', 'apellido': 'Eliminado', 'profile_image': 'default.png'}
+    return {
+        'id': author.id,
+        'nombre': author.nombre,
+        'apellido': author.apellido,
+        'profile_image': author.profile_image
+    }
+
 class Novedad(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     asunto = db.Column(db.String(200), nullable=False)
@@ -47,25 +63,28 @@ class Novedad(db.Model):
     author = db.relationship('User')
     attachments = db.relationship('Attachment', backref='novedad', lazy=True, cascade="all, delete-orphan")
 
-    def to_dict(self):
-        author_info = {'id': None, 'nombre': 'Usuario', 'apellido': 'Eliminado', 'profile_image': 'default.png'}
-        if self.author:
-            author_info = {
-                'id': self.author.id,
-                'nombre': self.author.nombre,
-                'apellido': self.author.apellido,
-                'profile_image': self.author.profile_image
-            }
+    # Datos de resumen calculados al guardar (ver contenido.py); los listados usan esto y no 'content'
+    excerpt = db.Column(db.String(320), nullable=True)
+    word_count = db.Column(db.Integer, nullable=True)
+    image_count = db.Column(db.Integer, nullable=True)
+    link_count = db.Column(db.Integer, nullable=True)
 
+    def to_summary_dict(self):
         return {
             'id': self.id,
             'asunto': self.asunto,
-            'content': self.content,
+            'excerpt': self.excerpt,
+            'word_count': self.word_count,
+            'image_count': self.image_count,
+            'link_count': self.link_count,
             'created_at': self.created_at.isoformat(),
-            'author': author_info,
+            'author': author_dict(self.author),
             'attachments': [att.to_dict() for att in self.attachments]
         }
 
+    def to_dict(self):
+        return dict(self.to_summary_dict(), content=self.content)
+
 class Attachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     # Nombre original del archivo subido
@@ -79,12 +98,46 @@ class Attachment(db.Model):
     
     novedad_id = db.Column(db.Integer, db.ForeignKey('novedad.id'), nullable=True)
 
+    # Metadatos copiados de UploadMeta al crear el adjunto
+    size = db.Column(db.BigInteger, nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    page_count = db.Column(db.Integer, nullable=True)
+
     def to_dict(self):
         return {
             'id': self.id,
             'original_filename': self.original_filename,
             'url': f"/uploads/{self.saved_filename}", 
-            'mimetype': self.mimetype
+            'mimetype': self.mimetype,
+            'size': self.size,
+            'sha256': self.sha256,
+            'width': self.width,
+            'height': self.height,
+            'page_count': self.page_count
+        }
+
+class UploadMeta(db.Model):
+    # Metadatos de cada archivo subido por /upload-file, calculados al recibirlo
+    saved_filename = db.Column(db.String(255), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
+    mimetype = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    page_count = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    def to_dict(self):
+        return {
+            'mimetype': self.mimetype,
+            'size': self.size,
+            'sha256': self.sha256,
+            'width': self.width,
+            'height': self.height,
+            'page_count': self.page_count
         }
 
 class Post(db.Model):
@@ -97,26 +150,29 @@ class Post(db.Model):
     author = db.relationship('User')
     attachments = db.relationship('Attachment', backref='post', lazy=True, cascade="all, delete-orphan")
 
-    def to_dict(self):
-        author_info = {'id': None, 'nombre': 'Usuario', 'apellido': 'Eliminado', 'profile_image': 'default.png'}
-        if self.author:
-            author_info = {
-                'id': self.author.id,
-                'nombre': self.author.nombre,
-                'apellido': self.author.apellido,
-                'profile_image': self.author.profile_image
-            }
-        
+    # Datos de resumen calculados al guardar (ver contenido.py); los listados usan esto y no 'content'
+    excerpt = db.Column(db.String(320), nullable=True)
+    word_count = db.Column(db.Integer, nullable=True)
+    image_count = db.Column(db.Integer, nullable=True)
+    link_count = db.Column(db.Integer, nullable=True)
+
+    def to_summary_dict(self):
         return {
             'id': self.id,
             'sector': self.sector,
             'title': self.title,
-            'content': self.content,
+            'excerpt': self.excerpt,
+            'word_count': self.word_count,
+            'image_count': self.image_count,
+            'link_count': self.link_count,
             'created_at': self.created_at.isoformat(),
-            'author': author_info,
+            'author': author_dict(self.author),
             'attachments': [att.to_dict() for att in self.attachments]
         }
 
+    def to_dict(self):
+        return dict(self.to_summary_dict(), content=self.content)
+
 class AgendaContact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(200), nullable=False)
@@ -158,6 +214,9 @@ class Reunion(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     creador = db.relationship('User')
 
+    # Búsqueda de superposiciones por sala: ubicacion = x AND start_time < fin AND end_time > inicio
+    __table_args__ = (db.Index('ix_reunion_sala_horario', 'ubicacion', 'start_time', 'end_time'),)
+
     def to_dict(self):
         # Comprueba si el creador existe
         creador_nombre = "Usuario Eliminado"
@@ -181,26 +240,98 @@ class Reunion(db.Model):
 
 
 
-class Guardia(db.Model):
+class ReunionSerie(db.Model):
+    # Reunión recurrente: las ocurrencias se calculan a partir de la regla (ver recurrencia.py)
     id = db.Column(db.Integer, primary_key=True)
-    fecha = db.Column(db.Date, nullable=False)
+    tema = db.Column(db.String(255), nullable=False)
+    dtstart = db.Column(db.DateTime(timezone=True), nullable=False)  # inicio de la primera ocurrencia
+    duracion_minutos = db.Column(db.Integer, nullable=False)
+    regla = db.Column(db.String(255), nullable=False)  # RRULE sin DTSTART, en hora local
+    excepciones = db.Column(db.JSON, nullable=False, default=list)  # inicios (hora local) de ocurrencias canceladas
+    # Fin de la última ocurrencia (None = sin fin); con dtstart permite filtrar las series por ventana
+    fin = db.Column(db.DateTime(timezone=True), nullable=True)
+    ubicacion = db.Column(db.String(255), nullable=True)
+    cantidad_personas = db.Column(db.Integer, nullable=True)
+    zoom_link = db.Column(db.String(255), nullable=True)
+    convoca = db.Column(db.String(100), nullable=True)
+    proveedor = db.Column(db.String(100), nullable=True)
+    necesita_bebida = db.Column(db.Boolean, default=False)
+    necesita_comida = db.Column(db.String(255), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    
-    usuario = db.relationship('User', backref=db.backref('guardias', lazy=True))
+    creador = db.relationship('User')
+
+    __table_args__ = (db.Index('ix_reunion_serie_ventana', 'dtstart', 'fin'),)
+
+    def _datos(self):
+        creador_nombre = "Usuario Eliminado"
+        if self.creador and self.creador.nombre:
+            creador_nombre = f"{self.creador.nombre} {self.creador.apellido or ''}".strip()
+        return {
+            'title': self.tema,
+            'ubicacion': self.ubicacion,
+            'cantidad_personas': self.cantidad_personas,
+            'zoom_link': self.zoom_link,
+            'convoca': self.convoca,
+            'proveedor': self.proveedor,
+            'necesita_bebida': self.necesita_bebida,
+            'necesita_comida': self.necesita_comida,
+            'creador': creador_nombre,
+            'serie_id': self.id,
+            'rrule': self.regla,
+        }
+
+    def ocurrencia_dict(self, inicio, zona):
+        """Misma forma que Reunion.to_dict() para una ocurrencia (inicio en hora local sin zona)."""
+        fin = inicio + timedelta(minutes=self.duracion_minutos)
+        clave = inicio.isoformat(timespec='minutes')
+        return {
+            'id': f's{self.id}-{clave}',
+            'ocurrencia': clave,
+            'start': inicio.replace(tzinfo=zona).isoformat(),
+            'end': fin.replace(tzinfo=zona).isoformat(),
+            **self._datos(),
+        }
 
     def to_dict(self):
-        usuario_info = {
-            'id': self.usuario.id,
-            'nombre': self.usuario.nombre,
-            'apellido': self.usuario.apellido,
-            'interno': self.usuario.interno,
-            'sector': self.usuario.sector
-        } if self.usuario else None
+        return {
+            'id': self.id,
+            'start': self.dtstart.isoformat(),
+            'duracion_minutos': self.duracion_minutos,
+            'excepciones': self.excepciones or [],
+            'fin': self.fin.isoformat() if self.fin else None,
+            **self._datos(),
+        }
+
+
+class Guardia(db.Model):
+    # Cambio puntual sobre la guardia de una fecha: `usuario` cubre ese día. Si `reemplaza_id` está
+    # cargado es un intercambio (esa persona del grupo de turno queda libre); si no, es un refuerzo.
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.Date, nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    reemplaza_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
 
+    usuario = db.relationship('User', foreign_keys=[user_id], backref=db.backref('guardias', lazy=True))
+    reemplazado = db.relationship('User', foreign_keys=[reemplaza_id])
+
+    __table_args__ = (db.Index('ux_guardia_fecha_usuario', 'fecha', 'user_id', unique=True),)
+
+    @staticmethod
+    def _usuario_dict(usuario):
+        return {
+            'id': usuario.id,
+            'nombre': usuario.nombre,
+            'apellido': usuario.apellido,
+            'interno': usuario.interno,
+            'sector': usuario.sector
+        } if usuario else None
+
+    def to_dict(self):
         return {
             'id': self.id,
             'fecha': self.fecha.isoformat(),
-            'usuario': usuario_info
+            'usuario': self._usuario_dict(self.usuario),
+            'reemplaza': self._usuario_dict(self.reemplazado)
         }
 
 
@@ -228,6 +359,7 @@ class Evento(db.Model):
     ubicacion_evento = db.Column(db.String(100), nullable=False)
     
     form_dinamico = db.Column(db.JSON, nullable=True)
+    form_version = db.Column(db.Integer, nullable=True, default=0)  # cambia con cada edición de form_dinamico
 
     hidden_from_users = db.Column(db.JSON, nullable=True, default=[])
 
@@ -282,4 +414,193 @@ class CumpleGif(db.Model):
     gif_url = db.Column(db.String(500), nullable=False)
 
     # Hacemos que la combinación de usuario y fecha sea única
-    __table_args__ = (db.UniqueConstraint('user_id', 'fecha', name='_user_fecha_uc'),)
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('user_id', 'fecha', name='_user_fecha_uc'),)
+
+
+class DigestEnvio(db.Model):
+    # Punto de control del resumen por correo: guarda, por usuario, hasta qué novedad, post
+    # y evento ya se le envió. Se actualiza después de cada envío exitoso.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    ultima_novedad_id = db.Column(db.Integer, nullable=False, default=0)
+    ultimo_post_id = db.Column(db.Integer, nullable=False, default=0)
+    ultimo_evento_id = db.Column(db.Integer, nullable=False, default=0)
+    # {'novedad': [...], 'post': [...], 'evento': [...]}: ids ya vistos en las últimas DIGEST_VENTANA_IDS
+    # por debajo de cada marca; lo que aparezca ahí y no esté en la lista se confirmó tarde (ver digest.py)
+    vistos_recientes = db.Column(db.JSON, nullable=True)
+    enviado_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+
+class VersionEntidad(db.Model):
+    # Versión de los datos que cambia otro proceso (ej. `flask archivar`): el feed de cambios es de
+    # cada proceso, así que los servidores leen esta tabla para enterarse (ver change_feed.CambiosExternos).
+    entidad = db.Column(db.String(50), primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False, default=0)
+    modificado = db.Column(db.DateTime(timezone=True), nullable=False)
+
+
+
+
+# --- Tablas de archivo ---
+# Filas viejas de las tablas que solo crecen, movidas por archivo.py. Tienen las mismas columnas
+# (sin FKs ni restricciones únicas, para poder mover en cualquier orden) más archivado_at. Las clases
+# reutilizan to_dict() del modelo original, así las respuestas con include_archived son iguales.
+
+def _tabla_archivo(tabla, columna_fecha):
+    columnas = [db.Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False) for c in tabla.columns]
+    return db.Table(
+        f'{tabla.name}_archivo', db.metadata, *columnas,
+        db.Column('archivado_at', db.DateTime(timezone=True), server_default=func.now()),
+        db.Index(f'ix_{tabla.name}_archivo_{columna_fecha}', columna_fecha),
+    )
+
+
+class AttachmentArchivo(db.Model):
+    __table__ = _tabla_archivo(Attachment.__table__, 'novedad_id')
+    to_dict = Attachment.to_dict
+
+
+class NovedadArchivo(db.Model):
+    __table__ = _tabla_archivo(Novedad.__table__, 'created_at')
+    author = db.relationship('User', primaryjoin='foreign(NovedadArchivo.user_id) == User.id', viewonly=True)
+    attachments = db.relationship('AttachmentArchivo', primaryjoin='foreign(AttachmentArchivo.novedad_id) == NovedadArchivo.id', viewonly=True)
+    to_summary_dict = Novedad.to_summary_dict
+    to_dict = Novedad.to_dict
+
+
+class EventoArchivo(db.Model):
+    __table__ = _tabla_archivo(Evento.__table__, 'fecha_hora')
+    creador = db.relationship('User', primaryjoin='foreign(EventoArchivo.user_id) == User.id', viewonly=True, lazy='joined')
+    to_dict = Evento.to_dict
+
+
+class InscripcionArchivo(db.Model):
+    __table__ = _tabla_archivo(Inscripcion.__table__, 'evento_id')
+    usuario = db.relationship('User', primaryjoin='foreign(InscripcionArchivo.user_id) == User.id', viewonly=True, lazy='joined')
+    to_dict = Inscripcion.to_dict
+
+
+class ReunionArchivo(db.Model):
+    __table__ = _tabla_archivo(Reunion.__table__, 'start_time')
+    creador = db.relationship('User', primaryjoin='foreign(ReunionArchivo.user_id) == User.id', viewonly=True)
+    to_dict = Reunion.to_dict
+
+
+class GuardiaFechaArchivo(db.Model):
+    __table__ = _tabla_archivo(GuardiaFecha.__table__, 'fecha')
+    to_dict = GuardiaFecha.to_dict
+
+
+class CumpleGifArchivo(db.Model):
+    __table__ = _tabla_archivo(CumpleGif.__table__, 'fecha')
+
+
+class AuditLog(db.Model):
+    # Registro de auditoría, solo de inserción: quién creó, modificó o borró contenido y usuarios.
+    # Lo escribe en lotes el hilo de auditoria.py; actor_id no es FK para conservar el historial
+    # de usuarios ya borrados.
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+    actor_id = db.Column(db.Integer, nullable=True)
+    entidad = db.Column(db.String(30), nullable=False)
+    entidad_id = db.Column(db.String(40), nullable=True)
+    accion = db.Column(db.String(20), nullable=False)
+    cambios = db.Column(db.JSON, nullable=True)
+    ip = db.Column(db.String(45), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_audit_log_entidad', 'entidad', 'entidad_id', 'id'),
+        db.Index('ix_audit_log_actor', 'actor_id', 'id'),
+    )
+
+    def to_dict(self, actor=None):
+        return {
+            'id': self.id,
+            'fecha': self.fecha.isoformat(),
+            'actor': {'id': self.actor_id, 'nombre': actor.nombre, 'apellido': actor.apellido, 'username': actor.username} if actor else ({'id': self.actor_id} if self.actor_id else None),
+            'entidad': self.entidad,
+            'entidad_id': self.entidad_id,
+            'accion': self.accion,
+            'cambios': self.cambios,
+            'ip': self.ip
+        }
+
+
+def actualizar_esquema():
+    """Crea las tablas nuevas y agrega a las existentes las columnas e índices que falten.
+
+    db.create_all() no modifica tablas ya creadas; esto cubre el caso de columnas nuevas que
+    admiten nulos (o tienen valor por defecto) sin necesidad de una herramienta de migraciones.
+    Devuelve las restricciones que no se pudieron crear, con las filas que lo impiden.
+    """
+    # Solo el primario: la réplica (bind 'replica') se alimenta de él y no tiene modelos propios
+    db.create_all(bind_key=None)
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for tabla in db.metadata.sorted_tables:
+            existentes = {c['name'] for c in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name in existentes:
+                    continue
+                tipo = columna.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(f'ALTER TABLE "{tabla.name}" ADD COLUMN "{columna.name}" {tipo}'))
+            for indice in tabla.indexes:
+                indice.create(conn, checkfirst=True)
+    problema = _restriccion_salas()
+    return [problema] if problema else []
+
+
+RESTRICCION_SALAS = 'reunion_sala_sin_superposicion'
+
+def _crear_restriccion_salas():
+    # Dos reuniones en la misma sala no pueden superponerse: lo garantiza la base con una restricción
+    # de exclusión sobre el rango horario, así dos reservas simultáneas no pueden colarse las dos.
+    # Es propia de PostgreSQL; en SQLite (desarrollo y pruebas) queda solo el chequeo de la aplicación.
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        existe = conn.execute(db.text("SELECT 1 FROM pg_constraint WHERE conname = :nombre"), {'nombre': RESTRICCION_SALAS}).first()
+        if existe:
+            return
+        conn.execute(db.text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+        conn.execute(db.text(
+            f"ALTER TABLE reunion ADD CONSTRAINT {RESTRICCION_SALAS} "
+            "EXCLUDE USING gist (ubicacion WITH =, tstzrange(start_time, end_time) WITH &&) "
+            "WHERE (ubicacion IS NOT NULL AND ubicacion <> '')"
+        ))
+
+def _restriccion_salas():
+    """Crea la restricción de salas; si no se puede, devuelve el problema con las reuniones que la impiden."""
+    try:
+        _crear_restriccion_salas()
+        return None
+    except Exception as e:
+        # Suele ser por reservas superpuestas ya cargadas: hay que corregirlas y volver a correr actualizar-db
+        conflictos = reuniones_superpuestas()
+        current_app.logger.error('No se pudo crear la restricción %s (%s reservas superpuestas): %s', RESTRICCION_SALAS, len(conflictos), e)
+        return {'restriccion': RESTRICCION_SALAS, 'error': str(e).splitlines()[0], 'conflictos': conflictos}
+
+
+def restricciones_faltantes():
+    """Restricciones que actualizar_esquema debería haber creado y no están en la base."""
+    if db.engine.dialect.name != 'postgresql':
+        return []
+    with db.engine.connect() as conn:
+        existe = conn.execute(db.text("SELECT 1 FROM pg_constraint WHERE conname = :nombre"), {'nombre': RESTRICCION_SALAS}).first()
+    return [] if existe else [RESTRICCION_SALAS]
+
+
+def reuniones_superpuestas():
+    """Pares de reuniones de la misma sala cuyos horarios se pisan (lo que impide crear la restricción)."""
+    a, b = aliased(Reunion), aliased(Reunion)
+    # Contra el primario: es donde se crea la restricción
+    with db.engine.connect() as conn:
+        filas = conn.execute(
+            db.select(a.id, b.id, a.ubicacion, a.start_time, a.end_time, b.start_time, b.end_time)
+            .join(b, db.and_(a.ubicacion == b.ubicacion, a.id < b.id))
+            .where(a.ubicacion.isnot(None), a.ubicacion != '', a.start_time < b.end_time, b.start_time < a.end_time)
+            .order_by(a.ubicacion, a.start_time, a.id, b.id)
+        ).all()
+    return [{'ubicacion': ubicacion, 'reuniones': [
+                {'id': id_a, 'start_time': inicio_a.isoformat(), 'end_time': fin_a.isoformat()},
+                {'id': id_b, 'start_time': inicio_b.isoformat(), 'end_time': fin_b.isoformat()}]}
+            for id_a, id_b, ubicacion, inicio_a, fin_a, inicio_b, fin_b in filas]
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from dateutil.rrule import rrulestr
+
+
+# --- Reuniones recurrentes ---
+# Una ReunionSerie guarda la primera ocurrencia (dtstart + duración) y una regla RRULE
+# (RFC 5545, ej. "FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20261231T235959"). Las ocurrencias no se guardan en
+# la tabla: se calculan solo dentro de la ventana que pide el calendario.
+#
+# Todo el cálculo se hace en hora local sin zona (la hora "de pared" de la oficina); así UNTIL y las
+# excepciones se escriben como las ve el usuario y la serie no se corre con cambios de horario.
+
+FRECUENCIAS = {'DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'}
+MAX_OCURRENCIAS = 1000
+# Tope de ocurrencias de una serie dentro de una ventana (alcanza para una serie diaria de un año)
+MAX_OCURRENCIAS_VENTANA = 400
+# La hora de cada ocurrencia es la de dtstart: sin esto una regla DAILY podría dar cientos por día
+PARTES_NO_PERMITIDAS = ('BYHOUR', 'BYMINUTE', 'BYSECOND')
+
+
+class ReglaInvalida(ValueError):
+    pass
+
+
+def partes_regla(regla):
+    """'FREQ=WEEKLY;COUNT=3' -> {'FREQ': 'WEEKLY', 'COUNT': '3'} (respeta el orden)."""
+    regla = (regla or '').strip()
+    if regla.upper().startswith('RRULE:'):
+        regla = regla[6:]
+    partes = {}
+    for parte in filter(None, regla.split(';')):
+        nombre, _, valor = parte.partition('=')
+        partes[nombre.strip().upper()] = valor.strip().upper()
+    return partes
+
+
+def armar_regla(partes):
+    return ';'.join(f'{nombre}={valor}' for nombre, valor in partes.items())
+
+
+@lru_cache(maxsize=512)
+def _rrule(regla, dtstart):
+    # cache=True hace que dateutil recuerde las ocurrencias ya generadas: un mismo mes pedido
+    # muchas veces no vuelve a iterar desde el inicio de la serie.
+    return rrulestr(regla, dtstart=dtstart, cache=True)
+
+
+def normalizar_regla(regla, dtstart):
+    """Valida la regla y la devuelve en forma canónica; lanza ReglaInvalida si no sirve."""
+    partes = partes_regla(regla)
+    if partes.get('FREQ') not in FRECUENCIAS:
+        raise ReglaInvalida('La frecuencia debe ser DAILY, WEEKLY, MONTHLY o YEARLY')
+    if 'COUNT' in partes and 'UNTIL' in partes:
+        raise ReglaInvalida('COUNT y UNTIL no pueden usarse juntos')
+    if any(parte in partes for parte in PARTES_NO_PERMITIDAS):
+        raise ReglaInvalida('La hora de las ocurrencias es la del inicio de la serie (BYHOUR, BYMINUTE y BYSECOND no se admiten)')
+    if 'UNTIL' in partes:
+        # Se acepta una fecha sola (hasta ese día inclusive) o fecha y hora, siempre en hora local
+        valor = partes['UNTIL'].rstrip('Z')
+        partes['UNTIL'] = valor + 'T235959' if len(valor) == 8 else valor
+    if 'COUNT' in partes and not (partes['COUNT'].isdigit() and 0 < int(partes['COUNT']) <= MAX_OCURRENCIAS):
+        raise ReglaInvalida(f'COUNT debe estar entre 1 y {MAX_OCURRENCIAS}')
+    canonica = armar_regla(partes)
+    try:
+        _rrule(canonica, dtstart)
+    except (ValueError, TypeError) as e:
+        raise ReglaInvalida(f'Regla de recurrencia inválida: {e}')
+    return canonica
+
+
+def ultima_ocurrencia(regla, dtstart):
+    """Inicio de la última ocurrencia, o None si la serie no tiene fin."""
+    partes = partes_regla(regla)
+    if 'COUNT' not in partes and 'UNTIL' not in partes:
+        return None
+    regla_rrule = _rrule(regla, dtstart)
+    ultima = None
+    for i, ocurrencia in enumerate(regla_rrule):
+        if i >= MAX_OCURRENCIAS:
+            raise ReglaInvalida(f'La serie no puede tener más de {MAX_OCURRENCIAS} ocurrencias')
+        ultima = ocurrencia
+    if ultima is None:
+        raise ReglaInvalida('La regla no genera ninguna ocurrencia')
+    return ultima
+
+
+def primera_ocurrencia(regla, dtstart):
+    return _rrule(regla, dtstart).after(dtstart, inc=True)
+
+
+def ocurrencias(regla, dtstart, duracion, excepciones, desde, hasta):
+    """Inicios de las ocurrencias que se superponen con [desde, hasta), sin las excepciones.
+
+    Devuelve como mucho MAX_OCURRENCIAS_VENTANA por llamada, aunque la ventana sea más grande.
+    """
+    regla_rrule = _rrule(regla, dtstart)
+    excluidas = set(excepciones or ())
+    devueltas = 0
+    # Una ocurrencia que empezó antes de `desde` puede seguir en curso
+    for inicio in regla_rrule.xafter(desde - duracion, inc=True):
+        if inicio >= hasta or devueltas >= MAX_OCURRENCIAS_VENTANA:
+            return
+        if inicio + duracion > desde and clave_ocurrencia(inicio) not in excluidas:
+            devueltas += 1
+            yield inicio
+
+
+def es_ocurrencia(regla, dtstart, inicio):
+    regla_rrule = _rrule(regla, dtstart)
+    return regla_rrule.after(inicio - timedelta(seconds=1)) == inicio
+
+
+def dividir_regla(regla, dtstart, corte):
+    """Divide la serie en `corte` (inicio de una ocurrencia).
+
+    Devuelve (regla hasta antes del corte, regla desde el corte). Si la regla original tenía COUNT,
+    se reparte entre las dos partes.
+    """
+    partes = partes_regla(regla)
+    # Ocurrencias anteriores al corte (el corte mismo es una ocurrencia)
+    anteriores = len(_rrule(regla, dtstart).between(dtstart, corte, inc=True)) - 1
+    previa = {k: v for k, v in partes.items() if k not in ('COUNT', 'UNTIL')}
+    previa['UNTIL'] = (corte - timedelta(seconds=1)).strftime('%Y%m%dT%H%M%S')
+    siguiente = dict(partes)
+    if 'COUNT' in partes:
+        siguiente['COUNT'] = str(int(partes['COUNT']) - anteriores)
+    return armar_regla(previa), armar_regla(siguiente)
+
+
+def desplazar_regla(regla, delta):
+    """Corre UNTIL junto con la serie cuando se cambia el horario de todas las ocurrencias."""
+    partes = partes_regla(regla)
+    if 'UNTIL' in partes and delta:
+        partes['UNTIL'] = (datetime.strptime(partes['UNTIL'], '%Y%m%dT%H%M%S') + delta).strftime('%Y%m%dT%H%M%S')
+    return armar_regla(partes)
+
+
+def clave_ocurrencia(inicio):
+    return inicio.isoformat(timespec='minutes')
+
+
+def a_hora_local(fecha, zona):
+    """Datetime (con o sin zona) -> hora local sin zona, la forma en que trabaja este módulo."""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(zona)
+    return fecha.replace(tzinfo=None, microsecond=0)
+
+
+def desde_hora_local(fecha, zona):
+    return fecha.replace(tzinfo=zona)
+
+
+def parsear_ocurrencia(valor, zona):
+    """Clave de ocurrencia ('2026-11-02T10:00', con o sin zona) -> hora local sin zona."""
+    try:
+        return a_hora_local(datetime.fromisoformat(valor), zona).replace(second=0)
+    except (TypeError, ValueError):
+        return None
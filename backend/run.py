@@ -1,6 +1,14 @@
-from app import app
+from app import create_app
+from change_feed import FeedServer
+from uploads_gc import iniciar_limpieza_periodica
+from archivo import iniciar_archivo_periodico
 from waitress import serve
 
 if __name__ == '__main__':
+    app = create_app()
+    FeedServer(app).start(app.config['FEED_HOST'], app.config['FEED_PORT'])
+    iniciar_limpieza_periodica(app)
+    iniciar_archivo_periodico(app)
+    print(f"Feed de cambios (SSE) en http://{app.config['FEED_HOST']}:{app.config['FEED_PORT']}/cambios")
     print("Iniciando servidor de producción en http://127.0.0.1:5000")
-    serve(app, host='127.0.0.1', port=5000)
\ No newline at end of file
+    serve(app, host='127.0.0.1', port=5000, threads=app.config['WAITRESS_HILOS'])
\ No newline at end of file
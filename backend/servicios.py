@@ -0,0 +1,41 @@
+import threading
+
+from flask import current_app
+
+
+# --- Subsistemas que se cargan recién en el primer uso ---
+# Flask-Mail y requests tardan en importarse y la mayoría de los pedidos no los usan (solo registro,
+# recuperación de contraseña, resumen por correo y los GIFs de cumpleaños). Se importan y configuran
+# la primera vez que hacen falta, así los workers, las pruebas y los benchmarks arrancan más rápido.
+
+_lock = threading.Lock()
+_sesion_http = None
+
+
+def mail():
+    """Estado de Flask-Mail de la app actual (tiene send() y connect())."""
+    app = current_app._get_current_object()
+    if 'mail' not in app.extensions:
+        with _lock:
+            if 'mail' not in app.extensions:
+                from flask_mail import Mail
+                Mail(app)
+    return app.extensions['mail']
+
+
+def mensaje(*args, **kwargs):
+    # Message toma el remitente por defecto del estado de Flask-Mail: tiene que estar inicializado
+    mail()
+    from flask_mail import Message
+    return Message(*args, **kwargs)
+
+
+def http():
+    """Sesión de requests compartida: reutiliza las conexiones HTTPS a las APIs externas."""
+    global _sesion_http
+    if _sesion_http is None:
+        with _lock:
+            if _sesion_http is None:
+                import requests
+                _sesion_http = requests.Session()
+    return _sesion_http
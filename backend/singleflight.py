@@ -0,0 +1,70 @@
+import hashlib
+import threading
+
+from sqlalchemy import text
+
+
+# --- Una sola ejecución para trabajo idéntico en curso ---
+# Si varios hilos piden a la vez el mismo resultado (misma clave), solo el primero lo calcula; los
+# demás esperan y reciben ese mismo resultado (o la misma excepción). Cuando termina, la clave se
+# libera: no es un cache, la próxima llamada vuelve a calcular.
+#
+# Entre procesos (varios workers) se usa bloqueo_db(): un advisory lock de PostgreSQL que dura
+# hasta el commit o rollback de la transacción actual.
+
+class _Llamada:
+    __slots__ = ('listo', 'resultado', 'error')
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}
+
+    def hacer(self, clave, funcion):
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_curso[clave] = _Llamada()
+        if not lider:
+            llamada.listo.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+        try:
+            llamada.resultado = funcion()
+            return llamada.resultado
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            llamada.listo.set()
+
+    def en_curso(self):
+        with self._lock:
+            return len(self._en_curso)
+
+
+def clave_bloqueo(*partes):
+    """Entero de 64 bits con signo estable para una clave (pg_advisory_* recibe un bigint)."""
+    resumen = hashlib.blake2b(repr(partes).encode(), digest_size=8).digest()
+    return int.from_bytes(resumen, 'big', signed=True)
+
+
+def bloqueo_db(conexion, *partes):
+    """Espera el advisory lock de la clave dentro de la transacción de `conexion` (sesión o Connection).
+
+    Se libera solo con el commit / rollback. En SQLite no hace nada: las escrituras ya se serializan
+    y la restricción única es la que evita el duplicado.
+    """
+    motor = conexion.get_bind() if hasattr(conexion, 'get_bind') else conexion
+    if motor.dialect.name == 'postgresql':
+        conexion.execute(text('SELECT pg_advisory_xact_lock(:clave)'), {'clave': clave_bloqueo(*partes)})
@@ -0,0 +1,104 @@
+import os
+import sys
+import socketserver
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, User, UserRole  # noqa: E402
+
+
+# --- Servidor SMTP de prueba ---
+# Lo mínimo del protocolo para smtplib / Flask-Mail: guarda cada mensaje recibido y rechaza (550)
+# los destinatarios que estén en `rechazar`.
+
+class _SesionSMTP(socketserver.StreamRequestHandler):
+    def _responder(self, linea):
+        self.wfile.write((linea + '\r\n').encode())
+
+    def handle(self):
+        servidor = self.server
+        self._responder('220 smtp de prueba')
+        destinatarios = []
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            comando = linea.decode(errors='replace').strip()
+            verbo = comando.split(' ', 1)[0].split(':', 1)[0].upper()
+            if verbo in ('EHLO', 'HELO'):
+                self._responder('250 smtp de prueba')
+            elif verbo == 'MAIL':
+                destinatarios = []
+                self._responder('250 OK')
+            elif verbo == 'RCPT':
+                direccion = comando.split(':', 1)[1].strip().lstrip('<').split('>', 1)[0]
+                if direccion in servidor.rechazar:
+                    self._responder('550 destinatario rechazado')
+                else:
+                    destinatarios.append(direccion)
+                    self._responder('250 OK')
+            elif verbo == 'DATA':
+                self._responder('354 terminar con .')
+                datos = []
+                for linea in iter(self.rfile.readline, b''):
+                    if linea in (b'.\r\n', b'.\n'):
+                        break
+                    datos.append(linea[1:] if linea.startswith(b'..') else linea)
+                with servidor.lock:
+                    servidor.mensajes.append((list(destinatarios), b''.join(datos)))
+                self._responder('250 OK')
+            elif verbo == 'QUIT':
+                self._responder('221 chau')
+                return
+            else:
+                self._responder('250 OK')
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SesionSMTP)
+        self.lock = threading.Lock()
+        self.mensajes = []
+        self.rechazar = set()
+
+    def destinatarios(self):
+        with self.lock:
+            return [d for destinatarios, _ in self.mensajes for d in destinatarios]
+
+    def limpiar(self):
+        with self.lock:
+            self.mensajes.clear()
+
+
+@pytest.fixture
+def smtp():
+    servidor = ServidorSMTP()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def crear_app(tmp_path):
+    """Crea apps con el perfil 'test' sobre un archivo SQLite propio de la prueba."""
+    def crear(**ajustes):
+        ajustes.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + str(tmp_path / 'primario.db'))
+        return create_app('test', **ajustes)
+    return crear
+
+
+def crear_usuario(username, role=UserRole.VIEWER, **datos):
+    user = User(username=username, password=datos.pop('password', 'sin-hash'), is_verified=True, role=role,
+                nombre=datos.pop('nombre', username.split('@')[0]), sector=datos.pop('sector', 'Ventas'),
+                sucursal=datos.pop('sucursal', 'Centro'), **datos)
+    db.session.add(user)
+    db.session.commit()
+    return user
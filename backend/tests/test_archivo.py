@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+import archivo
+import app as modulo_app
+from archivo import archivar
+from change_feed import ChangeFeed
+from models import db, Novedad
+from conftest import crear_usuario
+
+
+def test_el_servidor_se_entera_de_lo_archivado_por_otro_proceso(crear_app, monkeypatch):
+    modulo_app.cache_respuestas.invalidar()
+    app = crear_app(CAMBIOS_EXTERNOS_SEGUNDOS=0)
+    with app.app_context():
+        autor = crear_usuario('autor@juliatours.com.ar')
+        db.session.add_all([Novedad(asunto='Vieja', content='<p>x</p>', user_id=autor.id, created_at=datetime.now(timezone.utc) - timedelta(days=400)),
+                            Novedad(asunto='Nueva', content='<p>x</p>', user_id=autor.id)])
+        db.session.commit()
+        headers = {'x-access-token': jwt.encode({'id': autor.id, 'role': autor.role.name}, app.config['SECRET_KEY'], algorithm='HS256')}
+    cliente = app.test_client()
+
+    def asuntos():
+        return sorted(n['asunto'] for n in cliente.get('/novedades', headers=headers).get_json()['novedades'])
+
+    assert asuntos() == ['Nueva', 'Vieja']
+
+    # `flask archivar` corre en otro proceso: su feed no es el del servidor
+    monkeypatch.setattr(archivo, 'feed', ChangeFeed())
+    with app.app_context():
+        assert archivar(app, solo=['novedad']) == {'novedad': 1}
+
+    assert asuntos() == ['Nueva']
@@ -0,0 +1,51 @@
+from datetime import date
+
+import jwt
+import pytest
+
+from models import db, AuditLog, Attachment, Guardia, Post, UserRole
+from conftest import crear_usuario
+
+
+@pytest.fixture
+def app(crear_app):
+    app = crear_app()
+    with app.app_context():
+        admin = crear_usuario('admin@juliatours.com.ar', role=UserRole.SUPERUSER)
+        app.config['HEADERS_ADMIN'] = {'x-access-token': jwt.encode({'id': admin.id, 'role': admin.role.name}, app.config['SECRET_KEY'], algorithm='HS256')}
+    return app
+
+
+def registros(app, entidad):
+    with app.app_context():
+        app.extensions['auditoria'].vaciar()
+        return [(r.entidad_id, r.accion, r.cambios) for r in AuditLog.query.filter_by(entidad=entidad).order_by(AuditLog.id)]
+
+
+def test_borrado_en_bloque_de_guardias(app):
+    with app.app_context():
+        ana, beto = crear_usuario('ana@juliatours.com.ar'), crear_usuario('beto@juliatours.com.ar')
+        guardias = [Guardia(fecha=date(2030, 1, 1), user_id=ana.id), Guardia(fecha=date(2030, 1, 2), user_id=beto.id, reemplaza_id=ana.id)]
+        db.session.add_all(guardias)
+        db.session.commit()
+        ids, ana_id = sorted(str(g.id) for g in guardias), ana.id
+    assert app.test_client().delete(f'/admin/users/{ana_id}', headers=app.config['HEADERS_ADMIN']).status_code == 200
+
+    borrados = [r for r in registros(app, 'guardia') if r[1] == 'borrado']
+    assert sorted(entidad_id for entidad_id, _, _ in borrados) == ids
+    assert ('borrado', str(ana_id)) in [(accion, entidad_id) for entidad_id, accion, _ in registros(app, 'usuario')]
+
+
+def test_adjuntos_sincronizados_en_bloque(app):
+    with app.app_context():
+        post = Post(sector='Ventas', title='t', content='', user_id=1, attachments=[Attachment(original_filename='viejo.pdf', saved_filename='viejo.pdf', mimetype='application/pdf')])
+        db.session.add(post)
+        db.session.commit()
+        post_id, viejo_id = post.id, post.attachments[0].id
+    respuesta = app.test_client().put(f'/informacion/post/{post_id}', json={'attachments': [{'url': '/uploads/nuevo.pdf', 'name': 'nuevo.pdf'}]}, headers=app.config['HEADERS_ADMIN'])
+    assert respuesta.status_code == 200
+
+    adjuntos = registros(app, 'adjunto')
+    assert (str(viejo_id), 'borrado', None) in adjuntos
+    creado = [cambios for _, accion, cambios in adjuntos if accion == 'creado' and cambios['saved_filename'] == 'nuevo.pdf']
+    assert creado and creado[0]['post_id'] == post_id
@@ -0,0 +1,21 @@
+import time
+
+from conftest import crear_usuario
+
+
+def test_last_modified_vence_con_el_etag(crear_app):
+    app = crear_app(CALENDARIO_TTL=1)
+    with app.app_context():
+        crear_usuario('ana@juliatours.com.ar', calendar_token='token-ana')
+    cliente = app.test_client()
+
+    primera = cliente.get('/calendario/token-ana/reuniones.ics')
+    assert primera.status_code == 200
+    ultima_modificacion = primera.headers['Last-Modified']
+
+    # Pasado el TTL el ETag cambia; Last-Modified también, aunque el feed no haya registrado cambios
+    time.sleep(1.1)
+    segunda = cliente.get('/calendario/token-ana/reuniones.ics', headers={'If-Modified-Since': ultima_modificacion})
+    assert segunda.status_code == 200
+    assert segunda.headers['ETag'] != primera.headers['ETag']
+    assert segunda.headers['Last-Modified'] != ultima_modificacion
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import jwt
+import pytest
+
+import app as modulo_app
+from models import db, CumpleGif
+from conftest import crear_usuario
+
+
+@pytest.fixture
+def cliente(crear_app, monkeypatch):
+    monkeypatch.setattr(modulo_app, '_giphy_caido_hasta', 0.0)
+    # El cache y el feed son del proceso: sin esto se vería la lista de la prueba anterior
+    modulo_app.cache_respuestas.invalidar()
+    app = crear_app()
+    with app.app_context():
+        ana = crear_usuario('ana@juliatours.com.ar', fecha_nacimiento=datetime.now().date().replace(year=1990))
+        token = jwt.encode({'id': ana.id, 'role': ana.role.name}, app.config['SECRET_KEY'], algorithm='HS256')
+    cliente = app.test_client()
+    cliente.environ_base['HTTP_X_ACCESS_TOKEN'] = token
+    cliente.application = app
+    return cliente
+
+
+def gif_de_ana(cliente):
+    respuesta = cliente.get('/cumpleanos')
+    assert respuesta.status_code == 200
+    [ana] = respuesta.get_json()
+    return ana['gif_url']
+
+
+def test_falla_de_giphy_no_queda_en_el_cache(cliente, monkeypatch):
+    llamadas = []
+
+    def giphy_caido():
+        llamadas.append(1)
+        raise ConnectionError('sin red')
+    monkeypatch.setattr(modulo_app, '_gif_aleatorio', giphy_caido)
+    assert gif_de_ana(cliente) is None
+    # Mientras dura GIPHY_REINTENTO no se lo vuelve a llamar, pero la lista tampoco se guarda
+    assert gif_de_ana(cliente) is None
+    assert len(llamadas) == 1
+
+    monkeypatch.setattr(modulo_app, '_giphy_caido_hasta', 0.0)
+    monkeypatch.setattr(modulo_app, '_gif_aleatorio', lambda: 'https://media.giphy.com/feliz.gif')
+    assert gif_de_ana(cliente) == 'https://media.giphy.com/feliz.gif'
+    with cliente.application.app_context():
+        assert [g.gif_url for g in CumpleGif.query.all()] == ['https://media.giphy.com/feliz.gif']
+
+
+def test_gif_ya_guardado_por_otro_proceso_se_reutiliza(cliente, monkeypatch):
+    # Otro worker lo guardó entre la lectura del pedido y la llamada a Giphy
+    monkeypatch.setattr(modulo_app, '_gif_aleatorio', lambda: guardar_y_devolver(cliente.application))
+    assert gif_de_ana(cliente) == 'https://media.giphy.com/del-otro.gif'
+    with cliente.application.app_context():
+        assert CumpleGif.query.count() == 1
+
+
+def test_gif_guardado_antes_de_asignar_no_llama_a_giphy(cliente, monkeypatch):
+    # Otro worker lo guardó después de que este pedido leyó los GIFs de hoy
+    llamadas = []
+    monkeypatch.setattr(modulo_app, '_gif_aleatorio', lambda: llamadas.append(1) or 'https://media.giphy.com/propio.gif')
+    with cliente.application.app_context():
+        guardar_y_devolver(cliente.application)
+        assert modulo_app._asignar_gif(1, datetime.now().date()) == 'https://media.giphy.com/del-otro.gif'
+    assert llamadas == []
+
+
+def guardar_y_devolver(app):
+    with app.app_context():
+        db.session.add(CumpleGif(user_id=1, fecha=datetime.now().date(), gif_url='https://media.giphy.com/del-otro.gif'))
+        db.session.commit()
+    return 'https://media.giphy.com/propio.gif'
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+import jwt
+
+import app as modulo_app
+from conftest import crear_usuario
+
+
+def test_dashboard_trae_lo_mismo_que_cada_vista(crear_app, monkeypatch):
+    # Novedades, Cumpleaños y Eventos se cargan de /dashboard: tiene que coincidir con sus endpoints
+    monkeypatch.setattr(modulo_app, '_gif_aleatorio', lambda: 'https://media.giphy.com/feliz.gif')
+    monkeypatch.setattr(modulo_app, '_giphy_caido_hasta', 0.0)
+    modulo_app.cache_respuestas.invalidar()
+    app = crear_app()
+    hoy = datetime.now().date()
+    with app.app_context():
+        ana = crear_usuario('ana@juliatours.com.ar', fecha_nacimiento=hoy.replace(year=1990))
+        crear_usuario('beto@juliatours.com.ar', fecha_nacimiento=(hoy + timedelta(days=3)).replace(year=1985))
+        token = jwt.encode({'id': ana.id, 'role': ana.role.name}, app.config['SECRET_KEY'], algorithm='HS256')
+    cliente = app.test_client()
+    cliente.environ_base['HTTP_X_ACCESS_TOKEN'] = token
+
+    dashboard = cliente.get('/dashboard').get_json()
+    assert dashboard['novedades'] == cliente.get('/novedades').get_json()
+    assert dashboard['eventos'] == cliente.get('/eventos').get_json()
+    assert dashboard['cumpleanos']['hoy'] == cliente.get('/cumpleanos').get_json()
+    [beto] = dashboard['cumpleanos']['proximos']
+    assert beto['fecha'] == (hoy + timedelta(days=3)).isoformat()
@@ -0,0 +1,116 @@
+import email
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+from digest import enviar_digest
+from models import db, DigestEnvio, Novedad
+from servicios import mail
+from conftest import crear_usuario
+
+
+@pytest.fixture
+def app(crear_app, smtp):
+    app = crear_app(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp.server_address[1], MAIL_USE_SSL=False, MAIL_USE_TLS=False,
+                    MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_SUPPRESS_SEND=False,
+                    DIGEST_CONEXIONES_SMTP=1, DIGEST_INTERVALO_ENVIO=0)
+    with app.app_context():
+        autor = crear_usuario('autor@juliatours.com.ar')
+        crear_usuario('ana@juliatours.com.ar')
+        crear_usuario('beto@juliatours.com.ar')
+        db.session.add_all([Novedad(asunto=f'Novedad {i}', content='<p>texto</p>', user_id=autor.id) for i in range(2)])
+        db.session.commit()
+    return app
+
+
+def correr(app):
+    with app.app_context():
+        return enviar_digest(app, mail())
+
+
+def cuerpos_html(smtp, destinatario):
+    """HTML de los correos que recibió `destinatario`."""
+    cuerpos = []
+    for destinatarios, datos in smtp.mensajes:
+        if destinatario in destinatarios:
+            mensaje = email.message_from_bytes(datos)
+            cuerpos += [parte.get_payload(decode=True).decode() for parte in mensaje.walk() if parte.get_content_type() == 'text/html']
+    return cuerpos
+
+
+def test_guarda_punto_de_control_y_no_reenvia(app, smtp):
+    enviados, errores = correr(app)
+    assert enviados == 3 and errores == []
+    assert sorted(smtp.destinatarios()) == ['ana@juliatours.com.ar', 'autor@juliatours.com.ar', 'beto@juliatours.com.ar']
+    with app.app_context():
+        ultima = db.session.query(db.func.max(Novedad.id)).scalar()
+        assert {c.ultima_novedad_id for c in DigestEnvio.query.all()} == {ultima}
+
+    smtp.limpiar()
+    assert correr(app) == (0, [])
+    assert smtp.mensajes == []
+
+
+def test_despues_de_un_corte_solo_se_envia_lo_pendiente(app, smtp):
+    # El envío a beto falla (como si el proceso se cortara antes de llegar a él)
+    smtp.rechazar.add('beto@juliatours.com.ar')
+    enviados, errores = correr(app)
+    assert enviados == 2 and [e['user_id'] for e in errores] == [3]
+    with app.app_context():
+        assert db.session.get(DigestEnvio, 3) is None
+
+    smtp.limpiar()
+    smtp.rechazar.clear()
+    assert correr(app) == (1, [])
+    assert smtp.destinatarios() == ['beto@juliatours.com.ar']
+
+
+def test_fila_insertada_durante_el_armado_no_se_pierde(app, smtp):
+    with app.app_context():
+        correr(app)
+        smtp.limpiar()
+        db.session.add(Novedad(asunto='Antes del corte', content='<p>x</p>', user_id=1))
+        db.session.commit()
+
+        # Una novedad nueva entra justo cuando el resumen consulta las novedades
+        insertada = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def insertar_en_el_medio(conn, cursor, statement, parameters, context, executemany):
+            if not insertada and statement.lstrip().upper().startswith('SELECT') and 'FROM novedad' in statement and 'max(' not in statement:
+                insertada.append(True)
+                # Desde otra conexión, como lo haría otro worker
+                with sqlite3.connect(db.engine.url.database) as otra:
+                    otra.execute("INSERT INTO novedad (asunto, content, user_id) VALUES ('Durante el armado', '<p>x</p>', 1)")
+
+        try:
+            assert correr(app)[0] == 3
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', insertar_en_el_medio)
+        assert insertada
+        assert not any('Durante el armado' in cuerpo for cuerpo in cuerpos_html(smtp, 'ana@juliatours.com.ar'))
+
+        smtp.limpiar()
+        assert correr(app)[0] == 3
+        assert any('Durante el armado' in cuerpo for cuerpo in cuerpos_html(smtp, 'ana@juliatours.com.ar'))
+
+
+def test_fila_confirmada_despues_de_una_con_id_mas_alto_se_envia(app, smtp):
+    with app.app_context():
+        # En PostgreSQL el id se asigna al insertar: la 5 se confirma antes que la 4
+        db.session.add(Novedad(id=5, asunto='Confirmada primero', content='<p>x</p>', user_id=1))
+        db.session.commit()
+        assert correr(app)[0] == 3
+        smtp.limpiar()
+
+        db.session.add(Novedad(id=4, asunto='Confirmada tarde', content='<p>x</p>', user_id=1))
+        db.session.commit()
+        assert correr(app)[0] == 3
+        [cuerpo] = cuerpos_html(smtp, 'ana@juliatours.com.ar')
+        assert 'Confirmada tarde' in cuerpo
+        assert 'Confirmada primero' not in cuerpo and 'Novedad 0' not in cuerpo
+        assert {c.ultima_novedad_id for c in DigestEnvio.query.all()} == {5}
+
+        smtp.limpiar()
+        assert correr(app) == (0, [])
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+import models
+from models import db, Reunion, UserRole
+from conftest import crear_usuario
+
+
+def test_actualizar_db_falla_y_lista_las_reservas_superpuestas(crear_app, monkeypatch):
+    app = crear_app()
+    inicio = datetime(2030, 3, 4, 10, tzinfo=timezone.utc)
+    with app.app_context():
+        admin = crear_usuario('admin@juliatours.com.ar', role=UserRole.SUPERUSER)
+        reuniones = [Reunion(tema='a', ubicacion='1A', start_time=inicio, end_time=inicio + timedelta(hours=1), user_id=admin.id),
+                     Reunion(tema='b', ubicacion='1A', start_time=inicio + timedelta(minutes=30), end_time=inicio + timedelta(hours=2), user_id=admin.id),
+                     # Pegada a la anterior y en otra sala: no chocan
+                     Reunion(tema='c', ubicacion='1A', start_time=inicio + timedelta(hours=2), end_time=inicio + timedelta(hours=3), user_id=admin.id),
+                     Reunion(tema='d', ubicacion='2B', start_time=inicio, end_time=inicio + timedelta(hours=1), user_id=admin.id)]
+        db.session.add_all(reuniones)
+        db.session.commit()
+        a, b = reuniones[0].id, reuniones[1].id
+        token = jwt.encode({'id': admin.id, 'role': admin.role.name}, app.config['SECRET_KEY'], algorithm='HS256')
+
+    def postgres_rechaza():
+        raise RuntimeError('could not create exclusion constraint "reunion_sala_sin_superposicion"\nDETAIL: ...')
+    monkeypatch.setattr(models, '_crear_restriccion_salas', postgres_rechaza)
+
+    resultado = app.test_cli_runner().invoke(args=['actualizar-db'])
+    assert resultado.exit_code == 1
+    assert f'reunión {a} ' in resultado.output and f'con {b} ' in resultado.output
+    assert 'Esquema actualizado.' not in resultado.output
+
+    reporte = app.test_client().get('/admin/db/esquema', headers={'x-access-token': token}).get_json()
+    assert [[r['id'] for r in c['reuniones']] for c in reporte['reuniones_superpuestas']] == [[a, b]]
@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import formularios
+from formularios import EsquemaInvalido, MAX_LENGTH_TEXTO, normalizar_esquema, validador_para
+from models import db, Evento, Inscripcion
+from conftest import crear_usuario
+
+
+@pytest.fixture(autouse=True)
+def sin_compilados():
+    # El cache es del proceso y la clave es (evento.id, form_version): cada prueba tiene su base
+    formularios._compilados.clear()
+    yield
+    formularios._compilados.clear()
+
+
+def test_required_por_defecto_y_reglas_por_tipo():
+    form = normalizar_esquema([
+        {'id': 'menu', 'type': 'select', 'label': ' Menú ', 'options': ['Carne', '', 'Vegetariano', 'Carne']},
+        {'id': 'traslado', 'type': 'checkbox', 'label': 'Traslado'},
+        {'id': 'comentario', 'type': 'text', 'label': 'Comentario'},
+        {'id': 'edad', 'type': 'number', 'label': 'Edad', 'min': '18', 'max': 99, 'required': True},
+    ])
+    assert form == [
+        {'id': 'menu', 'type': 'select', 'label': 'Menú', 'required': True, 'options': ['Carne', 'Vegetariano']},
+        {'id': 'traslado', 'type': 'checkbox', 'label': 'Traslado', 'required': False},
+        {'id': 'comentario', 'type': 'text', 'label': 'Comentario', 'required': False, 'max_length': MAX_LENGTH_TEXTO},
+        {'id': 'edad', 'type': 'number', 'label': 'Edad', 'required': True, 'min': 18.0, 'max': 99.0},
+    ]
+    assert normalizar_esquema(None) == [] and normalizar_esquema('') == []
+
+
+@pytest.mark.parametrize('campo', [
+    {'id': 'q', 'type': 'select', 'label': 'Menú', 'options': ['', ' ']},
+    {'id': 'q', 'type': 'text', 'label': 'Texto', 'max_length': -1},
+    {'id': 'q', 'type': 'text', 'label': 'Texto', 'max_length': 'mucho'},
+    {'id': 'q', 'type': 'fecha', 'label': 'Fecha'},
+    {'id': 'q', 'type': 'text', 'label': ' '},
+    {'type': 'text', 'label': 'Sin id'},
+    'no es un objeto',
+])
+def test_pregunta_invalida(campo):
+    with pytest.raises(EsquemaInvalido):
+        normalizar_esquema([campo])
+    assert normalizar_esquema([campo, {'id': 'ok', 'type': 'checkbox', 'label': 'Ok'}], estricto=False) == [
+        {'id': 'ok', 'type': 'checkbox', 'label': 'Ok', 'required': False}]
+
+
+def test_limite_numerico_invalido():
+    campo = {'id': 'q', 'type': 'number', 'label': 'Número', 'min': 'cero', 'max': 10}
+    with pytest.raises(EsquemaInvalido) as error:
+        normalizar_esquema([campo])
+    assert error.value.errores == ['Pregunta 1: min debe ser un número']
+    # En un formulario viejo la pregunta se conserva, sin el límite que no se entiende
+    assert normalizar_esquema([campo], estricto=False) == [{'id': 'q', 'type': 'number', 'label': 'Número', 'required': False, 'max': 10.0}]
+
+
+def test_ids_repetidos_y_formulario_que_no_es_lista():
+    with pytest.raises(EsquemaInvalido) as error:
+        normalizar_esquema([{'id': 'q', 'type': 'checkbox', 'label': 'A'}, {'id': 'q', 'type': 'checkbox', 'label': 'B'}])
+    assert error.value.errores == ['Pregunta 2: falta el id o está repetido']
+    with pytest.raises(EsquemaInvalido):
+        normalizar_esquema({'id': 'q'})
+    assert normalizar_esquema({'id': 'q'}, estricto=False) == []
+
+
+def test_numeros_se_convierten_y_se_acotan():
+    evento = SimpleNamespace(id=1, form_version=0, form_dinamico=[{'id': 'edad', 'type': 'number', 'label': 'Edad', 'min': 18, 'max': 99}])
+    validador = validador_para(evento)
+    assert validador.validar({'edad': '30'}) == ({'edad': 30}, {})
+    assert validador.validar({'edad': 30.5}) == ({'edad': 30.5}, {})
+    assert validador.validar({'edad': ''}) == ({}, {})
+    assert validador.validar({'edad': 17}) == ({}, {'edad': 'El mínimo es 18'})
+    assert validador.validar({'edad': True}) == ({}, {'edad': 'Debe ser un número'})
+    assert validador.validar({'edad': 'treinta'}) == ({}, {'edad': 'Debe ser un número'})
+
+
+def test_se_recompila_solo_al_cambiar_la_version():
+    evento = SimpleNamespace(id=1, form_version=1, form_dinamico=[{'id': 'menu', 'type': 'select', 'label': 'Menú', 'options': ['Carne']}])
+    primero = validador_para(evento)
+    # Sin cambio de versión se reutiliza lo compilado, aunque el objeto traiga otro formulario
+    evento.form_dinamico = [{'id': 'menu', 'type': 'select', 'label': 'Menú', 'options': ['Pescado']}]
+    assert validador_para(evento) is primero
+    assert primero.validar({'menu': 'Pescado'})[1] == {'menu': 'La opción elegida no es válida'}
+
+    evento.form_version = 2
+    segundo = validador_para(evento)
+    assert segundo is not primero
+    assert segundo.validar({'menu': 'Pescado'}) == ({'menu': 'Pescado'}, {})
+
+
+def test_revalidar_inscripciones_limpiar(crear_app):
+    app = crear_app()
+    with app.app_context():
+        ana, beto = crear_usuario('ana@juliatours.com.ar'), crear_usuario('beto@juliatours.com.ar')
+        evento = Evento(titulo='Fiesta', fecha_hora=datetime(2030, 12, 20, 21, tzinfo=timezone.utc), ubicacion_evento='Julia Tours', user_id=ana.id, form_version=1,
+                        form_dinamico=[{'id': 'menu', 'type': 'select', 'label': 'Menú', 'options': ['Carne', 'Vegetariano']},
+                                       {'id': 'acompanantes', 'type': 'number', 'label': 'Acompañantes', 'min': 0}])
+        db.session.add(evento)
+        db.session.flush()
+        valida = Inscripcion(user_id=ana.id, evento_id=evento.id, participa=True, respuestas_dinamicas={'menu': 'Carne', 'acompanantes': '2', 'vieja': 'x'})
+        invalida = Inscripcion(user_id=beto.id, evento_id=evento.id, participa=True, respuestas_dinamicas={'menu': 'Pescado'})
+        db.session.add_all([valida, invalida])
+        db.session.commit()
+        ids = valida.id, invalida.id
+
+    runner = app.test_cli_runner()
+    resultado = runner.invoke(args=['revalidar-inscripciones'])
+    assert 'Inscripciones revisadas: 2, con errores: 1, normalizadas: 0' in resultado.output
+    with app.app_context():
+        assert db.session.get(Inscripcion, ids[0]).respuestas_dinamicas['acompanantes'] == '2'
+
+    resultado = runner.invoke(args=['revalidar-inscripciones', '--limpiar'])
+    assert f'inscripción {ids[1]} ' in resultado.output
+    assert 'Inscripciones revisadas: 2, con errores: 1, normalizadas: 1' in resultado.output
+    with app.app_context():
+        assert db.session.get(Inscripcion, ids[0]).respuestas_dinamicas == {'menu': 'Carne', 'acompanantes': 2}
+        # La inválida no se toca: hay que corregirla a mano
+        assert db.session.get(Inscripcion, ids[1]).respuestas_dinamicas == {'menu': 'Pescado'}
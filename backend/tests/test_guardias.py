@@ -0,0 +1,42 @@
+import jwt
+import pytest
+
+from models import UserRole
+from conftest import crear_usuario
+
+
+@pytest.fixture
+def cliente(crear_app):
+    app = crear_app()
+    with app.app_context():
+        admin = crear_usuario('admin@juliatours.com.ar', role=UserRole.SUPERUSER)
+        crear_usuario('ana@juliatours.com.ar', guardia_nro=1)
+        token = jwt.encode({'id': admin.id, 'role': admin.role.name}, app.config['SECRET_KEY'], algorithm='HS256')
+    cliente = app.test_client()
+    cliente.environ_base['HTTP_X_ACCESS_TOKEN'] = token
+    return cliente
+
+
+@pytest.mark.parametrize('datos', [
+    {'fecha': '2030-01-01', 'user_id': [1]},
+    {'fecha': '2030-01-01', 'user_id': 1, 'reemplaza_id': {'id': 2}},
+    {'fecha': '2030-01-01', 'user_id': '1'},
+    {'fecha': '2030-01-01', 'user_id': True},
+    {'fecha': 20300101, 'user_id': 1},
+])
+def test_alta_con_datos_de_otro_tipo_responde_400(cliente, datos):
+    assert cliente.post('/guardias/cambios', json=datos).status_code == 400
+
+
+def test_alta_con_cuerpo_que_no_es_objeto_responde_400(cliente):
+    assert cliente.post('/guardias/cambios', json=[1, 2]).status_code == 400
+
+
+@pytest.mark.parametrize('filtro', [{'desde': 'ayer'}, {'hasta': '2030-13-01'}, {'desde': '2030-01-01', 'hasta': '01/02/2030'}])
+def test_listado_con_fechas_invalidas_responde_400(cliente, filtro):
+    assert cliente.get('/guardias/cambios', query_string=filtro).status_code == 400
+
+
+def test_listado_filtra_por_fechas(cliente):
+    respuesta = cliente.get('/guardias/cambios', query_string={'desde': '2030-01-01', 'hasta': '2030-01-31'})
+    assert respuesta.status_code == 200 and respuesta.get_json() == []
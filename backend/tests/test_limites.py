@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from app import bcrypt
+from limites import AlmacenMemoria, AlmacenSQLite, CupoConcurrencia, Saturado
+from conftest import crear_usuario
+
+
+@pytest.fixture(params=['memoria', 'sqlite'])
+def almacen(request, tmp_path):
+    return AlmacenMemoria() if request.param == 'memoria' else AlmacenSQLite(str(tmp_path / 'limites.db'))
+
+
+def test_pedido_rechazado_no_gasta_las_otras_cubetas(almacen):
+    assert almacen.tomar([('ip', 1, 60), ('usuario', 2, 60)]) == 0
+    # La IP ya no tiene fichas: los rechazos no tocan la cubeta del usuario
+    for _ in range(5):
+        assert almacen.tomar([('ip', 1, 60), ('usuario', 2, 60)]) > 0
+    assert almacen.tomar([('usuario', 2, 60)]) == 0
+    assert almacen.tomar([('usuario', 2, 60)]) > 0
+
+
+@pytest.fixture
+def app(crear_app):
+    app = crear_app(LIMITES_ACTIVOS=True, LIMITES_RUTAS={'login': [('ip', 3, 60), ('usuario', 2, 300)]})
+    with app.app_context():
+        crear_usuario('ana@juliatours.com.ar', password=bcrypt.generate_password_hash('Clave1234', 4).decode('utf-8'))
+    return app
+
+
+def login(cliente, ip, password='mala'):
+    return cliente.post('/login', json={'username': 'ana@juliatours.com.ar', 'password': password}, environ_base={'REMOTE_ADDR': ip})
+
+
+def test_429_con_retry_after(app):
+    cliente = app.test_client()
+    assert [login(cliente, '10.0.0.1').status_code for _ in range(2)] == [401, 401]
+    respuesta = login(cliente, '10.0.0.1')
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers['Retry-After']) >= 1
+    assert app.extensions['limites'].estado()['rechazados'] == {'login': 1}
+
+
+def test_desde_otra_ip_no_se_bloquea_el_login_de_un_companero(app):
+    cliente = app.test_client()
+    for _ in range(10):
+        login(cliente, '10.0.0.66')
+    assert login(cliente, '10.0.0.2', 'Clave1234').status_code == 200
+
+
+def test_cupo_lleno_responde_503(crear_app):
+    app = crear_app(BCRYPT_HILOS=1, BCRYPT_CONCURRENCIA=1, BCRYPT_EN_ESPERA=0, BCRYPT_ESPERA_MAX=0.1)
+    with app.app_context():
+        crear_usuario('ana@juliatours.com.ar', password=bcrypt.generate_password_hash('Clave1234', 4).decode('utf-8'))
+    cupo = app.extensions['contrasenas'].cupo
+    with cupo.usar():
+        respuesta = login(app.test_client(), '10.0.0.1', 'Clave1234')
+    assert respuesta.status_code == 503
+    assert respuesta.headers['Retry-After'] == '1'
+    assert cupo.estado()['rechazados'] == 1
+
+
+def test_cupo_espera_un_lugar_antes_de_rechazar():
+    cupo = CupoConcurrencia(1, espera_max=2)
+    ocupado, liberar = threading.Event(), threading.Event()
+
+    def ocupar():
+        with cupo.usar():
+            ocupado.set()
+            liberar.wait()
+    hilo = threading.Thread(target=ocupar)
+    hilo.start()
+    ocupado.wait()
+    threading.Timer(0.1, liberar.set).start()
+    with cupo.usar():
+        pass
+    hilo.join()
+
+    cupo = CupoConcurrencia(1, espera_max=0.05)
+    with cupo.usar():
+        with pytest.raises(Saturado):
+            with cupo.usar():
+                pass
@@ -0,0 +1,104 @@
+import time
+
+import jwt
+import pytest
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import basedatos
+from app import bcrypt
+from models import db, User, UserRole
+from conftest import crear_usuario
+
+
+@pytest.fixture
+def app(crear_app, tmp_path):
+    basedatos._escrituras.clear()
+    app = crear_app(DATABASE_REPLICA_URL='sqlite:///' + str(tmp_path / 'replica.db'), DB_LECTURA_PRIMARIO_SEGUNDOS=0.5)
+    with app.app_context():
+        password, vieja = (bcrypt.generate_password_hash(p, app.config['BCRYPT_LOG_ROUNDS']).decode('utf-8') for p in ('Clave1234', 'Vieja1234'))
+        crear_usuario('ana@juliatours.com.ar', nombre='Ana (primario)', password=password)
+        crear_usuario('beto@juliatours.com.ar', nombre='Beto (primario)')
+        # La réplica tiene los mismos usuarios con otro nombre y otra contraseña: se nota de dónde se leyó
+        replica = db.engines[basedatos.BIND_REPLICA]
+        db.metadata.create_all(replica)
+        with Session(replica) as sesion:
+            sesion.add_all([User(id=1, username='ana@juliatours.com.ar', password=vieja, is_verified=True, role=UserRole.VIEWER, nombre='Ana (réplica)'),
+                            User(id=2, username='beto@juliatours.com.ar', password='sin-hash', is_verified=True, role=UserRole.VIEWER, nombre='Beto (réplica)')])
+            sesion.commit()
+    yield app
+    basedatos._escrituras.clear()
+
+
+@pytest.fixture
+def consultas_replica(app):
+    """Métodos HTTP de los pedidos que ejecutaron algo en la réplica."""
+    metodos = []
+    with app.app_context():
+        replica = db.engines[basedatos.BIND_REPLICA]
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        metodos.append(request.method if has_request_context() else None)
+
+    event.listen(replica, 'before_cursor_execute', registrar)
+    yield metodos
+    event.remove(replica, 'before_cursor_execute', registrar)
+
+
+def headers(app, user_id):
+    return {'x-access-token': jwt.encode({'id': user_id, 'role': 'VIEWER'}, app.config['SECRET_KEY'], algorithm='HS256')}
+
+
+def nombre(cliente, app, user_id):
+    respuesta = cliente.get('/profile', headers=headers(app, user_id))
+    assert respuesta.status_code == 200
+    return respuesta.get_json()['nombre']
+
+
+def test_get_lee_de_la_replica(app, consultas_replica):
+    cliente = app.test_client()
+    assert nombre(cliente, app, 1) == 'Ana (réplica)'
+    assert consultas_replica and set(consultas_replica) == {'GET'}
+
+
+def test_despues_de_escribir_el_usuario_lee_del_primario(app, consultas_replica):
+    cliente = app.test_client()
+    datos = {'nombre': 'Ana nueva', 'apellido': '', 'interno': '', 'sector': 'Ventas', 'sucursal': 'Centro'}
+    assert cliente.post('/profile', json=datos, headers=headers(app, 1)).status_code == 200
+    assert consultas_replica == []
+    with app.app_context():
+        assert db.session.get(User, 1).nombre == 'Ana nueva'
+
+    # Dentro de la ventana: Ana ve su cambio, Beto sigue leyendo de la réplica
+    assert nombre(cliente, app, 1) == 'Ana nueva'
+    assert nombre(cliente, app, 2) == 'Beto (réplica)'
+
+    time.sleep(app.config['DB_LECTURA_PRIMARIO_SEGUNDOS'])
+    assert nombre(cliente, app, 1) == 'Ana (réplica)'
+
+
+def test_otro_worker_lee_del_primario_si_el_cliente_repite_el_header(app, consultas_replica):
+    cliente = app.test_client()
+    datos = {'nombre': 'Ana nueva', 'apellido': '', 'interno': '', 'sector': 'Ventas', 'sucursal': 'Centro'}
+    respuesta = cliente.post('/profile', json=datos, headers=headers(app, 1))
+    ultima = respuesta.headers[basedatos.HEADER_ESCRITURA]
+    # El GET lo atiende otro proceso, que no vio la escritura
+    basedatos._escrituras.clear()
+    assert nombre(cliente, app, 1) == 'Ana (réplica)'
+    obtenido = cliente.get('/profile', headers={**headers(app, 1), basedatos.HEADER_ESCRITURA: ultima}).get_json()['nombre']
+    assert obtenido == 'Ana nueva'
+
+    # Vencido, o del futuro, el header no cambia nada
+    for momento in (float(ultima) - app.config['DB_LECTURA_PRIMARIO_SEGUNDOS'], time.time() + 3600):
+        respuesta = cliente.get('/profile', headers={**headers(app, 1), basedatos.HEADER_ESCRITURA: str(momento)})
+        assert respuesta.get_json()['nombre'] == 'Ana (réplica)'
+    assert basedatos.HEADER_ESCRITURA not in respuesta.headers
+
+
+def test_pedidos_que_no_son_get_no_leen_de_la_replica(app, consultas_replica):
+    cliente = app.test_client()
+    # Clave1234 solo es válida en el primario y Vieja1234 solo en la réplica
+    assert cliente.post('/login', json={'username': 'ana@juliatours.com.ar', 'password': 'Clave1234'}).status_code == 200
+    assert cliente.post('/login', json={'username': 'ana@juliatours.com.ar', 'password': 'Vieja1234'}).status_code == 401
+    assert consultas_replica == []
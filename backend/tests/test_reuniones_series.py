@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+
+from models import UserRole
+from recurrencia import MAX_OCURRENCIAS
+from conftest import crear_usuario
+
+
+@pytest.fixture
+def cliente(crear_app):
+    app = crear_app()
+    with app.app_context():
+        editor = crear_usuario('editor@juliatours.com.ar', role=UserRole.EDITOR)
+        token = jwt.encode({'id': editor.id, 'role': editor.role.name}, app.config['SECRET_KEY'], algorithm='HS256')
+    cliente = app.test_client()
+    cliente.environ_base['HTTP_X_ACCESS_TOKEN'] = token
+    return cliente
+
+
+def crear_serie(cliente, start, end, rrule, ubicacion='1A'):
+    return cliente.post('/reuniones/series', json={'tema': 'Semanal', 'start': start, 'end': end, 'rrule': rrule, 'ubicacion': ubicacion})
+
+
+def inicios(cliente, desde, hasta):
+    respuesta = cliente.get('/reuniones/all', query_string={'desde': desde, 'hasta': hasta})
+    assert respuesta.status_code == 200
+    return sorted(e['start'][:16] for e in respuesta.get_json() if str(e['id']).startswith('s'))
+
+
+def test_dividir_corre_until_con_la_serie(cliente):
+    # Martes 12:00 hasta el martes 3/12; desde el 19/11 pasa a los miércoles
+    respuesta = crear_serie(cliente, '2030-11-05T12:00:00', '2030-11-05T13:00:00', 'FREQ=WEEKLY;UNTIL=20301203T120000')
+    assert respuesta.status_code == 201
+    serie_id = respuesta.get_json()['id']
+    respuesta = cliente.put(f'/reuniones/series/{serie_id}', json={'alcance': 'siguientes', 'ocurrencia': '2030-11-19T12:00',
+                                                                   'start': '2030-11-20T12:00:00', 'end': '2030-11-20T13:00:00'})
+    assert respuesta.status_code == 200
+
+    assert inicios(cliente, '2030-11-01', '2030-12-10') == ['2030-11-05T12:00', '2030-11-12T12:00', '2030-11-20T12:00',
+                                                          '2030-11-27T12:00', '2030-12-04T12:00']
+
+
+def test_choque_de_serie_lejana_se_detecta(cliente):
+    # Las dos series empiezan a más de un año: el horizonte se cuenta desde su inicio, no desde hoy
+    inicio = (datetime.now() + timedelta(days=800)).replace(hour=10, minute=0, second=0, microsecond=0)
+    assert crear_serie(cliente, inicio.isoformat(), (inicio + timedelta(hours=1)).isoformat(), 'FREQ=WEEKLY').status_code == 201
+    otra = inicio + timedelta(days=14, minutes=30)
+    assert crear_serie(cliente, otra.isoformat(), (otra + timedelta(hours=1)).isoformat(), 'FREQ=WEEKLY').status_code == 409
+
+
+def test_expansion_acotada(cliente):
+    assert crear_serie(cliente, '2030-01-01T09:00:00', '2030-01-01T09:30:00', 'FREQ=DAILY;BYHOUR=9,10,11').status_code == 400
+    assert crear_serie(cliente, '2030-01-01T09:00:00', '2030-01-01T09:30:00', 'FREQ=DAILY').status_code == 201
+
+    # La ventana se recorta a VENTANA_CALENDARIO: un pedido de un año no expande un año
+    assert len(inicios(cliente, '2030-01-01', '2031-01-01')) == 42
+    assert cliente.get('/reuniones/all', query_string={'desde': '2030-02-01', 'hasta': '2030-01-01'}).status_code == 400
+
+
+def test_borrar_siguientes_con_regla_invalida_no_toca_la_serie(cliente):
+    # Diaria sin fin: cortarla después de MAX_OCURRENCIAS días deja una primera parte que no se admite
+    respuesta = crear_serie(cliente, '2030-01-01T09:00:00', '2030-01-01T09:30:00', 'FREQ=DAILY')
+    serie_id = respuesta.get_json()['id']
+    corte = datetime(2030, 1, 1, 9) + timedelta(days=MAX_OCURRENCIAS + 5)
+    respuesta = cliente.delete(f'/reuniones/series/{serie_id}', query_string={'alcance': 'siguientes', 'ocurrencia': corte.strftime('%Y-%m-%dT%H:%M')})
+    assert respuesta.status_code == 400
+
+    desde = corte.date().isoformat()
+    assert inicios(cliente, desde, (corte + timedelta(days=2)).date().isoformat())[0] == corte.strftime('%Y-%m-%dT%H:%M')
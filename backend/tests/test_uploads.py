@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+from uploads_gc import CARPETA_CUARENTENA
+
+
+@pytest.mark.parametrize('ruta', [f'./{CARPETA_CUARENTENA}/secreto.txt', f'x/../{CARPETA_CUARENTENA}/secreto.txt',
+                                  f'{CARPETA_CUARENTENA}/secreto.txt', '.oculto'])
+def test_no_se_sirve_la_cuarentena_ni_ocultos(crear_app, tmp_path, ruta):
+    app = crear_app(UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    carpeta = app.config['UPLOAD_FOLDER']
+    os.makedirs(os.path.join(carpeta, CARPETA_CUARENTENA))
+    for nombre in (os.path.join(CARPETA_CUARENTENA, 'secreto.txt'), '.oculto', 'publico.txt'):
+        with open(os.path.join(carpeta, nombre), 'w') as f:
+            f.write('contenido')
+    cliente = app.test_client()
+
+    assert cliente.get(f'/uploads/{ruta}').status_code == 404
+    assert cliente.get('/uploads/publico.txt').status_code == 200
@@ -0,0 +1,34 @@
+import jwt
+import pytest
+
+from models import db, User, UserRole
+from conftest import crear_usuario
+
+
+@pytest.fixture
+def app(crear_app):
+    app = crear_app()
+    with app.app_context():
+        admin = crear_usuario('admin@juliatours.com.ar', role=UserRole.SUPERUSER)
+        crear_usuario('ana@juliatours.com.ar')
+        app.config['HEADERS_ADMIN'] = {'x-access-token': jwt.encode({'id': admin.id, 'role': admin.role.name}, app.config['SECRET_KEY'], algorithm='HS256')}
+    return app
+
+
+def lote(app, cambios):
+    return app.test_client().patch('/admin/users/batch', json={'cambios': cambios}, headers=app.config['HEADERS_ADMIN'])
+
+
+def test_identificadores_que_no_son_numero_ni_texto_son_error_de_la_fila(app):
+    respuesta = lote(app, [{'id': [2], 'sector': 'Administracion'}, {'id': {'id': 2}}, {'id': True}, {'id': 'ana'}, {'id': 2, 'sector': 'Administracion'}])
+    assert respuesta.status_code == 400
+    errores = respuesta.get_json()['errores']
+    assert [(e['posicion'], e['message']) for e in errores] == [(posicion, 'Identificador inválido') for posicion in range(4)]
+    with app.app_context():
+        assert db.session.get(User, 2).sector == 'Ventas'
+
+
+def test_id_como_texto_numerico(app):
+    assert lote(app, [{'id': '2', 'sector': 'Administracion'}]).status_code == 200
+    with app.app_context():
+        assert db.session.get(User, 2).sector == 'Administracion'
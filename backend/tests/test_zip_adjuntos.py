@@ -0,0 +1,43 @@
+import io
+import os
+import zipfile
+from datetime import datetime, timezone
+
+import jwt
+
+from models import db, Evento, UserRole
+from uploads_gc import CARPETA_CUARENTENA
+from conftest import crear_usuario
+
+
+def token(app, user):
+    return {'x-access-token': jwt.encode({'id': user.id, 'role': user.role.name}, app.config['SECRET_KEY'], algorithm='HS256')}
+
+
+def test_zip_de_evento_no_incluye_la_cuarentena(crear_app, tmp_path):
+    app = crear_app(UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    carpeta = app.config['UPLOAD_FOLDER']
+    os.makedirs(os.path.join(carpeta, CARPETA_CUARENTENA))
+    with open(os.path.join(carpeta, CARPETA_CUARENTENA, 'secreto.txt'), 'w') as f:
+        f.write('no')
+    with open(os.path.join(carpeta, 'banner.png'), 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+    with app.app_context():
+        editor = crear_usuario('editor@juliatours.com.ar', role=UserRole.EDITOR)
+        # Guardado antes de validar el banner: el ZIP tampoco lo tiene que devolver
+        evento = Evento(titulo='e', fecha_hora=datetime.now(timezone.utc), ubicacion_evento='Centro', user_id=editor.id,
+                        banner_image=f'{CARPETA_CUARENTENA}/secreto.txt', detalle=f'<img src="/uploads/{CARPETA_CUARENTENA}/secreto.txt">')
+        db.session.add(evento)
+        db.session.commit()
+        evento_id, headers = evento.id, token(app, editor)
+    cliente = app.test_client()
+
+    assert cliente.get(f'/eventos/{evento_id}/adjuntos.zip', headers=headers).status_code == 404
+
+    assert cliente.put(f'/eventos/{evento_id}', json={'banner_image': f'{CARPETA_CUARENTENA}/secreto.txt'}, headers=headers).status_code == 400
+    assert cliente.post('/eventos', json={'titulo': 't', 'fecha_hora': '2030-01-01T10:00:00', 'ubicacion_evento': 'Centro', 'banner_image': '../config.py'}, headers=headers).status_code == 400
+    assert cliente.put(f'/eventos/{evento_id}', json={'banner_image': 'banner.png', 'detalle': ''}, headers=headers).status_code == 200
+
+    respuesta = cliente.get(f'/eventos/{evento_id}/adjuntos.zip', headers=headers)
+    assert respuesta.status_code == 200
+    assert zipfile.ZipFile(io.BytesIO(respuesta.data)).namelist() == ['banner.png']
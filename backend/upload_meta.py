@@ -0,0 +1,157 @@
+import os
+import re
+import struct
+import hashlib
+import mimetypes
+
+
+# --- Metadatos de archivos subidos ---
+# guardar_upload() escribe el archivo en disco por bloques y, en la misma pasada, calcula el
+# tamaño y el SHA-256, detecta el tipo real a partir de los primeros bytes (no de la extensión que
+# manda el navegador) y, para imágenes y PDFs, obtiene dimensiones o cantidad de páginas.
+
+TAMANO_BLOQUE = 64 * 1024
+
+OOXML = {
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+
+FIRMAS = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+    (b'BM', 'image/bmp'),
+    (b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (b'\x1f\x8b', 'application/gzip'),
+    (b'MZ', 'application/vnd.microsoft.portable-executable'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),
+    (b'PK\x03\x04', 'application/zip'),
+]
+
+PAGINA_PDF_REGEX = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def detectar_mimetype(cabecera, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    tipo = None
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        tipo = 'image/webp'
+    elif cabecera[4:8] == b'ftyp':
+        tipo = 'video/mp4'
+    else:
+        for firma, mimetype in FIRMAS:
+            if cabecera.startswith(firma):
+                tipo = mimetype
+                break
+    # Los formatos de Office son contenedores ZIP u OLE: la extensión dice cuál es
+    if tipo == 'application/zip' and extension in OOXML:
+        return OOXML[extension]
+    if tipo == 'application/x-ole-storage':
+        return mimetypes.guess_type(filename)[0] or tipo
+    if tipo:
+        return tipo
+    adivinado = mimetypes.guess_type(filename)[0]
+    if adivinado and (adivinado.startswith('text/') or adivinado in ('application/json', 'image/svg+xml')):
+        try:
+            cabecera.decode('utf-8')
+            return adivinado
+        except UnicodeDecodeError:
+            pass
+    try:
+        cabecera.decode('utf-8')
+        return 'text/plain'
+    except UnicodeDecodeError:
+        return 'application/octet-stream'
+
+
+def _dimensiones_imagen(mimetype, cabecera, path):
+    try:
+        if mimetype == 'image/png' and cabecera[12:16] == b'IHDR':
+            return struct.unpack('>II', cabecera[16:24])
+        if mimetype == 'image/gif':
+            return struct.unpack('<HH', cabecera[6:10])
+        if mimetype == 'image/bmp':
+            ancho, alto = struct.unpack('<ii', cabecera[18:26])
+            return ancho, abs(alto)
+        if mimetype == 'image/webp':
+            formato = cabecera[12:16]
+            if formato == b'VP8 ':
+                ancho, alto = struct.unpack('<HH', cabecera[26:30])
+                return ancho & 0x3fff, alto & 0x3fff
+            if formato == b'VP8L':
+                bits = int.from_bytes(cabecera[21:25], 'little')
+                return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+            if formato == b'VP8X':
+                return int.from_bytes(cabecera[24:27], 'little') + 1, int.from_bytes(cabecera[27:30], 'little') + 1
+        if mimetype == 'image/jpeg':
+            return _dimensiones_jpeg(path)
+    except (struct.error, OSError):
+        pass
+    return None, None
+
+
+def _dimensiones_jpeg(path):
+    # Recorre los marcadores saltando sus segmentos; solo lee los encabezados
+    with open(path, 'rb') as f:
+        f.read(2)
+        while True:
+            byte = f.read(1)
+            while byte and byte != b'\xff':
+                byte = f.read(1)
+            while byte == b'\xff':
+                byte = f.read(1)
+            if not byte:
+                return None, None
+            marcador = byte[0]
+            if marcador in (0xd8, 0x01) or 0xd0 <= marcador <= 0xd7:
+                continue
+            largo = struct.unpack('>H', f.read(2))[0]
+            if marcador in (0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf):
+                alto, ancho = struct.unpack('>xHH', f.read(5))
+                return ancho, alto
+            f.seek(largo - 2, os.SEEK_CUR)
+
+
+def guardar_upload(file_storage, path):
+    """Guarda el archivo en `path` y devuelve sus metadatos (mimetype, size, sha256, width, height, page_count)."""
+    sha256 = hashlib.sha256()
+    tamano = 0
+    cabecera = b''
+    mimetype = None
+    paginas = 0
+    resto_pdf = b''
+    with open(path, 'wb') as destino:
+        while True:
+            bloque = file_storage.stream.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            if mimetype is None:
+                cabecera = bloque[:4096]
+                mimetype = detectar_mimetype(cabecera, file_storage.filename or '')
+            if mimetype == 'application/pdf':
+                # Se cuentan los objetos /Type /Page; se arrastra un resto para no cortar la marca entre bloques
+                ventana = resto_pdf + bloque
+                paginas += len(PAGINA_PDF_REGEX.findall(ventana))
+                resto_pdf = ventana[-32:]
+                paginas -= len(PAGINA_PDF_REGEX.findall(resto_pdf))
+            sha256.update(bloque)
+            tamano += len(bloque)
+            destino.write(bloque)
+    if mimetype is None:
+        mimetype = detectar_mimetype(b'', file_storage.filename or '')
+    if mimetype == 'application/pdf':
+        paginas += len(PAGINA_PDF_REGEX.findall(resto_pdf))
+    ancho, alto = _dimensiones_imagen(mimetype, cabecera, path) if mimetype.startswith('image/') else (None, None)
+    return {
+        'mimetype': mimetype,
+        'size': tamano,
+        'sha256': sha256.hexdigest(),
+        'width': ancho,
+        'height': alto,
+        'page_count': (paginas or None) if mimetype == 'application/pdf' else None,
+    }
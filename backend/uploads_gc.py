@@ -0,0 +1,137 @@
+import os
+import re
+import time
+import threading
+from collections import defaultdict
+
+from models import db, User, Attachment, Evento, Post, Novedad, AttachmentArchivo, EventoArchivo, NovedadArchivo
+
+
+# --- Limpieza de archivos huérfanos en UPLOAD_FOLDER ---
+# Un archivo está referenciado si aparece en Attachment.saved_filename, User.profile_image,
+# Evento.banner_image o como URL /uploads/... dentro del HTML de posts, novedades o eventos.
+# Los que no lo están y son más viejos que el período de gracia se mueven a una carpeta de
+# cuarentena; recién se borran cuando pasaron UPLOADS_GC_CUARENTENA_DIAS allí. Si durante la
+# cuarentena vuelven a estar referenciados, se restauran.
+
+CARPETA_CUARENTENA = '.cuarentena'
+URL_UPLOAD_REGEX = re.compile(r'/uploads/([^"\'\s<>?#)]+)')
+NOMBRE_UPLOAD_REGEX = re.compile(r'[^"\'\s<>?#)/\\.][^"\'\s<>?#)/\\]*')
+
+
+def nombre_upload_valido(nombre):
+    """Nombre de un archivo suelto de UPLOAD_FOLDER: sin carpetas, ni ocultos, ni la cuarentena."""
+    return isinstance(nombre, str) and NOMBRE_UPLOAD_REGEX.fullmatch(nombre) is not None
+
+
+def archivos_referenciados():
+    referenciados = {'default.png'}
+    # Incluye las tablas de archivo (archivo.py): lo archivado se sigue pudiendo consultar
+    for columna in (Attachment.saved_filename, User.profile_image, Evento.banner_image, AttachmentArchivo.saved_filename, EventoArchivo.banner_image):
+        referenciados.update(v for (v,) in db.session.query(columna).filter(columna.isnot(None)).yield_per(1000))
+    for columna in (Post.content, Novedad.content, Evento.detalle, NovedadArchivo.content, EventoArchivo.detalle):
+        consulta = db.session.query(columna).filter(columna.like('%/uploads/%'))
+        for (html,) in consulta.yield_per(200):
+            referenciados.update(URL_UPLOAD_REGEX.findall(html))
+    return referenciados
+
+
+def _archivos(carpeta):
+    # os.scandir recorre el directorio en streaming, sin armar la lista completa en memoria
+    if not os.path.isdir(carpeta):
+        return
+    with os.scandir(carpeta) as entradas:
+        for entrada in entradas:
+            if entrada.is_file(follow_symlinks=False):
+                yield entrada
+
+
+def limpiar_uploads(app, dry_run=False):
+    """Pasa a cuarentena los huérfanos y borra los que cumplieron la cuarentena. Devuelve un resumen."""
+    carpeta = app.config['UPLOAD_FOLDER']
+    cuarentena = os.path.join(carpeta, CARPETA_CUARENTENA)
+    gracia = app.config['UPLOADS_GC_GRACIA_HORAS'] * 3600
+    limite_cuarentena = app.config['UPLOADS_GC_CUARENTENA_DIAS'] * 86400
+    ahora = time.time()
+    referenciados = archivos_referenciados()
+    resumen = {'en_cuarentena': [], 'restaurados': [], 'eliminados': [], 'bytes_liberados': 0}
+
+    if not dry_run:
+        os.makedirs(cuarentena, exist_ok=True)
+    for entrada in _archivos(carpeta):
+        if entrada.name in referenciados or ahora - entrada.stat().st_mtime < gracia:
+            continue
+        resumen['en_cuarentena'].append(entrada.name)
+        if not dry_run:
+            os.replace(entrada.path, os.path.join(cuarentena, entrada.name))
+            # La fecha de modificación marca el inicio de la cuarentena
+            os.utime(os.path.join(cuarentena, entrada.name))
+
+    for entrada in _archivos(cuarentena):
+        if entrada.name in referenciados:
+            resumen['restaurados'].append(entrada.name)
+            if not dry_run:
+                os.replace(entrada.path, os.path.join(carpeta, entrada.name))
+        elif ahora - entrada.stat().st_mtime >= limite_cuarentena:
+            resumen['eliminados'].append(entrada.name)
+            resumen['bytes_liberados'] += entrada.stat().st_size
+            if not dry_run:
+                os.remove(entrada.path)
+    return resumen
+
+
+def reporte_almacenamiento(app):
+    """Bytes ocupados por dueño (prefijo <user_id>_ del nombre guardado) y por tipo de archivo."""
+    carpeta = app.config['UPLOAD_FOLDER']
+    referenciados = archivos_referenciados()
+    por_dueno = defaultdict(lambda: {'archivos': 0, 'bytes': 0})
+    por_tipo = defaultdict(lambda: {'archivos': 0, 'bytes': 0})
+    totales = {'archivos': 0, 'bytes': 0, 'huerfanos_archivos': 0, 'huerfanos_bytes': 0}
+
+    for entrada in _archivos(carpeta):
+        tamano = entrada.stat().st_size
+        dueno = entrada.name.split('_', 1)[0]
+        extension = os.path.splitext(entrada.name)[1].lower().lstrip('.') or 'sin extensión'
+        for grupo in (por_dueno[int(dueno) if dueno.isdigit() else None], por_tipo[extension]):
+            grupo['archivos'] += 1
+            grupo['bytes'] += tamano
+        totales['archivos'] += 1
+        totales['bytes'] += tamano
+        if entrada.name not in referenciados:
+            totales['huerfanos_archivos'] += 1
+            totales['huerfanos_bytes'] += tamano
+
+    cuarentena = [e.stat().st_size for e in _archivos(os.path.join(carpeta, CARPETA_CUARENTENA))]
+    totales['cuarentena_archivos'] = len(cuarentena)
+    totales['cuarentena_bytes'] = sum(cuarentena)
+
+    ids = [i for i in por_dueno if i is not None]
+    nombres = {u.id: f"{u.nombre or ''} {u.apellido or ''}".strip() or u.username for u in User.query.filter(User.id.in_(ids)).all()} if ids else {}
+    duenos = [dict(user_id=user_id, nombre=nombres.get(user_id, 'Usuario Eliminado' if user_id else 'Desconocido'), **datos) for user_id, datos in por_dueno.items()]
+    tipos = [dict(tipo=tipo, **datos) for tipo, datos in por_tipo.items()]
+    return {
+        'totales': totales,
+        'por_dueno': sorted(duenos, key=lambda d: d['bytes'], reverse=True),
+        'por_tipo': sorted(tipos, key=lambda d: d['bytes'], reverse=True),
+    }
+
+
+def iniciar_limpieza_periodica(app):
+    """Corre limpiar_uploads cada UPLOADS_GC_INTERVALO_HORAS en un hilo de fondo (0 = desactivado)."""
+    intervalo = app.config.get('UPLOADS_GC_INTERVALO_HORAS') or 0
+    if intervalo <= 0:
+        return None
+
+    def bucle():
+        while True:
+            time.sleep(intervalo * 3600)
+            try:
+                with app.app_context():
+                    resumen = limpiar_uploads(app)
+                print(f"Limpieza de uploads: {len(resumen['en_cuarentena'])} en cuarentena, {len(resumen['eliminados'])} eliminados")
+            except Exception as e:
+                print(f"Error en la limpieza de uploads: {e}")
+
+    hilo = threading.Thread(target=bucle, name='uploads-gc', daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,96 @@
+import os
+import time
+import zipfile
+import mimetypes
+
+from werkzeug.security import safe_join
+
+from upload_meta import OOXML, TAMANO_BLOQUE
+from uploads_gc import nombre_upload_valido
+
+
+# --- ZIP de adjuntos armado al vuelo ---
+# El ZIP se escribe directo en la respuesta: zipfile escribe en un destino sin seek (usa
+# descriptores de datos), cada bloque leído del disco se comprime y se entrega enseguida. No hay
+# archivos temporales y la memoria no depende del tamaño del ZIP, solo de TAMANO_BLOQUE.
+#
+# Los formatos que ya vienen comprimidos (imágenes, PDF, video, audio, ZIP, Office) se guardan sin
+# volver a comprimir: no se achican y solo gastarían CPU.
+
+COMPRIMIDOS = {
+    'application/pdf', 'application/zip', 'application/gzip', 'application/vnd.rar', 'application/x-7z-compressed',
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp',
+    *OOXML.values(),
+}
+
+
+class _Salida:
+    """Destino sin seek para ZipFile: junta lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def ya_comprimido(mimetype):
+    return mimetype in COMPRIMIDOS or (mimetype or '').startswith(('video/', 'audio/'))
+
+
+def nombres_unicos(nombres):
+    """Evita nombres repetidos dentro del ZIP: informe.pdf, informe (2).pdf, ..."""
+    usados = set()
+    for nombre in nombres:
+        nombre = os.path.basename((nombre or '').replace('\\', '/')).strip() or 'archivo'
+        base, extension = os.path.splitext(nombre)
+        candidato, n = nombre, 1
+        while candidato.lower() in usados:   # en Windows no distingue mayúsculas
+            n += 1
+            candidato = f'{base} ({n}){extension}'
+        usados.add(candidato.lower())
+        yield candidato
+
+
+def entradas_zip(carpeta, archivos):
+    """[(nombre en el ZIP, ruta, mimetype)] de los archivos [(saved_filename, nombre, mimetype)] que existen."""
+    existentes = []
+    for saved_filename, nombre, mimetype in archivos:
+        # Solo archivos sueltos de la carpeta: nada de subcarpetas (la cuarentena) ni ocultos
+        ruta = safe_join(carpeta, saved_filename) if nombre_upload_valido(saved_filename) else None
+        if ruta and os.path.isfile(ruta):
+            existentes.append((nombre, ruta, mimetype or mimetypes.guess_type(saved_filename)[0]))
+    return [(unico, ruta, mimetype) for unico, (_, ruta, mimetype) in zip(nombres_unicos(n for n, _, _ in existentes), existentes)]
+
+
+def generar_zip(entradas):
+    """Generador con los bytes del ZIP; lee cada archivo del disco recién cuando le toca."""
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', allowZip64=True) as zf:
+        for nombre, ruta, mimetype in entradas:
+            try:
+                origen = open(ruta, 'rb')
+            except OSError:
+                continue   # borrado entre que se armó la lista y ahora
+            with origen:
+                estado = os.fstat(origen.fileno())
+                info = zipfile.ZipInfo(nombre, date_time=time.localtime(max(estado.st_mtime, 315532800))[:6])
+                info.compress_type = zipfile.ZIP_STORED if ya_comprimido(mimetype) else zipfile.ZIP_DEFLATED
+                with zf.open(info, 'w', force_zip64=estado.st_size >= zipfile.ZIP64_LIMIT) as destino:
+                    for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+                        destino.write(bloque)
+                        datos = salida.vaciar()
+                        if datos:
+                            yield datos
+            yield salida.vaciar()
+    # Al cerrar se escribe el directorio central
+    yield salida.vaciar()
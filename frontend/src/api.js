@@ -16,4 +16,23 @@ export const setAuthToken = token => {
     }
 };
 
+// 3. Leer lo que uno mismo escribió: si una respuesta trae X-Ultima-Escritura, se repite en los
+// pedidos siguientes para que el servidor (cualquiera de sus procesos) no los lea de la réplica,
+// que puede venir atrasada. Vence solo del lado del servidor.
+let ultimaEscritura = null;
+
+apiClient.interceptors.request.use(config => {
+    if (ultimaEscritura) {
+        config.headers['X-Ultima-Escritura'] = ultimaEscritura;
+    }
+    return config;
+});
+
+apiClient.interceptors.response.use(response => {
+    if (response.headers['x-ultima-escritura']) {
+        ultimaEscritura = response.headers['x-ultima-escritura'];
+    }
+    return response;
+});
+
 export default apiClient;
\ No newline at end of file
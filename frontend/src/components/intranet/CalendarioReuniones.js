@@ -6,6 +6,8 @@ import format from 'date-fns/format';
 import parse from 'date-fns/parse';
 import startOfWeek from 'date-fns/startOfWeek';
 import getDay from 'date-fns/getDay';
+import startOfMonth from 'date-fns/startOfMonth';
+import addDays from 'date-fns/addDays';
 import es from 'date-fns/locale/es';
 import 'react-big-calendar/lib/css/react-big-calendar.css';
 import Modal from 'react-modal';
@@ -21,6 +23,17 @@ const INITIAL_FORM_DATA = {
     proveedor: '', necesita_bebida: false, necesita_comida: ''
 };
 
+// La grilla del mes actual (6 semanas), que es lo que muestra el calendario al abrir
+const rangoInicial = () => {
+    const start = startOfWeek(startOfMonth(new Date()), { locale: es });
+    return { start, end: addDays(start, 42) };
+};
+
+// react-big-calendar pasa un array de días (semana/día) o { start, end } (mes/agenda)
+const rangoVisible = (range) => Array.isArray(range)
+    ? { start: range[0], end: addDays(range[range.length - 1], 1) }
+    : { start: range.start, end: addDays(range.end, 1) };
+
 const ubicaciones = ["1A", "1B", "7A", "8A", "BOX1", "BOX2"];
 
 const formatDateForInput = (date) => {
@@ -76,6 +89,7 @@ const CalendarioReuniones = () => {
     const [formData, setFormData] = useState(INITIAL_FORM_DATA);
     const [error, setError] = useState('');
     const [isEditing, setIsEditing] = useState(false);
+    const [rango, setRango] = useState(rangoInicial);
     const canManage = user?.role === 'SUPERUSER' || user?.role === 'EDITOR';
 
     const eventStyleGetter = (event, start, end, isSelected) => {
@@ -119,7 +133,8 @@ const CalendarioReuniones = () => {
         if (!token) return;
         try {
             const response = await apiClient.get(`${process.env.REACT_APP_API_URL}/reuniones/all`, {
-                headers: { 'x-access-token': token }
+                headers: { 'x-access-token': token },
+                params: { desde: rango.start.toISOString(), hasta: rango.end.toISOString() }
             });
             const formattedEvents = response.data.map(event => ({
                 ...event,
@@ -131,7 +146,7 @@ const CalendarioReuniones = () => {
             console.error("Error al cargar las reuniones:", error);
             setError('No se pudieron cargar las reuniones.');
         }
-    }, [token]);
+    }, [token, rango]);
 
     useEffect(() => {
         fetchEvents();
@@ -199,7 +214,11 @@ const CalendarioReuniones = () => {
      const handleDelete = async () => {
         if (selectedEvent && window.confirm('¿Estás seguro?')) {
             try {
-                await apiClient.delete(`${process.env.REACT_APP_API_URL}/reuniones/${selectedEvent.id}`, { headers: { 'x-access-token': token } });
+                // Las ocurrencias de una serie se cancelan de a una; la serie sigue
+                const url = selectedEvent.serie_id
+                    ? `${process.env.REACT_APP_API_URL}/reuniones/series/${selectedEvent.serie_id}?alcance=ocurrencia&ocurrencia=${encodeURIComponent(selectedEvent.ocurrencia)}`
+                    : `${process.env.REACT_APP_API_URL}/reuniones/${selectedEvent.id}`;
+                await apiClient.delete(url, { headers: { 'x-access-token': token } });
                 fetchEvents();
                 closeModal();
             } catch (error) {
@@ -218,9 +237,15 @@ const CalendarioReuniones = () => {
             end: `${formData.fecha_fin}T${formData.hora_fin}`,
         };
         const method = selectedEvent ? 'put' : 'post';
-        const url = selectedEvent
+        let url = selectedEvent
             ? `${process.env.REACT_APP_API_URL}/reuniones/${selectedEvent.id}`
             : `${process.env.REACT_APP_API_URL}/reuniones`;
+        if (selectedEvent?.serie_id) {
+            // Editar una ocurrencia de una serie la separa como reunión suelta
+            url = `${process.env.REACT_APP_API_URL}/reuniones/series/${selectedEvent.serie_id}`;
+            submissionData.alcance = 'ocurrencia';
+            submissionData.ocurrencia = selectedEvent.ocurrencia;
+        }
         try {
             await apiClient[method](url, submissionData, { headers: { 'x-access-token': token } });
             fetchEvents();
@@ -250,6 +275,7 @@ const CalendarioReuniones = () => {
                     eventPropGetter={eventStyleGetter}
                     onSelectEvent={openViewModal}  
                     onSelectSlot={openCreateModal} 
+                    onRangeChange={(range) => setRango(rangoVisible(range))}
                     selectable={canManage} 
                     formats={{
                         timeGutterFormat: 'HH:mm', 
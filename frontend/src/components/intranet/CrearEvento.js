@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import apiClient from '../../api'; 
+import { invalidarDashboard } from '../../dashboard';
 import { useAuth } from '../../context/AuthContext';
 import './CrearEvento.css';
 
@@ -108,6 +109,7 @@ const CrearEvento = ({ modoEdicion = false }) => {
             } else {
                 await apiClient.post('/eventos', eventoData, { headers: { 'x-access-token': token } });
             }
+            invalidarDashboard();
             navigate('/index/eventos');
         } catch (err) { 
             setError('Error al guardar el evento.'); 
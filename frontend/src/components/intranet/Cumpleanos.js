@@ -1,6 +1,7 @@
 
 import React, { useState, useEffect, useMemo } from 'react';
 import apiClient from '../../api'; 
+import { cargarDashboard, invalidarDashboard } from '../../dashboard';
 import { useAuth } from '../../context/AuthContext';
 import DatePicker from 'react-datepicker';
 import "react-datepicker/dist/react-datepicker.css";
@@ -26,29 +27,23 @@ const Cumpleanos = () => {
     const [cumpleanerosDeHoy, setCumpleanerosDeHoy] = useState([]);
 
     const [isCalendarVisible, setIsCalendarVisible] = useState(false);
-    const [allUsers, setAllUsers] = useState([]);
+    const [allUsers, setAllUsers] = useState(null);
+    const [proximos, setProximos] = useState([]);
     const [selectedDate, setSelectedDate] = useState(new Date());
     
     const birthdaysOnSelectedDate = useMemo(() => 
-        allUsers.filter(user => areDatesSameDayAndMonth(parseDateWithoutTimezone(user.fecha_nacimiento), selectedDate)),
+        (allUsers || []).filter(user => areDatesSameDayAndMonth(parseDateWithoutTimezone(user.fecha_nacimiento), selectedDate)),
         [allUsers, selectedDate]
     );
 
-    const upcomingBirthdays = useMemo(() => {
-        const today = new Date();
-        const upcoming = [];
-        for (let i = 1; i <= 7; i++) {
-            const futureDate = new Date();
-            futureDate.setDate(today.getDate() + i);
-            allUsers.forEach(user => {
-                if (areDatesSameDayAndMonth(parseDateWithoutTimezone(user.fecha_nacimiento), futureDate)) {
-                    upcoming.push({ ...user, birthdayDate: futureDate });
-                }
-            });
-        }
-        upcoming.sort((a, b) => a.birthdayDate - b.birthdayDate);
-        return upcoming;
-    }, [allUsers]);
+    // El servidor ya los calcula (de mañana a 7 días); 'fecha' es la fecha del cumpleaños este año
+    const upcomingBirthdays = useMemo(() => 
+        proximos.map(person => {
+            const [year, month, day] = person.fecha.split('-').map(Number);
+            return { ...person, birthdayDate: new Date(year, month - 1, day) };
+        }),
+        [proximos]
+    );
 
 
     useEffect(() => {
@@ -56,11 +51,9 @@ const Cumpleanos = () => {
             if (token) {
                 setIsLoading(true);
                 try {
-                    const usersRes = await apiClient.get('/internos', { headers: { 'x-access-token': token } });
-                    setAllUsers(usersRes.data);
-
-                    const cumpleHoyRes = await apiClient.get('/cumpleanos', { headers: { 'x-access-token': token } });
-                    setCumpleanerosDeHoy(cumpleHoyRes.data);
+                    const dashboard = await cargarDashboard(token);
+                    setCumpleanerosDeHoy(dashboard.cumpleanos.hoy);
+                    setProximos(dashboard.cumpleanos.proximos);
 
                 } catch (err) {
                     setError('No se pudo cargar toda la información de cumpleaños.');
@@ -72,9 +65,19 @@ const Cumpleanos = () => {
         fetchData();
     }, [token]);
 
+    // La lista completa de internos solo hace falta para buscar por fecha
+    useEffect(() => {
+        if (isCalendarVisible && allUsers === null && token) {
+            apiClient.get('/internos', { headers: { 'x-access-token': token } })
+                .then(response => setAllUsers(response.data))
+                .catch(() => setError('No se pudo cargar toda la información de cumpleaños.'));
+        }
+    }, [isCalendarVisible, allUsers, token]);
+
     const handleChangeGif = async (userId) => {
         try {
             const response = await apiClient.post(`/cumpleanos/${userId}/change-gif`, {}, { headers: { 'x-access-token': token } });
+            invalidarDashboard();
             setCumpleanerosDeHoy(prev => prev.map(c => 
                 c.id === userId ? { ...c, gif_url: response.data.new_gif_url } : c
             ));
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useCallback, useMemo } from 'react';
 import { useParams, Link, useNavigate } from 'react-router-dom';
 import apiClient from '../../api';
+import { invalidarDashboard } from '../../dashboard';
 import { useAuth } from '../../context/AuthContext';
 import './EventoDetalle.css'; 
 
@@ -70,6 +71,7 @@ const EventoDetalle = () => {
                 { headers: { 'x-access-token': token } }
             );
             setMiInscripcion(response.data);
+            invalidarDashboard();
             setSuccess('Tu inscripción se ha guardado correctamente.');
         } catch (err) {
             setError('Error al guardar la inscripción.');
@@ -82,6 +84,7 @@ const EventoDetalle = () => {
         if (window.confirm(`¿Estás seguro de que quieres eliminar el evento "${evento.titulo}"? Esta acción es irreversible.`)) {
             try {
                 await apiClient.delete(`${process.env.REACT_APP_API_URL}/eventos/${eventoId}`, { headers: { 'x-access-token': token } });
+                invalidarDashboard();
                 navigate('/index/eventos'); 
             } catch (err) {
                 setError('Error al eliminar el evento.');
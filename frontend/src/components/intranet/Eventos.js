@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useMemo } from 'react';
 import { Link } from 'react-router-dom';
 import apiClient from '../../api';
+import { cargarDashboard } from '../../dashboard';
 import { useAuth } from '../../context/AuthContext';
 import './Eventos.css';
 
@@ -18,10 +19,8 @@ const Eventos = () => {
         const fetchEventos = async () => {
             if (token) {
                 try {
-                    const response = await apiClient.get(`${process.env.REACT_APP_API_URL}/eventos`, {
-                        headers: { 'x-access-token': token }
-                    });
-                    setEventos(response.data);
+                    const dashboard = await cargarDashboard(token);
+                    setEventos(dashboard.eventos);
                 } catch (err) {
                     setError('No se pudieron cargar los eventos.');
                 } finally {
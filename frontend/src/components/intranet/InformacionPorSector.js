@@ -63,6 +63,8 @@ const InformacionPorSector = () => {
     const [attachments, setAttachments] = useState([]);
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState('');
+    // El listado trae solo el extracto; el HTML completo se pide al expandir cada publicación
+    const [contenidoCompleto, setContenidoCompleto] = useState({});
     
     const itemsPerPage = 6;
 
@@ -90,7 +92,7 @@ const InformacionPorSector = () => {
         const term = searchTerm.toLowerCase();
         const filtered = allPosts.filter(post => 
             (post.title.toLowerCase().includes(term)) ||
-            (post.content.replace(/<[^>]*>/g, '').toLowerCase().includes(term))
+            ((post.excerpt || '').toLowerCase().includes(term))
         );
         
         setTotalPages(Math.ceil(filtered.length / itemsPerPage));
@@ -158,6 +160,21 @@ const InformacionPorSector = () => {
         }
     };
 
+    const togglePost = async (postId) => {
+        if (contenidoCompleto[postId] !== undefined) {
+            setContenidoCompleto(prev => { const { [postId]: _, ...resto } = prev; return resto; });
+            return;
+        }
+        try {
+            const response = await apiClient.get(`${process.env.REACT_APP_API_URL}/informacion/post/${postId}`, {
+                headers: { 'x-access-token': token }
+            });
+            setContenidoCompleto(prev => ({ ...prev, [postId]: response.data.content }));
+        } catch (err) {
+            setError('No se pudo cargar la publicación completa.');
+        }
+    };
+
     const handleDeletePost = async (postId) => {
         if (window.confirm('¿Estás seguro?')) {
             try {
@@ -216,7 +233,14 @@ const InformacionPorSector = () => {
                         <div className="post-content ProseMirror">
                             <h2>{post.title}</h2>
                             <hr />
-                            <div dangerouslySetInnerHTML={{ __html: DOMPurify.sanitize(post.content, { ADD_ATTR: ['class', 'style', 'target'] }) }} />
+                            {contenidoCompleto[post.id] !== undefined ? (
+                                <div dangerouslySetInnerHTML={{ __html: DOMPurify.sanitize(contenidoCompleto[post.id], { ADD_ATTR: ['class', 'style', 'target'] }) }} />
+                            ) : (
+                                <p>{post.excerpt}</p>
+                            )}
+                            <button onClick={() => togglePost(post.id)} className="read-more-btn">
+                                {contenidoCompleto[post.id] !== undefined ? 'Ver menos' : 'Ver completa'}
+                            </button>
                             
                             {post.attachments && post.attachments.length > 0 && (
                                 <div className="post-attachments-display">
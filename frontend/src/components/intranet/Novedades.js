@@ -2,6 +2,7 @@
 
 import React, { useState, useEffect, useCallback } from 'react';
 import apiClient from '../../api';
+import { cargarDashboard, invalidarDashboard } from '../../dashboard';
 import { useAuth } from '../../context/AuthContext';
 import Editor from '../Editor';
 import DOMPurify from 'dompurify';
@@ -44,6 +45,8 @@ const Novedades = () => {
     const [attachments, setAttachments] = useState([]);
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState('');
+    // El listado trae solo el extracto; el HTML completo se pide al expandir cada novedad
+    const [contenidoCompleto, setContenidoCompleto] = useState({});
 
     const templates = {
         vacaciones: '<strong>Personal en Vacaciones:</strong><p><strong>Usuario:</strong> [Completar nombre]</p><p><strong>Cantidad de días:</strong> [Completar]</p><p><strong>Desde:</strong> [dd/mm/aaaa] - <strong>Hasta:</strong> [dd/mm/aaaa]</p>',
@@ -56,18 +59,17 @@ const Novedades = () => {
     const fetchNovedades = useCallback(async (page = 1) => {
         setIsLoading(true);
         try {
-            const response = await apiClient.get('/novedades', {
-                params: { page },
-            });
-            setNovedades(response.data.novedades);
-            setCurrentPage(response.data.current_page);
-            setTotalPages(response.data.total_pages);
+            // La primera página viene en /dashboard, compartida con las otras vistas de inicio
+            const data = page === 1 ? (await cargarDashboard(token)).novedades : (await apiClient.get('/novedades', { params: { page } })).data;
+            setNovedades(data.novedades);
+            setCurrentPage(data.current_page);
+            setTotalPages(data.total_pages);
         } catch (err) {
             setError('No se pudieron cargar las novedades.');
         } finally {
             setIsLoading(false);
         }
-    }, []);
+    }, [token]);
 
     useEffect(() => {
         if (token) {
@@ -75,6 +77,19 @@ const Novedades = () => {
         }
     }, [token, currentPage, fetchNovedades]);
 
+    const toggleNovedad = async (novedadId) => {
+        if (contenidoCompleto[novedadId] !== undefined) {
+            setContenidoCompleto(prev => { const { [novedadId]: _, ...resto } = prev; return resto; });
+            return;
+        }
+        try {
+            const response = await apiClient.get(`/novedades/${novedadId}`);
+            setContenidoCompleto(prev => ({ ...prev, [novedadId]: response.data.content }));
+        } catch (err) {
+            setError('No se pudo cargar la novedad completa.');
+        }
+    };
+
     const canPost = user?.role === 'SUPERUSER' || (user?.role === 'EDITOR' && user.sector === 'Administracion');
 
     const handleFileSelect = async (event) => {
@@ -130,6 +145,7 @@ const Novedades = () => {
 
         try {
             await apiClient.post('/novedades', { asunto, content: finalContent });
+            invalidarDashboard();
         
             setAsunto('');
             setContent('');
@@ -145,6 +161,7 @@ const Novedades = () => {
         if (window.confirm('¿Estás seguro?')) {
             try {
                 await apiClient.delete(`/novedades/${novedadId}`);
+                invalidarDashboard();
                 fetchNovedades(currentPage);
             } catch (err) {
                 setError(err.response?.data?.message || 'Error al eliminar la novedad.');
@@ -173,12 +190,19 @@ const Novedades = () => {
                                 {new Date(novedad.created_at).toLocaleDateString('es-ES', { year: 'numeric', month: 'long', day: 'numeric' })}
                             </span>
                         </div>
-                        <div 
-                            className="post-content ck-content"
-                            dangerouslySetInnerHTML={{ 
-                                __html: DOMPurify.sanitize(novedad.content, { ADD_ATTR: ['class', 'style', 'target'], ADD_TAGS: ['iframe'] }) 
-                            }}
-                        />
+                        {contenidoCompleto[novedad.id] !== undefined ? (
+                            <div 
+                                className="post-content ck-content"
+                                dangerouslySetInnerHTML={{ 
+                                    __html: DOMPurify.sanitize(contenidoCompleto[novedad.id], { ADD_ATTR: ['class', 'style', 'target'], ADD_TAGS: ['iframe'] }) 
+                                }}
+                            />
+                        ) : (
+                            <p className="post-content">{novedad.excerpt}</p>
+                        )}
+                        <button onClick={() => toggleNovedad(novedad.id)} className="read-more-btn">
+                            {contenidoCompleto[novedad.id] !== undefined ? 'Ver menos' : 'Ver completa'}
+                        </button>
                     </div>
                 ))}
             </div>
@@ -137,7 +137,7 @@ const AdminPanel = () => {
     const sectores = ["Administracion", "Aereos", "Comercial", "Comercial interior", "Data entry", "Diseño - Marketing", "Documentacion", "Grupos", "Hotel ya - Trenes", "Nacional", "Producto", "Recepcion", "Operaciones", "Sistemas", "Ventas Area 1", "Ventas Brasil", "Ventas Europa", "Ventas Exoticos", "Ventas Interior", "Ycix"].sort();
     const sucursales = ["Buenos Aires", "Cordoba", "Comercial Interior", "Rosario"];
     const [allUsers, setAllUsers] = useState([]);
-    const [filteredUsers, setFilteredUsers] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [searchTerm, setSearchTerm] = useState('');
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState('');
@@ -148,35 +148,33 @@ const AdminPanel = () => {
         isGuardiaAdmin: user?.role === 'SUPERUSER' || (user?.role === 'EDITOR' && user?.sector === 'Administracion'),
     }), [user]);
 
-    const fetchUsers = useCallback(async () => {
+    // El filtrado y la paginación se hacen en el servidor
+    const fetchUsers = useCallback(async (cursor = null) => {
         if (!isSuperUser) {
             setIsLoading(false);
             return;
         }
         setIsLoading(true);
         try {
+            const params = { q: searchTerm || undefined, cursor: cursor || undefined };
             const response = await apiClient.get('/admin/users', {
-                headers: { 'x-access-token': token }
+                headers: { 'x-access-token': token },
+                params
             });
-            setAllUsers(response.data);
-            setFilteredUsers(response.data);
+            setAllUsers(prevUsers => cursor ? [...prevUsers, ...response.data.users] : response.data.users);
+            setNextCursor(response.data.next_cursor);
         } catch (err) {
             setError('No se pudo cargar la lista de usuarios.');
         } finally {
             setIsLoading(false);
         }
-    }, [token, isSuperUser]);
+    }, [token, isSuperUser, searchTerm]);
 
     useEffect(() => {
-        fetchUsers();
+        const timer = setTimeout(() => fetchUsers(), 300);
+        return () => clearTimeout(timer);
     }, [fetchUsers]);
 
-    useEffect(() => {
-        const term = searchTerm.toLowerCase();
-        const filtered = allUsers.filter(u => u.username.toLowerCase().includes(term));
-        setFilteredUsers(filtered);
-    }, [searchTerm, allUsers]);
-
     const handleRoleChange = async (userId, newRole) => {
         setMessage('');
         setError('');
@@ -298,7 +296,7 @@ const AdminPanel = () => {
                 <div className="admin-section">
                     <h2>Administración de Usuarios</h2>
                     <div className="search-bar">
-                        <input type="text" placeholder="Buscar por correo..." value={searchTerm} onChange={(e) => setSearchTerm(e.target.value)} />
+                        <input type="text" placeholder="Buscar por correo o nombre..." value={searchTerm} onChange={(e) => setSearchTerm(e.target.value)} />
                     </div>
                     {isLoading && allUsers.length === 0 ? <p>Cargando usuarios...</p> : (
                         <table className="admin-table">
@@ -313,7 +311,7 @@ const AdminPanel = () => {
                                 </tr>
                             </thead>
                             <tbody>
-                                {filteredUsers.map(u => (
+                                {allUsers.map(u => (
                                     <tr key={u.id}>
                                         <td>{u.username}</td>
                                         <td>{u.id === user.id ? <strong>{u.role} (Actual)</strong> : <select value={u.role} onChange={(e) => handleRoleChange(u.id, e.target.value)} className="admin-select"><option value="VIEWER">Solo Lectura</option><option value="EDITOR">Editor</option><option value="SUPERUSER">Superusuario</option></select>}</td>
@@ -326,6 +324,7 @@ const AdminPanel = () => {
                             </tbody>
                         </table>
                     )}
+                    {nextCursor && <button onClick={() => fetchUsers(nextCursor)} className="action-button" disabled={isLoading}>Cargar más</button>}
                 </div>
             )}
             
@@ -0,0 +1,28 @@
+// src/dashboard.js
+
+import apiClient from './api';
+
+// Novedades (página 1), cumpleaños de hoy y próximos, y eventos llegan juntos en GET /dashboard.
+// La primera vista que se abre lo pide; las demás reutilizan esa respuesta por VIGENCIA_MS, así
+// recorrer Novedades, Cumpleaños y Eventos es un solo viaje al servidor.
+const VIGENCIA_MS = 30 * 1000;
+
+let pedido = null;
+let pedidoToken = null;
+let pedidoEn = 0;
+
+export const cargarDashboard = (token) => {
+    if (!pedido || pedidoToken !== token || Date.now() - pedidoEn > VIGENCIA_MS) {
+        pedidoToken = token;
+        pedidoEn = Date.now();
+        pedido = apiClient.get('/dashboard', { headers: { 'x-access-token': token } }).then(response => response.data);
+        // Si falla, la próxima vista lo vuelve a pedir
+        pedido.catch(() => { pedido = null; });
+    }
+    return pedido;
+};
+
+// Después de publicar o modificar algo que muestra el dashboard
+export const invalidarDashboard = () => {
+    pedido = null;
+};